@@ -1,6 +1,7 @@
 BEGIN;
 
---CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
+-- Needs shared_preload_libraries = 'pg_stat_statements' for benchmark.py --db-stats
+CREATE EXTENSION IF NOT EXISTS pg_stat_statements;
 
 CREATE TABLE  World (
   id integer NOT NULL,
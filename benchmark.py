@@ -1,20 +1,87 @@
+import argparse
 import subprocess
+import itertools
 import json
 import os
+import random
 import re
+import statistics
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
 
-def run_wrk(url, duration='30s', threads=2, connections=10):
+import dataset
+import loadgen
+import orchestrator
+import pgstats
+import procstats
+import profiles
+import results_store
+import servertiming
+import stats
+from pgconn import connect_db
+
+HISTORY_DB = os.path.join('results', 'history.db')
+
+def parse_duration(duration):
+    """
+    Convert a wrk-style duration ('30s', '2m', '1h' or plain seconds) to seconds.
+    """
+    if isinstance(duration, (int, float)):
+        return float(duration)
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    duration = duration.strip()
+    if duration and duration[-1] in units:
+        return float(duration[:-1]) * units[duration[-1]]
+    return float(duration)
+
+WRK_REPORT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wrk_report.lua')
+WRK_WARMUP_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'wrk_warmup.lua')
+WRK_JSON_MARKER = '__WRK_JSON__'
+
+TIME_UNITS_US = {'us': 1, 'ms': 1000, 's': 1000000, 'm': 60000000, 'h': 3600000000}
+SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+COUNT_UNITS = {'': 1, 'k': 1000, 'M': 1000000, 'G': 1000000000}
+
+def _to_number(text, units):
+    match = re.fullmatch(r'([\d.]+)\s*([A-Za-z]*)', text.strip())
+    if not match or match.group(2) not in units:
+        raise ValueError(f'Unrecognised value {text!r}')
+    return float(match.group(1)) * units[match.group(2)]
+
+def to_microseconds(text):
+    """
+    Convert a wrk time value such as '812.00us', '1.20ms' or '2.00s' to microseconds.
+    """
+    return _to_number(text, TIME_UNITS_US)
+
+def to_bytes(text):
+    """
+    Convert a wrk size value such as '519.63KB' or '1.20MB' to bytes.
+    """
+    return int(_to_number(text, SIZE_UNITS))
+
+def run_wrk(url, duration='30s', threads=2, connections=10, rate=None):
     """
     Run wrk with the specified URL and parameters.
 
+    wrk_report.lua is loaded as the wrk script, so the summary is read from
+    its JSON output; the text report is only used for what the script does
+    not cover.
+
     Args:
         url (str): The URL to benchmark.
         duration (str): Duration of the test (e.g., '30s').
         threads (int): Number of threads to use.
         connections (int): Number of connections to use.
+        rate (int): Constant request rate (requests/sec). Passed as -R,
+            which requires the wrk binary on PATH to be wrk2.
 
     Returns:
-        dict: Parsed results from wrk.
+        dict: Parsed results from wrk, latencies in microseconds and sizes in bytes.
     """
     command = [
         'wrk', 
@@ -22,28 +89,86 @@ def run_wrk(url, duration='30s', threads=2, connections=10):
         '-c', str(connections), 
         '-d', duration, 
         '--latency', 
+        '-s', WRK_REPORT_SCRIPT,
         url
     ]
+    if rate:
+        command[-1:-1] = ['-R', str(int(rate))]
     
     result = subprocess.run(command, capture_output=True, text=True)
     output = result.stdout
     
     # Parsing the wrk output
     parsed_data = parse_wrk_output(output)
+    parsed_data.update(parse_wrk_report(output))
+    if result.returncode != 0 and 'total_requests' not in parsed_data:
+        parsed_data['error'] = result.stderr.strip() or f'wrk exited with status {result.returncode}'
     
     return parsed_data
 
+def parse_wrk_report(text):
+    """
+    Parse the JSON line printed by wrk_report.lua.
+
+    Returns:
+        dict: Results in the same shape as loadgen.run_load(), or an empty
+        dict if the report is missing (e.g. wrk was killed).
+    """
+    _, marker, report = text.partition(WRK_JSON_MARKER)
+    if not marker:
+        return {}
+    try:
+        data = json.loads(report.strip().splitlines()[0])
+    except (IndexError, ValueError):
+        return {}
+
+    elapsed = data['duration_us'] / 1e6
+    errors = data['errors']
+    latency = data['latency']
+    return {
+        'latency': {
+            'min': latency['min'],
+            'avg': latency['mean'],
+            'stdev': latency['stdev'],
+            'max': latency['max'],
+            'percentiles': latency['percentiles'],
+        },
+        'req_per_sec': {
+            'avg': data['requests_per_thread']['mean'],
+            'stdev': data['requests_per_thread']['stdev'],
+            'max': data['requests_per_thread']['max'],
+        },
+        'total_requests': data['requests'],
+        'total_duration': round(elapsed, 3),
+        'requests_per_sec': round(data['requests'] / elapsed, 2) if elapsed else 0.0,
+        'bytes_read': data['bytes'],
+        'transfer_per_sec': round(data['bytes'] / elapsed, 2) if elapsed else 0.0,
+        'non_2xx': errors['status'],
+        'errors': {
+            'connect': errors['connect'],
+            'read': errors['read'],
+            'write': errors['write'],
+            'timeout': errors['timeout'],
+        },
+    }
+
 def parse_wrk_output(text):
-    
+    """
+    Parse wrk's human-readable report.
+
+    Values are normalised to numbers whatever unit wrk chose to print them
+    in: latencies in microseconds, sizes in bytes.
+    """
     result = {}
 
     # Extracting the URL and test duration
     url_match = re.search(r'@ (http[^\s]+)', text)
-    duration_match = re.search(r'Running (\d+)s test', text)
+    duration_match = re.search(r'Running ([\d.]+[a-z]*) test', text)
     
-    if url_match and duration_match:
+    if url_match:
         result['url'] = url_match.group(1)
-        result['duration'] = int(duration_match.group(1))
+    if duration_match:
+        result['duration'] = to_microseconds(duration_match.group(1)) / 1e6
 
     # Extracting thread and connection details
     threads_connections_match = re.search(r'(\d+) threads and (\d+) connections', text)
@@ -52,43 +177,408 @@ def parse_wrk_output(text):
         result['connections'] = int(threads_connections_match.group(2))
     
     # Extracting latency details
-    latency_match = re.search(r'Latency\s+([\d.]+ms)\s+([\d.]+us)\s+([\d.]+ms)', text)
+    latency_match = re.search(r'Latency\s+([\d.]+[a-z]+)\s+([\d.]+[a-z]+)\s+([\d.]+[a-z]+)', text)
     if latency_match:
         result['latency'] = {
-            'avg': latency_match.group(1),
-            'stdev': latency_match.group(2),
-            'max': latency_match.group(3)
+            'avg': to_microseconds(latency_match.group(1)),
+            'stdev': to_microseconds(latency_match.group(2)),
+            'max': to_microseconds(latency_match.group(3)),
         }
+        # Latency Distribution table printed by --latency
+        percentiles = re.findall(r'^\s+([\d.]+)%\s+([\d.]+[a-z]+)\s*$', text, re.MULTILINE)
+        if percentiles:
+            result['latency']['percentiles'] = {
+                f'{float(p):g}': to_microseconds(value) for p, value in percentiles
+            }
     
     # Extracting Req/Sec details
-    req_sec_match = re.search(r'Req/Sec\s+([\d.]+)\s+([\d.]+)\s+([\d.]+)', text)
+    req_sec_match = re.search(r'Req/Sec\s+([\d.]+[kMG]?)\s+([\d.]+[kMG]?)\s+([\d.]+[kMG]?)', text)
     if req_sec_match:
         result['req_per_sec'] = {
-            'avg': req_sec_match.group(1),
-            'stdev': req_sec_match.group(2),
-            'max': req_sec_match.group(3)
+            'avg': _to_number(req_sec_match.group(1), COUNT_UNITS),
+            'stdev': _to_number(req_sec_match.group(2), COUNT_UNITS),
+            'max': _to_number(req_sec_match.group(3), COUNT_UNITS),
         }
 
     # Extracting request and data transfer details
-    requests_match = re.search(r'(\d+) requests in ([\d.]+)s, ([\d.]+)(KB|MB) read', text)
+    requests_match = re.search(r'(\d+) requests in ([\d.]+[a-z]+), ([\d.]+[KMGT]?B) read', text)
     if requests_match:
         result['total_requests'] = int(requests_match.group(1))
-        result['total_duration'] = float(requests_match.group(2))
-        result['data_read'] = f"{requests_match.group(3)}{requests_match.group(4)}"
+        result['total_duration'] = to_microseconds(requests_match.group(2)) / 1e6
+        result['bytes_read'] = to_bytes(requests_match.group(3))
+
+    # Socket errors and non-2xx/3xx responses are only printed when non-zero
+    errors = {'connect': 0, 'read': 0, 'write': 0, 'timeout': 0}
+    socket_errors_match = re.search(
+        r'Socket errors: connect (\d+), read (\d+), write (\d+), timeout (\d+)', text)
+    if socket_errors_match:
+        errors = dict(zip(errors, map(int, socket_errors_match.groups())))
+    result['errors'] = errors
+    non_2xx_match = re.search(r'Non-2xx or 3xx responses: (\d+)', text)
+    result['non_2xx'] = int(non_2xx_match.group(1)) if non_2xx_match else 0
 
     # Extracting requests/sec and transfer/sec details
     req_sec_final_match = re.search(r'Requests/sec:\s+([\d.]+)', text)
-    transfer_sec_match = re.search(r'Transfer/sec:\s+([\d.]+KB|MB)', text)
+    transfer_sec_match = re.search(r'Transfer/sec:\s+([\d.]+[KMGT]?B)', text)
     
     if req_sec_final_match:
         result['requests_per_sec'] = float(req_sec_final_match.group(1))
     
     if transfer_sec_match:
-        result['transfer_per_sec'] = transfer_sec_match.group(1)
+        result['transfer_per_sec'] = to_bytes(transfer_sec_match.group(1))
     
     return result
 
-def run_benchmark(frameworks, endpoints, duration='30s', threads=2, connections=10, output_dir='results'):
+def run_native(url, duration='30s', threads=2, connections=10, rate=None, warmup=None, on_measure=None):
+    """
+    Run the built-in load generator with the same parameters as run_wrk().
+
+    Each of the `threads` becomes a worker process with its share of the
+    keep-alive connections, so no wrk binary is needed on the load box.
+
+    With `warmup` (keyword arguments as for warm_up()), the same
+    connections warm up until throughput settles and go straight on into
+    the measured `duration`; `on_measure` is called when it starts.
+
+    Returns:
+        dict: Results with exact latency percentiles (in microseconds),
+        per-status-code counts and an error breakdown, plus the warmup
+        curve under 'warmup' when warming up.
+    """
+    return loadgen.run_load(url, parse_duration(duration), threads, connections, rate=rate,
+                            warmup=warmup, on_measure=on_measure)
+
+ENGINES = {
+    'wrk': run_wrk,
+    'native': run_native,
+}
+
+SCENARIO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scenarios')
+
+def load_scenario(path):
+    """
+    Load a weighted endpoint mix, see scenarios/*.json and loadgen.RequestMix.
+
+    Args:
+        path (str): Scenario file, or the name of one in scenarios/.
+
+    Returns:
+        dict: The scenario, with 'name' defaulting to the file name.
+    """
+    if not os.path.exists(path):
+        path = os.path.join(SCENARIO_DIR, f'{path}.json')
+    with open(path) as f:
+        scenario = json.load(f)
+    scenario.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    if not scenario.get('endpoints'):
+        raise ValueError(f'Scenario {path} has no endpoints')
+    for endpoint in scenario['endpoints']:
+        if endpoint.get('weight', 1) <= 0:
+            raise ValueError(f"Scenario {path}: weight of {endpoint['name']} must be positive")
+        if 'queries' in endpoint:
+            try:
+                loadgen.queries_sampler(endpoint['queries'], random.Random(0))()
+            except KeyError as e:
+                raise ValueError(f"Scenario {path}: queries of {endpoint['name']} is missing {e}")
+    return scenario
+
+def run_scenario(base_url, scenario, duration='30s', threads=2, connections=10):
+    """
+    Run a scenario's endpoint mix against one server with the native engine.
+
+    wrk can generate a mix from Lua, but only reports latency for the run
+    as a whole, so scenarios always use loadgen.
+
+    Returns:
+        dict: run_native() style results for the whole mix, plus
+        'endpoints' with each endpoint's share, throughput, latency and
+        status codes.
+    """
+    return loadgen.run_load(base_url, parse_duration(duration), threads, connections, scenario=scenario)
+
+def format_scenario(framework, result):
+    """One line per endpoint of a scenario run: share, req/s, p50 and p99 in milliseconds."""
+    lines = [f"Scenario {result['scenario']} on {framework}: {result['requests_per_sec']} req/s"]
+    for name, endpoint in result['endpoints'].items():
+        latency = endpoint['latency']
+        lines.append(
+            f"  {name:<16} {endpoint['share'] * 100:5.1f}%  {endpoint['requests_per_sec']:10.2f} req/s"
+            f"   p50 {latency['percentiles']['50'] / 1000:8.3f} ms   p99 {latency['percentiles']['99'] / 1000:8.3f} ms"
+            f"   non-2xx {endpoint['non_2xx']}"
+        )
+    return '\n'.join(lines)
+
+def latency_percentile(result, percentile):
+    """
+    Return a latency percentile from a result dict, or None if the engine did not report it.
+    """
+    return result.get('latency', {}).get('percentiles', {}).get(str(percentile))
+
+_wrk_rate_support = None
+
+def wrk_supports_rate():
+    """
+    Whether the wrk binary on PATH is wrk2, which adds the -R/--rate option.
+
+    Stock wrk rejects -R, so constant-rate runs need wrk2 or the native
+    engine. The answer is read from wrk's usage text once and cached.
+    """
+    global _wrk_rate_support
+    if _wrk_rate_support is None:
+        try:
+            usage = subprocess.run(['wrk'], capture_output=True, text=True)
+        except OSError:
+            _wrk_rate_support = False
+        else:
+            _wrk_rate_support = '--rate' in usage.stdout + usage.stderr
+    return _wrk_rate_support
+
+def check_rate_engine(engine):
+    """
+    Fail fast if `engine` cannot run at a constant request rate.
+    """
+    if engine == 'wrk' and not wrk_supports_rate():
+        raise RuntimeError('Constant-rate runs need wrk2 as wrk on PATH (stock wrk has no -R); '
+                           'use the native engine (--engine native) instead')
+
+def run_rate_curve(url, rates, duration='30s', threads=2, connections=10, engine='wrk'):
+    """
+    Run a constant-rate (open-loop) test at each offered load.
+
+    Latency is measured from the time each request was scheduled, so it
+    includes queueing behind a stalled server.
+
+    Args:
+        url (str): The URL to benchmark.
+        rates (list): Offered loads in requests/sec, lowest first.
+        duration (str): Duration of each step.
+        threads (int): Number of threads to use.
+        connections (int): Number of connections to use.
+        engine (str): Load generator to use, one of ENGINES.
+
+    Returns:
+        list: One point per rate with the offered and achieved rate and the latency percentiles.
+
+    Raises:
+        RuntimeError: If the engine cannot hold a constant rate (stock wrk),
+            or a step fails to run at all.
+    """
+    check_rate_engine(engine)
+    run = ENGINES[engine]
+    curve = []
+    for rate in rates:
+        print(f'  offered load {rate} req/s')
+        result = run(url, duration, threads, connections, rate=rate)
+        if result.get('error'):
+            raise RuntimeError(f"{engine} failed at {rate} req/s: {result['error']}")
+        point = {
+            'offered_rps': rate,
+            'achieved_rps': result.get('requests_per_sec'),
+            'errors': result.get('errors'),
+            'non_2xx': result.get('non_2xx'),
+        }
+        for percentile in loadgen.PERCENTILES:
+            point[f'p{percentile}'] = latency_percentile(result, percentile)
+        curve.append(point)
+    return curve
+
+def error_ratio(result):
+    """
+    Fraction of requests that failed or returned a non-2xx status.
+    """
+    total = result.get('total_requests') or 0
+    failed = sum(result.get('errors', {}).values()) + result.get('non_2xx', 0)
+    if not total:
+        return 1.0 if failed else 0.0
+    return failed / (total + sum(result.get('errors', {}).values()))
+
+def run_sweep(url, duration='10s', threads=2, engine='wrk', max_connections=1024, factor=2,
+              p99_limit_ms=100, max_error_ratio=0.01, min_gain=0.05):
+    """
+    Step the number of connections geometrically and find the saturation knee.
+
+    The sweep stops once throughput grows by less than `min_gain` for two
+    consecutive steps, or once p99 latency or the error ratio exceed their
+    limits. The knee is the step with the highest throughput whose p99 and
+    error ratio are still acceptable.
+
+    Args:
+        url (str): The URL to benchmark.
+        duration (str): Duration of each step.
+        threads (int): Number of threads to use (capped at the connection count).
+        engine (str): Load generator to use, one of ENGINES.
+        max_connections (int): Upper bound for the sweep.
+        factor (int): Growth factor between steps.
+        p99_limit_ms (float): Highest acceptable p99 latency in milliseconds,
+            None to judge steps by errors and throughput only. If the engine
+            reports no p99 for a step, the limit cannot be checked: the
+            sweep stops with 'p99_unavailable' instead of accepting the step.
+        max_error_ratio (float): Highest acceptable fraction of failed requests.
+        min_gain (float): Relative throughput gain below which a step counts as flat.
+
+    Returns:
+        dict: Every step of the sweep, the knee step and why the sweep stopped.
+    """
+    run = ENGINES[engine]
+    steps = []
+    knee = None
+    stop_reason = 'max_connections'
+    flat_steps = 0
+    connections = 1
+    while connections <= max_connections:
+        print(f'  {connections} connections')
+        result = run(url, duration, min(threads, connections), connections)
+        p99 = latency_percentile(result, 99)
+        step = {
+            'connections': connections,
+            'requests_per_sec': result.get('requests_per_sec') or 0.0,
+            'p99': p99,
+            'error_ratio': round(error_ratio(result), 4),
+        }
+        steps.append(step)
+
+        if p99_limit_ms is not None and p99 is None:
+            print(f'Warning: {engine} reported no p99 latency, cannot apply the {p99_limit_ms} ms limit')
+            stop_reason = 'p99_unavailable'
+            break
+        p99_ok = p99_limit_ms is None or p99 <= p99_limit_ms * 1000
+        acceptable = step['error_ratio'] <= max_error_ratio and p99_ok
+        if acceptable and (knee is None or step['requests_per_sec'] > knee['requests_per_sec']):
+            knee = step
+        if step['error_ratio'] > max_error_ratio:
+            stop_reason = 'errors'
+            break
+        if not p99_ok:
+            stop_reason = 'p99'
+            break
+        if len(steps) > 1:
+            previous = steps[-2]['requests_per_sec']
+            flat_steps = flat_steps + 1 if step['requests_per_sec'] < previous * (1 + min_gain) else 0
+            if flat_steps >= 2:
+                stop_reason = 'throughput_flat'
+                break
+        connections *= factor
+
+    return {'steps': steps, 'knee': knee, 'stop_reason': stop_reason}
+
+DEFAULT_WARMUP = {
+    'max_seconds': 30,
+    'window': 5,
+    'max_cv': 0.05,
+}
+
+def warm_up(url, threads=2, connections=10, engine='wrk', max_seconds=30, window=5, max_cv=0.05):
+    """
+    Drive load at the measurement concurrency until throughput settles.
+
+    Throughput is read per second from one continuous run, so it reflects
+    a server that is kept busy rather than a series of cold starts. Steady
+    state is the first second at which the coefficient of variation over
+    the last `window` seconds is at most `max_cv`.
+
+    The native engine stops as soon as that happens. wrk cannot be stopped
+    early, so it always runs for `max_seconds` (with wrk_warmup.lua
+    counting completions per second) and the steady point is found
+    afterwards. Either way the measured run that follows opens new
+    connections: warm server-side caches, pools and JIT state carry over,
+    connection-level state (accepted sockets, keep-alive, per-connection
+    buffers) does not. run_benchmark() avoids this for the native engine
+    by warming up inside the measured run instead (see run_native()).
+
+    Args:
+        url (str): The URL to warm up.
+        threads (int): Number of threads to use.
+        connections (int): Number of connections to use.
+        engine (str): Load generator to use, one of ENGINES.
+        max_seconds (int): Upper bound on the warmup length.
+        window (int): Number of one-second samples the CV is computed over.
+        max_cv (float): Coefficient of variation considered steady.
+
+    Returns:
+        dict: The per-second warmup curve and whether steady state was reached.
+    """
+    settings = {'max_seconds': max_seconds, 'window': window, 'max_cv': max_cv}
+    if engine == 'native':
+        return loadgen.run_load(url, 0, threads, connections, warmup=settings)['warmup']
+
+    command = ['wrk', '-t', str(threads), '-c', str(connections), '-d', f'{max_seconds}s',
+               '-s', WRK_WARMUP_SCRIPT, url]
+    result = subprocess.run(command, capture_output=True, text=True)
+    marker = '__WRK_TIMELINE__\n'
+    counts = []
+    if marker in result.stdout:
+        counts = json.loads(result.stdout.split(marker, 1)[1].splitlines()[0])
+    curve = [{'second': second, 'requests_per_sec': count} for second, count in enumerate(counts, 1)]
+    cv = None
+    for end in range(window, len(curve) + 1):
+        cv = loadgen.coefficient_of_variation([sample['requests_per_sec'] for sample in curve[end - window:end]])
+        if cv <= max_cv:
+            return {'steady': True, 'seconds': end, 'cv': round(cv, 4), 'curve': curve}
+    return {'steady': False, 'seconds': len(curve), 'cv': cv if cv is None else round(cv, 4), 'curve': curve}
+
+def endpoint_name(endpoint):
+    """
+    Endpoint path without its query string, e.g. 'dbs' for 'dbs?queries=20'.
+    """
+    return endpoint.split('?', 1)[0]
+
+def warmup_settings(warmup, endpoint):
+    """
+    Resolve the warmup settings for an endpoint.
+
+    `warmup` maps endpoint names to keyword arguments for warm_up(); the
+    'default' entry applies to endpoints that are not listed, and a falsy
+    value disables warmup for that endpoint.
+    """
+    if not warmup:
+        return None
+    settings = warmup.get(endpoint_name(endpoint), warmup.get('default'))
+    if not settings:
+        return None
+    return {**DEFAULT_WARMUP, **settings}
+
+def start_sampler(server):
+    """
+    Start sampling a server's processes.
+
+    Args:
+        server: Path to the server's pidfile (e.g. '/tmp/fastapi.pid'), a
+            PID, or a list of PIDs. Descendants are sampled too, so the
+            gunicorn master PID covers all of its workers.
+
+    Returns:
+        procstats.ProcessSampler: The running sampler, or None if `server` is empty.
+    """
+    if not server:
+        return None
+    if isinstance(server, str):
+        sampler = procstats.ProcessSampler(pidfile=server)
+    elif isinstance(server, int):
+        sampler = procstats.ProcessSampler(pids=[server])
+    else:
+        sampler = procstats.ProcessSampler(pids=server)
+    sampler.start()
+    return sampler
+
+APP_STATS_PATH = '/_stats'
+
+def fetch_app_stats(base_url, timeout=2):
+    """
+    Fetch the app's own metrics (coalescer batch sizes, pool stats, ...).
+
+    Apps that do not expose APP_STATS_PATH are skipped. With several
+    workers the figures come from whichever worker answered.
+
+    Returns:
+        dict: The decoded metrics, or None.
+    """
+    try:
+        with urllib.request.urlopen(base_url + APP_STATS_PATH, timeout=timeout) as response:
+            return json.loads(response.read())
+    except (urllib.error.URLError, ConnectionError, ValueError, OSError):
+        return None
+
+def run_benchmark(frameworks, endpoints, duration='30s', threads=2, connections=10, output_dir='results', engine='wrk', rates=None, sweep=False, warmup=None, servers=None, history_db=HISTORY_DB, label=None, server_timing=False, profile=None, scenarios=None, db_stats=False):
     """
     Run benchmarking for multiple frameworks and endpoints.
 
@@ -99,20 +589,154 @@ def run_benchmark(frameworks, endpoints, duration='30s', threads=2, connections=
         threads (int): Number of threads to use.
         connections (int): Number of connections to use.
         output_dir (str): Directory to store the JSON results.
+        engine (str): Load generator to use, one of ENGINES ('wrk' or 'native').
+        rates (list): If given, run each endpoint at these constant request
+            rates and store the latency-vs-offered-load curve instead of a
+            single max-throughput result.
+        sweep (bool): If True, ignore `connections` and run a concurrency
+            sweep per endpoint, storing every step and the knee point.
+        warmup (dict): Per-endpoint warmup settings, see warmup_settings().
+            Warmup curves are saved to <framework>_warmup.json, separately
+            from the measured results. The native engine measures on the
+            connections it warmed up with; wrk, rate curves and sweeps
+            warm up with warm_up() first and then reconnect.
+        servers (dict): Framework name to pidfile or PIDs of its server. When
+            given, CPU time, peak RSS per worker, context switches and
+            sockets are sampled from /proc during the measured run and stored
+            under 'server' in each endpoint's result.
+        history_db (str): SQLite database the run is appended to, keyed by
+            git SHA and host, for later comparison with `benchmark.py
+            compare`. None disables it.
+        label (str): Free-form note stored with the run in history_db.
+        server_timing (bool): Sample the Server-Timing headers of apps
+            running with SERVER_TIMING=1 during each measured run and store
+            the per-phase breakdown under 'server_timing'.
+        profile (float): Seconds of stack sampling per endpoint, taken from
+            the middle of the measured run. Needs a `servers` entry and apps
+            started with PROFILER=1; collapsed stacks per worker are written
+            under <output_dir>/profiles and summarised under 'profile'.
+            Not used for rate curves and sweeps.
+        scenarios (list): Scenarios from load_scenario() to run after the
+            endpoints, each stored as 'scenario:<name>' with latency per
+            endpoint of the mix. Always uses the native engine.
+        db_stats (bool): Snapshot pg_stat_statements, pg_stat_database and
+            pg_stat_wal (see pgstats) around each measured run and store
+            statements, DB time, commits and WAL per request under
+            'database'. Not used for rate curves and sweeps.
 
+    Returns:
+        int: The id of the run in history_db, or None.
     """
+    servers = servers or {}
+    run = ENGINES[engine]
+    if rates:
+        check_rate_engine(engine)
+
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
+
+    history = results_store.connect(history_db) if history_db else None
+    run_id = results_store.start_run(history, label) if history else None
+    db = connect_db() if db_stats else None
     
     for framework, base_url in frameworks.items():
         framework_results = {}
+        framework_warmups = {}
         
         for endpoint in endpoints:
             url = f'{base_url}/{endpoint}'
-            print(f'Running wrk for {framework} on {url}')
-            
-            result = run_wrk(url, duration, threads, connections)
+            settings = warmup_settings(warmup, endpoint)
+            # The native engine warms up on the connections it then measures with
+            continuous = settings and engine == 'native' and not rates and not sweep
+            if settings and not continuous:
+                print(f'Warming up {framework} on {url}')
+                framework_warmups[endpoint] = warm_up(url, threads, connections, engine, **settings)
+                if not framework_warmups[endpoint]['steady']:
+                    print(f'Warning: throughput did not settle within {settings["max_seconds"]}s')
+
+            instruments = {}
+
+            def start_measurement():
+                instruments['sampler'] = start_sampler(servers.get(framework))
+                if server_timing:
+                    instruments['timing_sampler'] = servertiming.ServerTimingSampler(url)
+                    instruments['timing_sampler'].start()
+                if profile and servers.get(framework) and not rates and not sweep:
+                    instruments['profile_trigger'] = profiles.ProfileTrigger(
+                        servers[framework], profile,
+                        os.path.join(output_dir, 'profiles', framework, endpoint_name(endpoint)),
+                        delay=max(parse_duration(duration) - profile, 0) / 2,
+                    )
+                    instruments['profile_trigger'].start()
+                if db and not rates and not sweep:
+                    instruments['db_before'] = pgstats.DatabaseSnapshot(db)
+
+            if continuous:
+                print(f'Warming up and running native for {framework} on {url}')
+                result = run_native(url, duration, threads, connections, warmup=settings, on_measure=start_measurement)
+                framework_warmups[endpoint] = result.pop('warmup')
+                if not framework_warmups[endpoint]['steady']:
+                    print(f'Warning: throughput did not settle within {settings["max_seconds"]}s')
+            else:
+                print(f'Running {engine} for {framework} on {url}')
+                start_measurement()
+                if rates:
+                    result = {'rate_curve': run_rate_curve(url, rates, duration, threads, connections, engine)}
+                elif sweep:
+                    result = run_sweep(url, duration, threads, engine)
+                    knee = result['knee']
+                    if knee:
+                        print(f"Knee for {framework} {endpoint}: {knee['requests_per_sec']} req/s at {knee['connections']} connections")
+                    else:
+                        print(f'No acceptable step for {framework} {endpoint} ({result["stop_reason"]})')
+                else:
+                    result = run(url, duration, threads, connections)
+            sampler = instruments.get('sampler')
+            timing_sampler = instruments.get('timing_sampler')
+            profile_trigger = instruments.get('profile_trigger')
+            db_before = instruments.get('db_before')
+            if sampler:
+                result['server'] = sampler.stop(result.get('total_requests'))
+            if profile_trigger:
+                result['profile'] = profile_trigger.collect()
+                if profile_trigger.skipped:
+                    print(f'Not profiling {len(profile_trigger.skipped)} {framework} workers started without PROFILER=1')
+                if not result['profile'] or result['profile']['missing_workers']:
+                    print(f'Missing profiles from {framework} {endpoint}, is PROFILER=1 set?')
+            if timing_sampler:
+                breakdown = timing_sampler.stop()
+                if breakdown:
+                    result['server_timing'] = breakdown
+                    print(servertiming.format_breakdown(framework, endpoint, breakdown))
+                else:
+                    print(f'No Server-Timing headers from {framework} {endpoint}, is SERVER_TIMING=1 set?')
+            if db_before:
+                # The Server-Timing samples hit the database too
+                requests = result.get('total_requests', 0) + (timing_sampler.samples if timing_sampler else 0)
+                result['database'] = pgstats.DatabaseSnapshot(db, settle=True).diff(db_before, requests)
+                print(pgstats.format_summary(framework, endpoint, result['database']))
+            app_stats = fetch_app_stats(base_url)
+            if app_stats:
+                result['app_stats'] = app_stats
             framework_results[endpoint] = result
+            if history:
+                results_store.record_result(history, run_id, framework, endpoint, result, error_ratio)
+
+        for scenario in scenarios or []:
+            key = f"scenario:{scenario['name']}"
+            print(f"Running scenario {scenario['name']} for {framework} on {base_url}")
+            sampler = start_sampler(servers.get(framework))
+            db_before = pgstats.DatabaseSnapshot(db) if db else None
+            result = run_scenario(base_url, scenario, duration, threads, connections)
+            if sampler:
+                result['server'] = sampler.stop(result.get('total_requests'))
+            if db_before:
+                result['database'] = pgstats.DatabaseSnapshot(db, settle=True).diff(db_before, result.get('total_requests'))
+                print(pgstats.format_summary(framework, key, result['database']))
+            print(format_scenario(framework, result))
+            framework_results[key] = result
+            if history:
+                results_store.record_result(history, run_id, framework, key, result, error_ratio)
             
         output_file = os.path.join(output_dir, f'{framework}_results.json')
         with open(output_file, 'w') as f:
@@ -120,9 +744,746 @@ def run_benchmark(frameworks, endpoints, duration='30s', threads=2, connections=
         
         print(f'Results saved to {output_file}')
 
-# Example usage
-if __name__ == '__main__':
-    
+        if framework_warmups:
+            warmup_file = os.path.join(output_dir, f'{framework}_warmup.json')
+            with open(warmup_file, 'w') as f:
+                json.dump(framework_warmups, f, indent=4)
+
+    if db:
+        db.close()
+    if history:
+        history.close()
+        print(f'Run {run_id} appended to {history_db}')
+    return run_id
+
+def default_endpoints(queries=20):
+    """
+    The endpoint suite run for every framework.
+    """
+    return [
+        'json',
+        'plaintext',
+        'fortunes',
+        'db',
+        f'dbs?queries={queries}',
+        f'updates?queries={queries}',
+        f'cached-queries?queries={queries}',
+    ]
+
+def server_env(options):
+    """
+    Environment for managed servers, enabling what the run options need.
+    """
+    env = {}
+    if options.get('server_timing'):
+        env['SERVER_TIMING'] = '1'
+    if options.get('profile'):
+        env['PROFILER'] = '1'
+        env['PROFILER_DIR'] = profiles.PROFILER_DIR
+    return env
+
+def run_suite(config_path=orchestrator.DEFAULT_CONFIG, only=None, workers=None, queries=20, output_dir='results',
+              trials=1, seed=None, env=None, **options):
+    """
+    Launch each configured server, benchmark it, and stop it again.
+
+    Servers run one at a time, once per worker count, so runs for
+    e.g. '-w 1' and '-w cpu_count()' can be compared for scaling. Results
+    are stored under '<server>-w<workers>'. A server entry may list
+    'extra_endpoints' (with a {queries} placeholder) to benchmark
+    app-specific variants next to the default suite. An entry with
+    'overhead_baseline_for' names the framework it is a bare baseline for;
+    when both ran, framework_overhead() reports the difference.
+
+    Args:
+        config_path (str): Declarative server config, see servers.json.
+        only (list): Names of the servers to run, default all.
+        workers (list): Worker counts, overriding the config's 'workers'.
+        queries (int): Queries per request for the multi-query endpoints.
+        output_dir (str): Directory for results and server logs.
+        trials (int): Repetitions of the whole suite. With more than one,
+            every trial starts the servers in a freshly shuffled order,
+            saves its results under <output_dir>/trials/<n>, and
+            summarize_trials() compares the servers across trials.
+        seed (int): Seed for the trial order, default random.
+        env (dict): Extra environment for the servers, e.g. WORLD_ROWS.
+        **options: Passed on to run_benchmark().
+
+    Returns:
+        dict: The summarize_trials() result when trials > 1, else None.
+    """
+    if options.get('rates'):
+        check_rate_engine(options.get('engine', 'wrk'))
+    config = orchestrator.load_config(config_path)
+    counts = orchestrator.worker_counts(workers or config.get('workers', [1]))
+    specs = [spec for spec in config['servers'] if not only or spec['name'] in only]
+    log_dir = os.path.join(output_dir, 'logs')
+    jobs = [(spec, count) for spec in specs for count in counts]
+    rng = random.Random(seed)
+    label = options.pop('label', None)
+    trial_dirs = []
+
+    for trial in range(1, trials + 1):
+        trial_dir = os.path.join(output_dir, 'trials', str(trial)) if trials > 1 else output_dir
+        trial_dirs.append(trial_dir)
+        if trials > 1:
+            rng.shuffle(jobs)
+            order = [f"{spec['name']}-w{count}" for spec, count in jobs]
+            print(f"Trial {trial}/{trials}: {', '.join(order)}")
+        for spec, count in jobs:
+            endpoints = spec.get('endpoints') or default_endpoints(queries)
+            endpoints = [endpoint.format(queries=queries) for endpoint in endpoints + spec.get('extra_endpoints', [])]
+            if trials > 1:
+                rng.shuffle(endpoints)
+            server = orchestrator.ManagedServer(
+                spec, count, port=config.get('port', 8080), ready_path=config.get('ready_path', '/plaintext'),
+                ready_timeout=config.get('ready_timeout', 60), log_dir=log_dir,
+                env={**server_env(options), **(env or {})},
+            )
+            name = f"{spec['name']}-w{count}"
+            print(f'Starting {name}: {" ".join(server.command)}')
+            try:
+                with server:
+                    run_benchmark({name: server.base_url}, endpoints, output_dir=trial_dir,
+                                  servers={name: server.pidfile}, label=trial_label(label, trial, trials),
+                                  **options)
+            except orchestrator.ServerError as e:
+                print(f'Skipping {name}: {e}')
+
+    names = {spec['name'] for spec in specs}
+    for spec in specs:
+        framework = spec.get('overhead_baseline_for')
+        if framework in names:
+            for count in counts:
+                for trial_dir in trial_dirs:
+                    framework_overhead(f'{framework}-w{count}', f"{spec['name']}-w{count}", trial_dir)
+
+    if trials > 1:
+        return summarize_trials(trial_dirs, [f"{spec['name']}-w{count}" for spec in specs for count in counts],
+                                output_dir)
+    return None
+
+def trial_label(label, trial, trials):
+    if trials == 1:
+        return label
+    return f'{label} (trial {trial}/{trials})' if label else f'trial {trial}/{trials}'
+
+def run_trials(frameworks, endpoints, trials=5, output_dir='results', seed=None, servers=None, label=None,
+               **options):
+    """
+    Repeat run_benchmark() against already running servers, interleaving the frameworks.
+
+    Every trial runs the frameworks, and each framework's endpoints, in a
+    freshly shuffled order, so drift over the session (thermal throttling,
+    noisy neighbours, table bloat from /updates) is spread over all
+    frameworks instead of landing on whichever runs last.
+
+    Args:
+        frameworks (dict): Dictionary of framework names and their base URLs.
+        endpoints (list): List of endpoints to benchmark.
+        trials (int): Number of repetitions. Differences can only reach
+            p < 0.05 with at least 4 trials per framework.
+        output_dir (str): Trial n is saved under <output_dir>/trials/<n>.
+        seed (int): Seed for the run order, default random.
+        servers (dict): Framework name to pidfile or PIDs, as for run_benchmark().
+        label (str): Note stored with each trial's run in the history.
+        **options: Passed on to run_benchmark().
+
+    Returns:
+        dict: See summarize_trials().
+    """
+    servers = servers or {}
+    rng = random.Random(seed)
+    trial_dirs = []
+    for trial in range(1, trials + 1):
+        trial_dir = os.path.join(output_dir, 'trials', str(trial))
+        trial_dirs.append(trial_dir)
+        order = list(frameworks)
+        rng.shuffle(order)
+        print(f"Trial {trial}/{trials}: {', '.join(order)}")
+        for framework in order:
+            shuffled = list(endpoints)
+            rng.shuffle(shuffled)
+            run_benchmark({framework: frameworks[framework]}, shuffled, output_dir=trial_dir,
+                          servers={framework: servers[framework]} if framework in servers else None,
+                          label=trial_label(label, trial, trials), **options)
+    return summarize_trials(trial_dirs, list(frameworks), output_dir)
+
+def describe_samples(values):
+    """
+    Median of per-trial values with a bootstrap 95% confidence interval.
+    """
+    if not values:
+        return None
+    low, high = stats.bootstrap_ci(values)
+    return {
+        'trials': len(values),
+        'median': round(statistics.median(values), 2),
+        'ci_95': [round(low, 2), round(high, 2)],
+        'samples': values,
+    }
+
+def compare_samples(a, b, alpha=0.05):
+    """
+    Relative difference of medians from `a` to `b` and whether a permutation test finds it significant.
+    """
+    if not a or not b:
+        return None
+    p_value = stats.permutation_test(a, b)
+    change = stats.relative_change(statistics.median(a), statistics.median(b))
+    return {
+        'change': round(change, 4) if change is not None else None,
+        'p_value': round(p_value, 4),
+        'significant': p_value < alpha,
+    }
+
+def summarize_trials(trial_dirs, names, output_dir='results', alpha=0.05):
+    """
+    Aggregate per-trial results files into medians, CIs and pairwise significance.
+
+    Only results with a requests_per_sec (plain runs and scenarios, not
+    rate curves or sweeps) are included. Printed as a table per endpoint and
+    saved to <output_dir>/trials.json.
+
+    Args:
+        trial_dirs (list): Directories holding each trial's <name>_results.json.
+        names (list): Results names to compare.
+        alpha (float): Significance level for the pairwise comparisons.
+
+    Returns:
+        dict: Per endpoint, 'frameworks' with requests_per_sec and p99
+        summaries (see describe_samples()) and 'comparisons' for every pair.
+    """
+    samples = {}
+    for trial_dir in trial_dirs:
+        for name in names:
+            try:
+                with open(os.path.join(trial_dir, f'{name}_results.json')) as f:
+                    results = json.load(f)
+            except OSError:
+                continue
+            for endpoint, result in results.items():
+                if 'requests_per_sec' not in result:
+                    continue
+                entry = samples.setdefault(endpoint, {}).setdefault(name, {'requests_per_sec': [], 'p99': []})
+                entry['requests_per_sec'].append(result['requests_per_sec'])
+                p99 = latency_percentile(result, 99)
+                if p99 is not None:
+                    entry['p99'].append(p99)
+
+    summary = {}
+    for endpoint, by_name in sorted(samples.items()):
+        summary[endpoint] = {
+            'frameworks': {
+                name: {metric: describe_samples(values) for metric, values in entry.items()}
+                for name, entry in by_name.items()
+            },
+            'comparisons': [
+                {
+                    'a': a,
+                    'b': b,
+                    'requests_per_sec': compare_samples(by_name[a]['requests_per_sec'], by_name[b]['requests_per_sec'], alpha),
+                    'p99': compare_samples(by_name[a]['p99'], by_name[b]['p99'], alpha),
+                }
+                for a, b in itertools.combinations(sorted(by_name), 2)
+            ],
+        }
+
+    output_file = os.path.join(output_dir, 'trials.json')
+    with open(output_file, 'w') as f:
+        json.dump(summary, f, indent=4)
+    print(format_trials(summary))
+    print(f'Trial summary saved to {output_file}')
+    return summary
+
+def format_trials(summary):
+    """
+    One table per endpoint, fastest first, each framework compared with the fastest.
+
+    Differences from the fastest that are not significant are marked "n.s.".
+    """
+    lines = []
+    for endpoint, entry in summary.items():
+        frameworks = entry['frameworks']
+        ranked = sorted(frameworks, key=lambda name: -frameworks[name]['requests_per_sec']['median'])
+        comparisons = {(item['a'], item['b']): item for item in entry['comparisons']}
+        lines.append(f'{endpoint}:')
+        lines.append(f"  {'framework':<20} {'n':>3} {'req/s':>11} {'95% CI':>21} {'p99 ms':>9} {'95% CI':>17}"
+                     f"  req/s and p99 vs {ranked[0]}")
+        for name in ranked:
+            rps = frameworks[name]['requests_per_sec']
+            p99 = frameworks[name]['p99']
+            rps_ci = '[{:.0f}, {:.0f}]'.format(*rps['ci_95'])
+            row = f"  {name:<20} {rps['trials']:>3} {rps['median']:>11.2f} {rps_ci:>21}"
+            if p99:
+                p99_ci = '[{:.2f}, {:.2f}]'.format(*(value / 1000 for value in p99['ci_95']))
+                row += f" {p99['median'] / 1000:>9.2f} {p99_ci:>17}"
+            else:
+                row += f" {'':>9} {'':>17}"
+            if name != ranked[0]:
+                pair = comparisons.get((ranked[0], name)) or comparisons.get((name, ranked[0]))
+                row += '  ' + ' '.join(
+                    _versus(frameworks[ranked[0]][metric], frameworks[name][metric], pair[metric])
+                    for metric in ('requests_per_sec', 'p99')
+                )
+            lines.append(row)
+    return '\n'.join(lines)
+
+def _versus(reference, other, comparison):
+    change = stats.relative_change(reference['median'], other['median']) if reference and other else None
+    if change is None or not comparison:
+        return '-'
+    return f"{change * 100:+.1f}%{'' if comparison['significant'] else ' (n.s.)'}"
+
+def framework_overhead(framework, baseline, output_dir='results'):
+    """
+    Compare a framework's results with those of a bare baseline app.
+
+    The baseline serves the same endpoints with the same database code, so
+    the differences are what the framework itself costs per request.
+    Printed and saved to <output_dir>/<framework>_overhead.json.
+
+    Args:
+        framework (str): Results name, e.g. 'fastapi-w1'.
+        baseline (str): Results name of the baseline, e.g. 'fastapi-raw-w1'.
+
+    Returns:
+        dict: Per common endpoint, requests/sec of both and latency deltas
+        in microseconds, or None if either results file is missing.
+    """
+    try:
+        with open(os.path.join(output_dir, f'{framework}_results.json')) as f:
+            results = json.load(f)
+        with open(os.path.join(output_dir, f'{baseline}_results.json')) as f:
+            baseline_results = json.load(f)
+    except OSError:
+        return None
+
+    overhead = {}
+    for endpoint, result in results.items():
+        base = baseline_results.get(endpoint)
+        if not base or 'requests_per_sec' not in result or 'requests_per_sec' not in base:
+            continue
+        rps = result['requests_per_sec']
+        base_rps = base['requests_per_sec']
+        entry = {
+            'requests_per_sec': rps,
+            'baseline_requests_per_sec': base_rps,
+            'throughput_ratio': round(rps / base_rps, 4) if base_rps else None,
+        }
+        for key, value, base_value in (
+            ('avg', result.get('latency', {}).get('avg'), base.get('latency', {}).get('avg')),
+            ('p50', latency_percentile(result, 50), latency_percentile(base, 50)),
+            ('p99', latency_percentile(result, 99), latency_percentile(base, 99)),
+        ):
+            if value is not None and base_value is not None:
+                entry[f'latency_{key}_delta_us'] = round(value - base_value, 2)
+        cpu = result.get('server', {}).get('cpu_seconds_per_1k_requests')
+        base_cpu = base.get('server', {}).get('cpu_seconds_per_1k_requests')
+        if cpu is not None and base_cpu is not None:
+            # CPU milliseconds per request spent beyond the baseline
+            entry['cpu_ms_per_request_delta'] = round(cpu - base_cpu, 4)
+        overhead[endpoint] = entry
+
+    print(f'Overhead of {framework} over {baseline}:')
+    for endpoint, entry in overhead.items():
+        ratio = entry['throughput_ratio']
+        p50 = entry.get('latency_p50_delta_us')
+        print(f"  {endpoint:<24} {entry['requests_per_sec']:>10.0f} vs {entry['baseline_requests_per_sec']:>10.0f} req/s"
+              + (f'  ({ratio:.1%} of baseline)' if ratio is not None else '')
+              + (f'  p50 {p50:+.0f}us' if p50 is not None else ''))
+
+    output_file = os.path.join(output_dir, f'{framework}_overhead.json')
+    with open(output_file, 'w') as f:
+        json.dump({'baseline': baseline, 'endpoints': overhead}, f, indent=4)
+    return overhead
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+def parse_importtime(text, top=10):
+    """
+    Summarise `-X importtime` output (PYTHONPROFILEIMPORTTIME) from a server log.
+
+    Output from several processes (gunicorn master and workers) may be
+    interleaved; self times are summed over all of them.
+
+    Returns:
+        dict: Total import time in microseconds and the top-level imports
+        with the largest cumulative time.
+    """
+    total = 0
+    top_level = {}
+    for line in text.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, module = match.groups()
+        total += int(self_us)
+        # Nested imports are indented by two spaces per level
+        if len(indent) <= 1:
+            top_level[module] = top_level.get(module, 0) + int(cumulative_us)
+    return {
+        'total_us': total,
+        'top_level': dict(sorted(top_level.items(), key=lambda item: -item[1])[:top]),
+    }
+
+def summarize_values(values):
+    if not values:
+        return None
+    return {
+        'median': round(statistics.median(values), 4),
+        'min': round(min(values), 4),
+        'max': round(max(values), 4),
+        'values': [round(value, 4) for value in values],
+    }
+
+def measure_startup(spec, config, log_dir, env=None, db_path='/db'):
+    """
+    Spawn a server with one worker and time how long it takes to serve.
+
+    Returns:
+        dict: Seconds from spawn until the port was bound and until
+        ready_path and `db_path` first answered 200.
+    """
+    server = orchestrator.ManagedServer(
+        spec, 1, port=config.get('port', 8080), ready_path=config.get('ready_path', '/plaintext'),
+        ready_timeout=config.get('ready_timeout', 60), log_dir=log_dir, env=env,
+    )
+    server.start()
+    try:
+        return {
+            'bind_s': server.wait_bound(),
+            'first_plaintext_s': server.wait_ready(interval=0.005),
+            'first_db_s': server.wait_ready(db_path, interval=0.005),
+        }
+    finally:
+        server.stop()
+
+def measure_importtime(spec, config, log_dir, env=None):
+    """
+    Spawn a server with PYTHONPROFILEIMPORTTIME=1 and parse its import times.
+
+    This is a separate spawn because the instrumentation slows imports down.
+    """
+    server = orchestrator.ManagedServer(
+        spec, 1, port=config.get('port', 8080), ready_path=config.get('ready_path', '/plaintext'),
+        ready_timeout=config.get('ready_timeout', 60), log_dir=log_dir,
+        env={**(env or {}), 'PYTHONPROFILEIMPORTTIME': '1'},
+    )
+    offset = os.path.getsize(server.log_path) if os.path.exists(server.log_path) else 0
+    with server:
+        pass
+    with open(server.log_path, errors='replace') as f:
+        f.seek(offset)
+        return parse_importtime(f.read())
+
+STARTUP_VARIANTS = {'eager': {'CACHE_WARM': '1'}, 'lazy': {'LAZY_INIT': '1'}}
+
+def run_startup(config_path=orchestrator.DEFAULT_CONFIG, only=None, repeats=5, output_dir='results',
+                variants=('eager', 'lazy')):
+    """
+    Benchmark cold start: spawn each server `repeats` times per variant.
+
+    Every spawn measures time to bind and time to the first successful
+    /plaintext and /db. Further spawns with PYTHONPROFILEIMPORTTIME collect
+    import times. The 'eager' variant also preloads the World cache
+    (CACHE_WARM=1); the 'lazy' variant starts the apps with LAZY_INIT=1,
+    which defers templates and pool warm-up to first use and leaves the
+    World cache empty. Medians are printed and everything is saved to
+    <output_dir>/startup.json.
+
+    Returns:
+        dict: Results per server and variant.
+    """
+    config = orchestrator.load_config(config_path)
+    specs = [spec for spec in config['servers'] if not only or spec['name'] in only]
+    log_dir = os.path.join(output_dir, 'logs', 'startup')
+    results = {}
+
+    for spec in specs:
+        for variant in variants:
+            env = STARTUP_VARIANTS[variant]
+            name = f"{spec['name']}-{variant}"
+            runs = []
+            imports = []
+            try:
+                for _ in range(repeats):
+                    runs.append(measure_startup(spec, config, log_dir, env))
+                    imports.append(measure_importtime(spec, config, log_dir, env))
+            except orchestrator.ServerError as e:
+                print(f'Skipping {name}: {e}')
+                continue
+            results[name] = {
+                'repeats': repeats,
+                'env': env,
+                **{key: summarize_values([run[key] for run in runs]) for key in runs[0]},
+                'importtime_us': summarize_values([entry['total_us'] for entry in imports]),
+                'top_level_imports_us': imports[-1]['top_level'],
+            }
+            result = results[name]
+            print(f"{name}: bind {result['bind_s']['median']:.3f}s, "
+                  f"/plaintext {result['first_plaintext_s']['median']:.3f}s, "
+                  f"/db {result['first_db_s']['median']:.3f}s, "
+                  f"imports {result['importtime_us']['median'] / 1000:.1f}ms (medians of {repeats})")
+
+    os.makedirs(output_dir, exist_ok=True)
+    output_file = os.path.join(output_dir, 'startup.json')
+    with open(output_file, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f'Results saved to {output_file}')
+    return results
+
+def run_scale(config_path=orchestrator.DEFAULT_CONFIG, sizes=(10000, 1000000, 10000000), only=None,
+              output_dir='results', loaders=None, cache_size=10000, **options):
+    """
+    Run the suite once per World table size to see how each framework degrades with data size.
+
+    For every size the World tables are bulk-loaded (see dataset.py) and the
+    servers started with WORLD_ROWS set to it, so requests spread over the
+    whole id range. The in-process World caches are capped at `cache_size`
+    rows for every size, so /cached-queries keeps the same memory budget
+    while its hit ratio falls. Results for each size go to
+    <output_dir>/scale/<size>; summarize_scale() compares them. The
+    database is left at the last size.
+
+    Args:
+        config_path (str): Declarative server config, see servers.json.
+        sizes (list): World row counts, smallest first.
+        only (list): Names of the servers to run, default all.
+        output_dir (str): Directory for results and server logs.
+        loaders (int): Parallel COPY processes, default one per CPU.
+        cache_size (int): CACHE_SIZE for the apps, 0 to cache every row.
+        **options: Passed on to run_suite().
+
+    Returns:
+        dict: See summarize_scale().
+    """
+    limits = dataset.memory_limits()
+    datasets = {}
+    for size in sizes:
+        size = int(size)
+        print(f'Loading {size} World rows')
+        datasets[size] = dataset.load_world(size, loaders)
+        env = {'WORLD_ROWS': str(size)}
+        if cache_size:
+            env['CACHE_SIZE'] = str(cache_size)
+        run_suite(config_path, only=only, output_dir=os.path.join(output_dir, 'scale', str(size)), env=env, **options)
+    return summarize_scale(output_dir, datasets, limits)
+
+def summarize_scale(output_dir, datasets, limits):
+    """
+    Throughput and p99 per server and endpoint for every dataset size, relative to the smallest.
+
+    Each size is marked with where the World table stands against memory:
+    'shared_buffers' once it no longer fits in Postgres' buffer cache, 'ram'
+    once it exceeds the host's memory. Printed as a table and saved to
+    <output_dir>/scale.json.
+
+    Args:
+        output_dir (str): Directory run_scale() wrote <output_dir>/scale/<size> to.
+        datasets (dict): Size to the dataset.load_world() report.
+        limits (dict): dataset.memory_limits().
+
+    Returns:
+        dict: 'sizes' with table size and memory fit per size, and 'results'
+        with per server, per endpoint, the figures for each size.
+    """
+    sizes = sorted(datasets)
+    fits = {}
+    for size in sizes:
+        table_bytes = datasets[size].get('world', next(iter(datasets[size].values())))['size_bytes']
+        if limits['memory_bytes'] and table_bytes > limits['memory_bytes']:
+            fits[size] = 'ram'
+        elif table_bytes > limits['shared_buffers_bytes']:
+            fits[size] = 'shared_buffers'
+        else:
+            fits[size] = 'fits'
+    results = {}
+    for size in sizes:
+        size_dir = os.path.join(output_dir, 'scale', str(size))
+        for filename in sorted(os.listdir(size_dir)) if os.path.isdir(size_dir) else []:
+            if not filename.endswith('_results.json'):
+                continue
+            with open(os.path.join(size_dir, filename)) as f:
+                framework_results = json.load(f)
+            name = filename[:-len('_results.json')]
+            for endpoint, result in framework_results.items():
+                if 'requests_per_sec' in result:
+                    results.setdefault(name, {}).setdefault(endpoint, {})[str(size)] = {
+                        'requests_per_sec': result['requests_per_sec'],
+                        'p99': latency_percentile(result, 99),
+                    }
+
+    for endpoints in results.values():
+        for by_size in endpoints.values():
+            base = by_size[min(by_size, key=int)]
+            for entry in by_size.values():
+                change = stats.relative_change(base['requests_per_sec'], entry['requests_per_sec'])
+                entry['throughput_ratio'] = round(1 + change, 4) if change is not None else None
+
+    summary = {
+        'limits': limits,
+        'sizes': {
+            str(size): {'tables': datasets[size], 'working_set_exceeds': None if fits[size] == 'fits' else fits[size]}
+            for size in sizes
+        },
+        'results': results,
+    }
+    output_file = os.path.join(output_dir, 'scale.json')
+    with open(output_file, 'w') as f:
+        json.dump(summary, f, indent=4)
+    print(format_scale(summary))
+    print(f'Scale summary saved to {output_file}')
+    return summary
+
+def format_scale(summary):
+    """
+    req/s and share of the smallest size's throughput, one column per size.
+    """
+    sizes = list(summary['sizes'])
+    marks = {'shared_buffers': ' >buf', 'ram': ' >ram'}
+    header = f"{'server':<20} {'endpoint':<24}" + ''.join(
+        f"{size + marks.get(summary['sizes'][size]['working_set_exceeds'], ''):>20}" for size in sizes
+    )
+    lines = [header]
+    for name, endpoints in sorted(summary['results'].items()):
+        for endpoint, by_size in sorted(endpoints.items()):
+            cells = []
+            for size in sizes:
+                entry = by_size.get(size)
+                if not entry:
+                    cells.append(f"{'-':>20}")
+                elif entry['throughput_ratio'] is None:
+                    cells.append(f"{entry['requests_per_sec']:>20.0f}")
+                else:
+                    cells.append(f"{entry['requests_per_sec']:>12.0f} ({entry['throughput_ratio'] * 100:>3.0f}%)")
+            lines.append(f'{name:<20} {endpoint:<24}' + ''.join(cells))
+    lines.append('>buf: World table larger than shared_buffers, >ram: larger than host memory')
+    return '\n'.join(lines)
+
+def _wait_for_page(url, check, timeout, consistent_reads):
+    """
+    Poll `url` until `check(body)` holds for `consistent_reads` responses in a row.
+
+    Consecutive reads are required because each worker has its own cache
+    and a single response only shows the state of one of them.
+
+    Returns:
+        float: Seconds until the condition held, or None on timeout.
+    """
+    started = time.monotonic()
+    streak = 0
+    while time.monotonic() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=2) as response:
+                body = response.read().decode('utf-8', 'replace')
+        except (urllib.error.URLError, ConnectionError, OSError):
+            body = ''
+        streak = streak + 1 if check(body) else 0
+        if streak >= consistent_reads:
+            return round(time.monotonic() - started, 3)
+        time.sleep(0.02)
+    return None
+
+def verify_fortunes_invalidation(base_url, duration='15s', threads=2, connections=10, engine='native',
+                                 timeout=5.0, consistent_reads=20):
+    """
+    Check that /fortunes stays correct when Fortune changes under load.
+
+    While `engine` drives load against /fortunes, a row is inserted,
+    updated and deleted, and after each change /fortunes is polled until
+    every read reflects it. Meant for servers running with FORTUNES_CACHE or
+    FORTUNES_CACHE_HTML and fortune_notify.sql applied.
+
+    Args:
+        base_url (str): Base URL of the server.
+        timeout (float): Longest acceptable delay before a change is visible.
+        consistent_reads (int): Reads in a row that must show the change.
+
+    Returns:
+        dict: Seconds until each change was visible (None if it never was),
+        whether all of them were within `timeout`, and the load result.
+    """
+    url = f'{base_url}/fortunes'
+    load = {}
+    load_thread = threading.Thread(
+        target=lambda: load.update(ENGINES[engine](url, duration, threads, connections)), daemon=True)
+    load_thread.start()
+    time.sleep(1)
+
+    inserted = f'cache-check-{uuid.uuid4().hex}'
+    updated = f'cache-check-{uuid.uuid4().hex}'
+    db = connect_db()
+    fortune_id = None
+    result = {}
+    try:
+        with db.cursor() as cursor:
+            cursor.execute(
+                'INSERT INTO Fortune (id, message) SELECT COALESCE(max(id), 0) + 1, %s FROM Fortune RETURNING id',
+                (inserted,))
+            fortune_id = cursor.fetchone()[0]
+        db.commit()
+        result['insert_visible_after'] = _wait_for_page(url, lambda body: inserted in body, timeout, consistent_reads)
+
+        with db.cursor() as cursor:
+            cursor.execute('UPDATE Fortune SET message = %s WHERE id = %s', (updated, fortune_id))
+        db.commit()
+        result['update_visible_after'] = _wait_for_page(
+            url, lambda body: updated in body and inserted not in body, timeout, consistent_reads)
+
+        with db.cursor() as cursor:
+            cursor.execute('DELETE FROM Fortune WHERE id = %s', (fortune_id,))
+        db.commit()
+        fortune_id = None
+        result['delete_visible_after'] = _wait_for_page(url, lambda body: updated not in body, timeout, consistent_reads)
+    finally:
+        if fortune_id is not None:
+            with db.cursor() as cursor:
+                cursor.execute('DELETE FROM Fortune WHERE id = %s', (fortune_id,))
+            db.commit()
+        db.close()
+        load_thread.join()
+
+    result['passed'] = all(result.get(key) is not None for key in (
+        'insert_visible_after', 'update_visible_after', 'delete_visible_after'))
+    result['load'] = load
+    return result
+
+def compare(before, after='latest', history_db=HISTORY_DB, threshold=0.05, alpha=0.05, label=None):
+    """
+    Print a comparison of two stored runs and report whether anything regressed.
+
+    Args:
+        before (str): Run id, git SHA (or prefix), 'latest' or 'previous'.
+        after (str): Same as `before`.
+        history_db (str): SQLite database written by run_benchmark().
+        threshold (float): Relative change that counts as a regression.
+        alpha (float): Significance level of the permutation test.
+        label (str): Only pool runs with this label.
+
+    Returns:
+        list: The comparison rows, see results_store.compare_runs().
+    """
+    history = results_store.connect(history_db)
+    try:
+        comparison = results_store.compare_runs(history, before, after, threshold, alpha, label)
+    finally:
+        history.close()
+    print(results_store.format_comparison(comparison))
+    untested = sum(
+        (item[metric] or {}).get('tested') is False
+        for item in comparison for metric in ('requests_per_sec', 'p99')
+    )
+    if untested:
+        print(f'Warning: {untested} metrics had fewer than {results_store.MIN_SAMPLES} runs per side and were '
+              f'judged on the {threshold:.0%} threshold alone (marked untested); run `suite --trials '
+              f'{results_store.MIN_TRIALS_FOR_5_PERCENT}` on both commits and compare by git SHA for a significance test')
+    return comparison
+
+def interactive():
+    """
+    Prompt for base URLs and options, then run the benchmark.
+    """
     print("Enter Base URLs example : http://localhost:8000 ")
     django_base_url = input("Please enter url for django \n")
     fastapi_base_url = input("Please enter url for fastapi \n")
@@ -146,14 +1507,191 @@ if __name__ == '__main__':
     if gin_gorm_base_url:
         frameworks['gin'] = gin_gorm_base_url
 
+    servers = {}
+    for framework in frameworks:
+        pidfile = input(f"PID file of the {framework} server for resource sampling (blank to skip) \n")
+        if pidfile:
+            servers[framework] = pidfile
+
+    engine = input("Load engine to use (wrk/native), default wrk \n") or 'wrk'
+
+    rates = input("Constant request rates for open-loop mode (e.g. 1000,2000,4000), blank for max throughput \n")
+    rates = [int(rate) for rate in rates.split(',') if rate.strip()]
+
+    sweep = input("Run a concurrency sweep with knee detection (y/N) \n").strip().lower() == 'y'
+
+    server_timing = input("Sample Server-Timing phase breakdown from apps started with SERVER_TIMING=1 (y/N) \n").strip().lower() == 'y'
+
+    profile = input("Seconds of stack sampling per endpoint, for servers started with PROFILER=1 (blank to skip) \n")
+    profile = float(profile) if profile.strip() else None
+
+    db_stats = input("Report database statements, DB time and commits per request from pg_stat_statements (y/N) \n").strip().lower() == 'y'
+
+    scenarios = input("Comma-separated scenarios to run after the endpoints (files or names in scenarios/, blank to skip) \n")
+    scenarios = [load_scenario(path.strip()) for path in scenarios.split(',') if path.strip()]
+
+    warmup_seconds = input("Maximum warmup seconds per endpoint (0 to disable), default 30 \n")
+    warmup_seconds = int(warmup_seconds) if warmup_seconds.strip() else DEFAULT_WARMUP['max_seconds']
+    warmup = {'default': {'max_seconds': warmup_seconds}} if warmup_seconds else None
+
+    trials = input("Number of trials, interleaving the frameworks in random order (default 1) \n")
+    trials = int(trials) if trials.strip() else 1
+
     queries = input("Enter Queries you want to make for multiple queries and updates \n")
-    endpoints = [
-        'json',
-        'plaintext',
-        'fortunes',
-        'db',
-        f'dbs?queries={queries}',
-        f'updates?queries={queries}',
-    ]
-    
-    run_benchmark(frameworks, endpoints, duration='30s', threads=2, connections=10)
+    endpoints = default_endpoints(queries)
+
+    options = dict(duration='30s', threads=2, connections=10, engine=engine, rates=rates, sweep=sweep, warmup=warmup, servers=servers, server_timing=server_timing, profile=profile, scenarios=scenarios, db_stats=db_stats)
+    if trials > 1:
+        run_trials(frameworks, endpoints, trials, **options)
+    else:
+        run_benchmark(frameworks, endpoints, **options)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark web frameworks. Without a command, prompts for base URLs.')
+    commands = parser.add_subparsers(dest='command')
+
+    compare_parser = commands.add_parser(
+        'compare', help='Compare two stored runs and flag regressions',
+        description='Significance is tested across repeated runs only: select each side by git SHA after '
+                    f'`suite --trials N`. With fewer than {results_store.MIN_SAMPLES} runs per side only the '
+                    'threshold is applied and the result is marked untested; at least '
+                    f'{results_store.MIN_TRIALS_FOR_5_PERCENT} runs per side are needed for p < 0.05. A SHA '
+                    "selects that commit's clean runs, SHA-dirty its runs with uncommitted changes.")
+    compare_parser.add_argument('before', help="Run id, git SHA (or prefix), 'latest' or 'previous'")
+    compare_parser.add_argument('after', nargs='?', default='latest', help="Same as before, default 'latest'")
+    compare_parser.add_argument('--db', default=HISTORY_DB, help='History database')
+    compare_parser.add_argument('--threshold', type=float, default=0.05, help='Relative change treated as a regression')
+    compare_parser.add_argument('--alpha', type=float, default=0.05, help='Significance level')
+    compare_parser.add_argument('--label', help='Only pool runs with this label (trial suffixes ignored)')
+
+    suite_parser = commands.add_parser('suite', help='Start, benchmark and stop each server from servers.json')
+    suite_parser.add_argument('--config', default=orchestrator.DEFAULT_CONFIG, help='Server config file')
+    suite_parser.add_argument('--only', help='Comma-separated server names, default all')
+    suite_parser.add_argument('--workers', help="Comma-separated worker counts, e.g. 1,cpu_count")
+    suite_parser.add_argument('--queries', type=int, default=20, help='Queries for dbs/updates')
+    suite_parser.add_argument('--engine', choices=sorted(ENGINES), default='wrk')
+    suite_parser.add_argument('--duration', default='30s')
+    suite_parser.add_argument('--threads', type=int, default=2)
+    suite_parser.add_argument('--connections', type=int, default=10)
+    suite_parser.add_argument('--warmup', type=int, default=DEFAULT_WARMUP['max_seconds'],
+                              help='Maximum warmup seconds per endpoint, 0 to disable')
+    suite_parser.add_argument('--sweep', action='store_true', help='Run a concurrency sweep per endpoint')
+    suite_parser.add_argument('--label', help='Note stored with the run history')
+    suite_parser.add_argument('--server-timing', action='store_true',
+                              help='Start the apps with SERVER_TIMING=1 and report a per-phase breakdown')
+    suite_parser.add_argument('--profile', type=float, metavar='SECONDS',
+                              help='Sample worker stacks for this long in the middle of each run')
+    suite_parser.add_argument('--db-stats', action='store_true',
+                              help='Report statements, DB time and commits per request from the Postgres statistics views')
+    suite_parser.add_argument('--trials', type=int, default=1,
+                              help='Repeat the suite in shuffled server order and compare with confidence intervals')
+    suite_parser.add_argument('--seed', type=int, help='Seed for the trial order')
+    suite_parser.add_argument('--scenario', action='append', default=[], metavar='FILE',
+                              help='Also run this weighted endpoint mix (file or name in scenarios/), repeatable')
+
+    overhead_parser = commands.add_parser('overhead', help='Compare saved results against a bare baseline app')
+    overhead_parser.add_argument('framework', help="Results name, e.g. 'fastapi-w1'")
+    overhead_parser.add_argument('baseline', help="Results name of the baseline, e.g. 'fastapi-raw-w1'")
+    overhead_parser.add_argument('--results', default='results', help='Results directory')
+
+    startup_parser = commands.add_parser('startup', help='Measure cold start of the servers in the config')
+    startup_parser.add_argument('--config', default=orchestrator.DEFAULT_CONFIG, help='Server config file')
+    startup_parser.add_argument('--only', help='Comma-separated server names, default all')
+    startup_parser.add_argument('--repeats', type=int, default=5, help='Spawns per server and variant')
+    startup_parser.add_argument('--variants', default='eager,lazy',
+                                help=f"Comma-separated, from {', '.join(STARTUP_VARIANTS)}")
+
+    scale_parser = commands.add_parser('scale', help='Run the suite at several World table sizes')
+    scale_parser.add_argument('--sizes', default='10k,1M,10M,100M', help='Comma-separated World row counts')
+    scale_parser.add_argument('--config', default=orchestrator.DEFAULT_CONFIG, help='Server config file')
+    scale_parser.add_argument('--only', help='Comma-separated server names, default all')
+    scale_parser.add_argument('--loaders', type=int, help='Parallel COPY processes, default one per CPU')
+    scale_parser.add_argument('--cache-size', type=int, default=10000,
+                              help='World cache rows per worker for every size, 0 to cache all rows')
+    scale_parser.add_argument('--queries', type=int, default=20, help='Queries for dbs/updates')
+    scale_parser.add_argument('--engine', choices=sorted(ENGINES), default='wrk')
+    scale_parser.add_argument('--duration', default='30s')
+    scale_parser.add_argument('--connections', type=int, default=10)
+    scale_parser.add_argument('--db-stats', action='store_true',
+                              help='Report statements, DB time and commits per request from the Postgres statistics views')
+
+    verify_parser = commands.add_parser('verify-fortunes',
+                                        help='Mutate Fortune under load and check /fortunes follows')
+    verify_parser.add_argument('base_url', help='e.g. http://localhost:8080')
+    verify_parser.add_argument('--engine', choices=sorted(ENGINES), default='native')
+    verify_parser.add_argument('--duration', default='15s')
+    verify_parser.add_argument('--timeout', type=float, default=5.0,
+                               help='Longest acceptable delay in seconds before a change is visible')
+
+    args = parser.parse_args(argv)
+    if args.command == 'verify-fortunes':
+        result = verify_fortunes_invalidation(args.base_url, args.duration, engine=args.engine, timeout=args.timeout)
+        print(json.dumps({key: value for key, value in result.items() if key != 'load'}, indent=4))
+        return 0 if result['passed'] else 1
+    if args.command == 'overhead':
+        if framework_overhead(args.framework, args.baseline, args.results) is None:
+            parser.error(f'No saved results for {args.framework} or {args.baseline} in {args.results}')
+        return 0
+    if args.command == 'scale':
+        run_scale(
+            args.config,
+            sizes=sorted(dataset.parse_rows(size) for size in args.sizes.split(',')),
+            only=args.only.split(',') if args.only else None,
+            loaders=args.loaders,
+            cache_size=args.cache_size,
+            queries=args.queries,
+            engine=args.engine,
+            duration=args.duration,
+            connections=args.connections,
+            db_stats=args.db_stats,
+        )
+        return 0
+    if args.command == 'startup':
+        run_startup(
+            args.config,
+            only=args.only.split(',') if args.only else None,
+            repeats=args.repeats,
+            variants=args.variants.split(','),
+        )
+        return 0
+    if args.command == 'suite':
+        try:
+            scenarios = [load_scenario(path) for path in args.scenario]
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        run_suite(
+            args.config,
+            only=args.only.split(',') if args.only else None,
+            workers=args.workers.split(',') if args.workers else None,
+            queries=args.queries,
+            engine=args.engine,
+            duration=args.duration,
+            threads=args.threads,
+            connections=args.connections,
+            warmup={'default': {'max_seconds': args.warmup}} if args.warmup else None,
+            sweep=args.sweep,
+            label=args.label,
+            server_timing=args.server_timing,
+            profile=args.profile,
+            scenarios=scenarios,
+            db_stats=args.db_stats,
+            trials=args.trials,
+            seed=args.seed,
+        )
+        return 0
+    if args.command == 'compare':
+        try:
+            comparison = compare(args.before, args.after, args.db, args.threshold, args.alpha, args.label)
+        except ValueError as e:
+            parser.error(str(e))
+        regressed = any(
+            (item[metric] or {}).get('verdict') == 'REGRESSION'
+            for item in comparison for metric in ('requests_per_sec', 'p99')
+        )
+        return 1 if regressed else 0
+
+    interactive()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
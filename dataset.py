@@ -0,0 +1,226 @@
+"""
+Bulk-load World (and optionally Fortune) tables of any size.
+
+base_db.sql creates 10,000 World rows, which fit in shared_buffers many
+times over. This reloads the World tables with N rows (up to ~100M): the
+primary key is dropped, `loaders` processes each COPY their own id range
+in, and the key is rebuilt and the table vacuumed and analysed afterwards,
+which is much faster than maintaining the index row by row. Tables are
+truncated rather than recreated, so grants from create_user.sql survive.
+
+The apps read the id range from WORLD_ROWS; `benchmark.py scale` loads
+each size and starts the servers with it.
+
+Usage:
+    python dataset.py 10M --loaders 8
+    python dataset.py 10000            # back to the base_db.sql size
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import re
+import sys
+import time
+
+from pgconn import connect_db
+
+# World tables and their primary key constraints: the Python apps use
+# world, the Node and Go apps "World".
+WORLD_TABLES = {'world': 'world_pkey', '"World"': '"World_pkey"'}
+FORTUNE_TABLES = {'fortune': 'fortune_pkey', '"Fortune"': '"Fortune_pkey"'}
+# Fortunes 1-12 from base_db.sql are kept, generated ones come after them
+BASE_FORTUNES = 12
+CHUNK_ROWS = 65536
+COPY_READ_SIZE = 1 << 20
+MAX_RANDOM_NUMBER = 10000
+ROW_UNITS = {'': 1, 'k': 1000, 'M': 1000000, 'G': 1000000000}
+
+
+def parse_rows(text):
+    """
+    Convert a row count such as '10000', '1M' or '2.5k' to an int.
+    """
+    match = re.fullmatch(r'([\d.]+)\s*([kMG]?)', str(text).strip())
+    if not match:
+        raise ValueError(f'Unrecognised row count {text!r}')
+    return int(float(match.group(1)) * ROW_UNITS[match.group(2)])
+
+
+class RowStream:
+    """
+    File-like COPY source generating tab-separated rows for ids start..stop-1.
+
+    psycopg2's copy_expert() only calls read(), so rows are produced one
+    chunk at a time instead of being built in memory up front.
+    """
+
+    def __init__(self, start, stop, row):
+        self.next_id = start
+        self.stop = stop
+        self.row = row
+        self.chunk = b''
+        self.offset = 0
+
+    def read(self, size=-1):
+        if self.offset >= len(self.chunk):
+            if self.next_id >= self.stop:
+                return b''
+            end = min(self.next_id + CHUNK_ROWS, self.stop)
+            self.chunk = ''.join(self.row(row_id) for row_id in range(self.next_id, end)).encode()
+            self.offset = 0
+            self.next_id = end
+        end = len(self.chunk) if size < 0 else self.offset + size
+        data = self.chunk[self.offset:end]
+        self.offset += len(data)
+        return data
+
+
+def _copy_world_range(table, start, stop, seed):
+    rng = random.Random(seed + start)
+    randint = rng.randint
+    connection = connect_db()
+    try:
+        with connection, connection.cursor() as cursor:
+            cursor.execute('SET synchronous_commit = off')
+            cursor.copy_expert(
+                f'COPY {table} (id, randomnumber) FROM STDIN',
+                RowStream(start, stop, lambda row_id: f'{row_id}\t{randint(1, MAX_RANDOM_NUMBER)}\n'),
+                size=COPY_READ_SIZE,
+            )
+    finally:
+        connection.close()
+    return stop - start
+
+
+def split_range(first, last, parts):
+    """
+    Split ids first..last (inclusive) into at most `parts` contiguous (start, stop) ranges.
+    """
+    total = last - first + 1
+    parts = max(1, min(parts, total))
+    bounds = [first + total * part // parts for part in range(parts + 1)]
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+
+def _execute(statements):
+    connection = connect_db()
+    connection.autocommit = True
+    try:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+            return cursor.fetchall() if cursor.description else None
+    finally:
+        connection.close()
+
+
+def load_world(rows, loaders=None, tables=WORLD_TABLES, seed=0):
+    """
+    Replace the contents of the World tables with ids 1..rows.
+
+    Args:
+        rows (int): Number of rows per table.
+        loaders (int): Parallel COPY processes per table, default one per CPU.
+        tables (dict): Table name to primary key constraint name.
+        seed (int): Seed for the random numbers, so sizes are reproducible.
+
+    Returns:
+        dict: Per table, seconds spent loading and indexing and the
+        resulting size in bytes including the index.
+    """
+    loaders = loaders or os.cpu_count()
+    report = {}
+    for table, primary_key in tables.items():
+        _execute([
+            f'ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {primary_key}',
+            f'TRUNCATE {table}',
+        ])
+
+        started = time.monotonic()
+        ranges = split_range(1, rows, loaders)
+        with multiprocessing.Pool(len(ranges)) as pool:
+            pool.starmap(_copy_world_range, [(table, start, stop, seed) for start, stop in ranges])
+        loaded = time.monotonic()
+
+        # VACUUM also sets the visibility map, so id lookups can use index-only scans
+        size = _execute([
+            "SET maintenance_work_mem = '1GB'",
+            f'ALTER TABLE {table} ADD CONSTRAINT {primary_key} PRIMARY KEY (id)',
+            f'VACUUM ANALYZE {table}',
+            f"SELECT pg_total_relation_size('{table}')",
+        ])[0][0]
+        report[table] = {
+            'rows': rows,
+            'loaders': len(ranges),
+            'load_seconds': round(loaded - started, 3),
+            'index_seconds': round(time.monotonic() - loaded, 3),
+            'size_bytes': size,
+        }
+        print(f"Loaded {rows} rows into {table} in {report[table]['load_seconds']}s "
+              f"(+{report[table]['index_seconds']}s indexing), {size / 1024 ** 2:.1f} MB")
+    return report
+
+
+def load_fortunes(rows, tables=FORTUNE_TABLES):
+    """
+    Grow the Fortune tables to `rows` rows, keeping the 12 from base_db.sql.
+
+    Generated fortunes make /fortunes render and sort a larger page; a
+    `rows` of 12 or less restores the base table.
+    """
+    for table in tables:
+        connection = connect_db()
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.execute(f'DELETE FROM {table} WHERE id > %s', (BASE_FORTUNES,))
+                if rows > BASE_FORTUNES:
+                    cursor.copy_expert(
+                        f'COPY {table} (id, message) FROM STDIN',
+                        RowStream(BASE_FORTUNES + 1, rows + 1, lambda row_id: f'{row_id}\tGenerated fortune #{row_id}.\n'),
+                    )
+        finally:
+            connection.close()
+        print(f'Fortune table {table} has {max(rows, BASE_FORTUNES)} rows')
+
+
+def memory_limits():
+    """
+    Memory the working set competes for: Postgres shared_buffers and the host's RAM.
+
+    Returns:
+        dict: shared_buffers_bytes and memory_bytes (None if /proc/meminfo is unreadable).
+    """
+    shared_buffers = _execute([
+        "SELECT setting::bigint * current_setting('block_size')::bigint FROM pg_settings WHERE name = 'shared_buffers'",
+    ])[0][0]
+    memory = None
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    memory = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return {'shared_buffers_bytes': shared_buffers, 'memory_bytes': memory}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Bulk-load World tables of a given size.')
+    parser.add_argument('rows', help="World rows, e.g. 10000, 1M or 100M")
+    parser.add_argument('--loaders', type=int, default=os.cpu_count(), help='Parallel COPY processes per table')
+    parser.add_argument('--tables', default=','.join(WORLD_TABLES),
+                        help='Comma-separated World tables to load, default both spellings')
+    parser.add_argument('--fortunes', type=int, help='Also grow the Fortune tables to this many rows')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    tables = {table: WORLD_TABLES[table] for table in args.tables.split(',')}
+    load_world(parse_rows(args.rows), args.loaders, tables, args.seed)
+    if args.fortunes is not None:
+        load_fortunes(args.fortunes)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,45 @@
+"""
+ASGI config for hello project.
+
+Serves the async views in world.async_views through hello.settings_asgi, so
+the same endpoints can be benchmarked against the WSGI deployment, e.g.
+under gunicorn with uvicorn workers.
+
+"""
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hello.settings_asgi")
+
+from django.core.asgi import get_asgi_application
+application = get_asgi_application()
+
+from shared import profiler
+profiler.install()
+
+import threading
+from django.db import connections
+from shared.worldcache import CACHE_WARM
+from world.views import verify_world_rows, warm_world_cache
+
+_startup_error = None
+
+
+def _startup():
+    global _startup_error
+    try:
+        verify_world_rows()
+        if CACHE_WARM:
+            warm_world_cache()
+    except Exception as exc:
+        _startup_error = exc
+    finally:
+        connections.close_all()
+
+
+# Plain uvicorn imports the app inside its event loop, where Django
+# refuses sync ORM calls, so query from a thread of its own
+_startup_thread = threading.Thread(target=_startup)
+_startup_thread.start()
+_startup_thread.join()
+if _startup_error is not None:
+    raise _startup_error
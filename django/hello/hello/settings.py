@@ -1,4 +1,10 @@
 import os
+import sys
+
+# The repository root, four levels up, holds the shared/ helpers
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from shared.config import LAZY_INIT
 
 DEBUG = False
 
@@ -37,6 +43,8 @@ STATIC_URL = '/static/'
 STATICFILES_DIRS = ()
 STATICFILES_FINDERS = ()
 MIDDLEWARE = ()
+if os.getenv('SERVER_TIMING', '0') == '1':
+    MIDDLEWARE = ('world.timing.ServerTimingMiddleware',)
 
 ROOT_URLCONF = 'hello.urls'
 WSGI_APPLICATION = 'hello.wsgi.application'
@@ -56,6 +64,10 @@ INSTALLED_APPS = (
     'world',
 )
 
+# LAZY_INIT=1 (startup benchmark) skips the contrib apps none of the views use
+if LAZY_INIT:
+    INSTALLED_APPS = ('world',)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': True,
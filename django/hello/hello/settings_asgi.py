@@ -0,0 +1,5 @@
+# Settings for the ASGI deployment (hello.asgi), which serves the async views
+from hello.settings import *  # noqa: F401,F403
+
+ROOT_URLCONF = 'hello.urls_asgi'
+ASGI_APPLICATION = 'hello.asgi.application'
@@ -0,0 +1,14 @@
+from django.urls import re_path
+from world.async_views import plaintext, json, db, dbs, dbs_bulk, cached_queries, fortunes, update, update_bulk
+
+urlpatterns = [
+    re_path(r'^plaintext$', plaintext),
+    re_path(r'^json$', json),
+    re_path(r'^db$', db),
+    re_path(r'^dbs$', dbs),
+    re_path(r'^dbs-batch$', dbs_bulk),
+    re_path(r'^cached-queries$', cached_queries),
+    re_path(r'^fortunes$', fortunes),
+    re_path(r'^updates$', update),
+    re_path(r'^updates-batch$', update_bulk),
+]
@@ -19,3 +19,13 @@ os.environ.setdefault("DJANGO_SETTINGS_MODULE", "hello.settings")
 
 from django.core.wsgi import get_wsgi_application
 application = get_wsgi_application()
+
+from shared import profiler
+profiler.install()
+
+from world.views import verify_world_rows, warm_world_cache
+verify_world_rows()
+
+from shared.worldcache import CACHE_WARM
+if CACHE_WARM:
+    warm_world_cache()
@@ -0,0 +1,126 @@
+"""
+Async counterparts of world.views for the ASGI deployment (hello.asgi).
+
+They do the same queries as the sync views, one aget()/asave() per row,
+so the two deployments differ only in the server interface.
+"""
+import random
+from operator import itemgetter
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.shortcuts import render
+from ujson import dumps as uj_dumps
+
+from shared.config import FORTUNES_CACHE, FORTUNES_CACHE_HTML, WORLD_ROWS
+from world.models import World, Fortune
+from world.timing import phase
+from world.views import (
+    _bulk_update, _get_queries, _load_fortunes, _random_id,
+    _random_int, _render_fortunes, fortune_cache, world_cache,
+)
+
+
+async def _afetch_worlds(ids):
+    with phase('db'):
+        return [row async for row in World.objects.filter(id__in=ids).values_list('id', 'randomnumber')]
+
+
+async def _aload_fortunes():
+    with phase('db'):
+        fortunes = [fortune async for fortune in Fortune.objects.values('id', 'message')]
+    fortunes.append({"id": 0, 'message': "Additional fortune added at request time."})
+    fortunes.sort(key=itemgetter('message'))
+    return fortunes
+
+
+async def plaintext(request):
+    return HttpResponse("Hello, World!", content_type="text/plain")
+
+
+async def json(request):
+    return HttpResponse(
+            uj_dumps({"message": "Hello, World!"}),
+            content_type="application/json"
+        )
+
+
+async def db(request):
+    r = _random_id()
+    with phase('db'):
+        world = await World.objects.aget(id=r)
+    with phase('serialize'):
+        body = uj_dumps({'id': r, 'randomNumber': world.randomnumber})
+    return HttpResponse(body, content_type="application/json")
+
+
+async def dbs(request):
+    queries = _get_queries(request)
+    worlds = []
+    with phase('db'):
+        for _ in range(queries):
+            int_ = _random_id()
+            world = await World.objects.aget(id=int_)
+            worlds.append({'id': int_, 'randomNumber': world.randomnumber})
+
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
+
+
+async def dbs_bulk(request):
+    ids = random.sample(range(1, WORLD_ROWS + 1), _get_queries(request))
+    with phase('db'):
+        worlds = await World.objects.ain_bulk(ids)
+
+    with phase('serialize'):
+        body = uj_dumps([{'id': id_, 'randomNumber': worlds[id_].randomnumber} for id_ in ids])
+    return HttpResponse(body, content_type="application/json")
+
+
+async def cached_queries(request):
+    queries = _get_queries(request)
+    with phase('cache'):
+        worlds = await world_cache.aget_many(random.sample(range(1, WORLD_ROWS + 1), queries), _afetch_worlds)
+
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
+
+
+async def fortunes(request):
+    # The polling cache checks fortune_version with the sync ORM
+    if FORTUNES_CACHE_HTML:
+        return HttpResponse(await sync_to_async(fortune_cache.get)(_render_fortunes))
+    if FORTUNES_CACHE:
+        fortunes = await sync_to_async(fortune_cache.get)(_load_fortunes)
+    else:
+        fortunes = await _aload_fortunes()
+
+    with phase('render'):
+        return render(request, 'fortunes.html', {'fortunes': fortunes})
+
+
+async def update(request):
+    queries = _get_queries(request)
+    worlds = []
+    for _ in range(queries):
+        with phase('db'):
+            w = await World.objects.aget(id=_random_id())
+        w.randomnumber = _random_int()
+        with phase('write'):
+            await w.asave()
+        worlds.append({'id': w.id, 'randomNumber': w.randomnumber})
+
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
+
+
+async def update_bulk(request):
+    # transaction.atomic() has no async form, so the whole block runs in a thread
+    worlds = await sync_to_async(_bulk_update)(random.sample(range(1, WORLD_ROWS + 1), _get_queries(request)))
+
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
@@ -0,0 +1,39 @@
+"""
+Server-Timing for the Django views; the phase logic is in shared/timing.py.
+
+With SERVER_TIMING=1, settings.py installs ServerTimingMiddleware, which
+starts a RequestTiming per request in both the WSGI and ASGI deployments.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from shared.timing import SERVER_TIMING, RequestTiming, phase  # noqa: F401
+
+
+class ServerTimingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timing = RequestTiming()
+        try:
+            response = self.get_response(request)
+        finally:
+            timing.close()
+        response['Server-Timing'] = timing.header()
+        return response
+
+    async def __acall__(self, request):
+        timing = RequestTiming()
+        try:
+            response = await self.get_response(request)
+        finally:
+            timing.close()
+        response['Server-Timing'] = timing.header()
+        return response
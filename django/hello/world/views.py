@@ -3,14 +3,51 @@ from operator import itemgetter
 from functools import partial
 from ujson import dumps as uj_dumps
 
+from django.db import connection, transaction
 from django.http import HttpResponse
 from django.shortcuts import render
+from django.template.loader import render_to_string
 
 from world.models import World, Fortune
+from shared.config import (
+    FORTUNES_CACHE, FORTUNES_CACHE_HTML, FORTUNES_POLL_INTERVAL, WORLD_ROWS, WORLD_ROWS_SQL, check_world_rows,
+)
+from shared.worldcache import WorldCache
+from shared.fortunecache import PollingFortuneCache
+from world.timing import phase
 
 
+_random_id = partial(random.randint, 1, WORLD_ROWS)
 _random_int = partial(random.randint, 1, 10000)
 
+world_cache = WorldCache()
+
+
+def _fetch_worlds(ids):
+    with phase('db'):
+        return list(World.objects.filter(id__in=ids).values_list('id', 'randomnumber'))
+
+
+def _read_fortune_version():
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT version FROM fortune_version')
+        return cursor.fetchone()[0]
+
+
+fortune_cache = PollingFortuneCache(_read_fortune_version, FORTUNES_POLL_INTERVAL)
+
+
+def verify_world_rows():
+    with connection.cursor() as cursor:
+        cursor.execute(WORLD_ROWS_SQL)
+        check_world_rows(cursor.fetchone()[0])
+
+
+def warm_world_cache():
+    world_cache.update(
+        World.objects.order_by('id').values_list('id', 'randomnumber')[:world_cache.capacity_rows()]
+    )
+
 
 def _get_queries(request):
     try:
@@ -36,11 +73,14 @@ def json(request):
 
 
 def db(request):
-    r = _random_int()
-    world = uj_dumps({
-        'id': r,
-        'randomNumber': World.objects.get(id=r).randomnumber
-    })
+    r = _random_id()
+    with phase('db'):
+        number = World.objects.get(id=r).randomnumber
+    with phase('serialize'):
+        world = uj_dumps({
+            'id': r,
+            'randomNumber': number
+        })
     return HttpResponse(world, content_type="application/json")
 
 
@@ -48,29 +88,96 @@ def dbs(request):
     queries = _get_queries(request)
 
     def caller(input_):
-        int_ = _random_int()
+        int_ = _random_id()
         return {'id': int_, 'randomNumber': World.objects.get(id=int_).randomnumber}
-    worlds = tuple(map(caller, range(queries)))
+    with phase('db'):
+        worlds = tuple(map(caller, range(queries)))
 
-    return HttpResponse(uj_dumps(worlds), content_type="application/json")
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
 
 
-def fortunes(request):
-    fortunes = list(Fortune.objects.values('id', 'message'))
+def dbs_bulk(request):
+    ids = random.sample(range(1, WORLD_ROWS + 1), _get_queries(request))
+    with phase('db'):
+        worlds = World.objects.in_bulk(ids)
+
+    with phase('serialize'):
+        body = uj_dumps([{'id': id_, 'randomNumber': worlds[id_].randomnumber} for id_ in ids])
+    return HttpResponse(body, content_type="application/json")
+
+
+def cached_queries(request):
+    queries = _get_queries(request)
+    with phase('cache'):
+        worlds = world_cache.get_many(random.sample(range(1, WORLD_ROWS + 1), queries), _fetch_worlds)
+
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
+
+
+def _load_fortunes():
+    with phase('db'):
+        fortunes = list(Fortune.objects.values('id', 'message'))
     fortunes.append({"id": 0, 'message': "Additional fortune added at request time."})
     fortunes.sort(key=itemgetter('message'))
+    return fortunes
+
+
+def _render_fortunes():
+    fortunes = _load_fortunes()
+    with phase('render'):
+        return render_to_string('fortunes.html', {'fortunes': fortunes})
+
+
+def fortunes(request):
+    if FORTUNES_CACHE_HTML:
+        return HttpResponse(fortune_cache.get(_render_fortunes))
+    fortunes = fortune_cache.get(_load_fortunes) if FORTUNES_CACHE else _load_fortunes()
 
-    return render(request, 'fortunes.html', {'fortunes': fortunes})
+    with phase('render'):
+        return render(request, 'fortunes.html', {'fortunes': fortunes})
 
 
 def update(request):
     queries = _get_queries(request)
 
     def caller(input_):
-        w = World.objects.get(id=_random_int())
+        with phase('db'):
+            w = World.objects.get(id=_random_id())
         w.randomnumber = _random_int()
-        w.save()
+        with phase('write'):
+            w.save()
         return {'id': w.id, 'randomNumber': w.randomnumber}
     worlds = tuple(map(caller, range(queries)))
 
-    return HttpResponse(uj_dumps(worlds), content_type="application/json")
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
+
+
+def _bulk_update(ids):
+    # bulk_update()'s single UPDATE locks rows in whatever order its plan
+    # visits them, so two requests with overlapping ids could deadlock.
+    # Locking them first in id order (SELECT ... ORDER BY id FOR UPDATE)
+    # serialises overlapping requests instead. Other writers that lock
+    # several World rows in another order still could, and Postgres would
+    # abort one transaction (a 500), so runs report it as an error.
+    with transaction.atomic():
+        with phase('db'):
+            worlds = {w.id: w for w in World.objects.select_for_update().filter(id__in=ids).order_by('id')}
+        for w in worlds.values():
+            w.randomnumber = _random_int()
+        with phase('write'):
+            World.objects.bulk_update(worlds.values(), ['randomnumber'])
+    return [{'id': id_, 'randomNumber': worlds[id_].randomnumber} for id_ in ids]
+
+
+def update_bulk(request):
+    worlds = _bulk_update(random.sample(range(1, WORLD_ROWS + 1), _get_queries(request)))
+
+    with phase('serialize'):
+        body = uj_dumps(worlds)
+    return HttpResponse(body, content_type="application/json")
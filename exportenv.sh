@@ -4,3 +4,4 @@ export PGUSER="postgres"
 export PGPASS="root"
 export PGHOST="localhost"
 export GIN_MODE=release
+export WORLD_ROWS=10000
@@ -1,3 +1,6 @@
+// Rows in the World table, see dataset.py
+const worldRows = parseInt(process.env.WORLD_ROWS) || 10000;
+
 module.exports = {
 
     sanititizeTotal : (total) => {
@@ -16,5 +19,9 @@ module.exports = {
 
     randomizeNum : () => {
         return Math.floor(Math.random() * 10000) + 1
+    },
+
+    randomWorldId : () => {
+        return Math.floor(Math.random() * worldRows) + 1
     }
 }
\ No newline at end of file
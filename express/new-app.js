@@ -58,7 +58,7 @@ const Fortunes = sequelize.define('fortune', {
 
 const randomWorldPromise = () => {
   return Worlds.findOne({
-    where: { id: helper.randomizeNum() }
+    where: { id: helper.randomWorldId() }
   }).then((result) => {
     return result;
   }).catch((err) => process.exit(1));
@@ -51,7 +51,7 @@ const Fortunes = sequelize.define('fortune', {
 
 const randomWorldPromise = () => {
   return Worlds.findOne({
-    where: { id: helper.randomizeNum() }
+    where: { id: helper.randomWorldId() }
   }).then((results) => {
     return results;
   }).catch((err) => process.exit(1));
@@ -26,7 +26,7 @@ const toClientWorld = (world) => {
 };
 
 async function getRandomWorld() {
-  return toClientWorld(await World.findOne({_id: helper.randomizeNum()}).lean().exec());
+  return toClientWorld(await World.findOne({_id: helper.randomWorldId()}).lean().exec());
 }
 
 // Methods
@@ -44,7 +44,7 @@ async function arrayOfRandomWorlds(totalWorldsToReturn) {
 
 async function getAndUpdateRandomWorld() {
   // it would be nice to use findOneAndUpdate here, but for some reason the test fails with it.
-  const world = await World.findOne({_id: helper.randomizeNum()}).lean().exec();
+  const world = await World.findOne({_id: helper.randomWorldId()}).lean().exec();
   world.randomNumber = helper.randomizeNum();
   await World.updateOne({
     _id: world._id
@@ -77,7 +77,7 @@ module.exports = {
   Query: {
     helloWorld: () => sayHello(),
     getAllWorlds: async () => toClientWorld(await World.find({}).lean().exec()),
-    singleDatabaseQuery: async () => toClientWorld(await World.findOne({_id: helper.randomizeNum()}).lean().exec()),
+    singleDatabaseQuery: async () => toClientWorld(await World.findOne({_id: helper.randomWorldId()}).lean().exec()),
     multipleDatabaseQueries: async (parent, args) => await arrayOfRandomWorlds(args.total),
     getWorldById: async (parent, args) => toClientWorld(await World.findById(args.id).lean().exec()),
     getAllFortunes: async () => toClientWorld(await Fortune.find({}).lean().exec()),
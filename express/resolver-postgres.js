@@ -46,13 +46,13 @@ async function updateRandomWorlds(totalToUpdate) {
 
 const getRandomWorld = async () => {
 
-    let world = await db.one(`select * from World where id = ${helper.randomizeNum()}`, [true])
+    let world = await db.one(`select * from World where id = ${helper.randomWorldId()}`, [true])
     return {"id": world.id, "randomNumber": world.randomnumber};
 };
 
 const updateRandomWorld = async () => {
 
-    let world = await db.oneOrNone(`update world set randomNumber = ${helper.randomizeNum()} where id = ${helper.randomizeNum()} returning id, randomNumber`, [true])
+    let world = await db.oneOrNone(`update world set randomNumber = ${helper.randomizeNum()} where id = ${helper.randomWorldId()} returning id, randomNumber`, [true])
     return {"id": world.id, "randomNumber": world.randomnumber};
 };
 
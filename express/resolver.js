@@ -55,7 +55,7 @@ async function arrayOfRandomWorlds(totalWorldToReturn) {
 
     return new Promise(async (resolve, reject) => {
         for(var i = 0; i < totalIterations; i++) {
-            let world = await World.findByPk(helper.randomizeNum());
+            let world = await World.findByPk(helper.randomWorldId());
             arr.push(world);
         }
         if(arr.length == totalIterations) {
@@ -72,7 +72,7 @@ async function updateRandomWorlds(totalToUpdate) {
     return new Promise(async (resolve, reject) => {
         for(var i = 0; i < total; i++) {
 
-            const world = await World.findByPk(helper.randomizeNum());
+            const world = await World.findByPk(helper.randomWorldId());
             world.updateAttributes({
                 randomNumber: helper.randomizeNum()
             })
@@ -96,7 +96,7 @@ module.exports = {
     Query: {
         helloWorld: () => sayHello(),
         getAllWorlds: async() => await World.findAll(),
-        singleDatabaseQuery: async() => await World.findByPk(helper.randomizeNum()),
+        singleDatabaseQuery: async() => await World.findByPk(helper.randomWorldId()),
         multipleDatabaseQueries: async(parent, args) => await arrayOfRandomWorlds(args.total),
         getWorldById: async(parent, args) => await World.findByPk(args.id),
         getAllFortunes: async() => await Fortune.findAll(),
@@ -1,25 +1,40 @@
 import logging
 import multiprocessing
 import os
+import sys
 from contextlib import asynccontextmanager
 from operator import attrgetter
 from random import randint, sample
 
-from sqlalchemy import Column, Integer, String, select
+from sqlalchemy import Column, Integer, String, select, text
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.orm.attributes import flag_modified
 
 from fastapi import FastAPI, Request
-from fastapi.responses import PlainTextResponse, UJSONResponse
-from fastapi.templating import Jinja2Templates
+from fastapi.responses import HTMLResponse, PlainTextResponse, UJSONResponse
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coalesce import WriteCoalescer
+from shared.config import (
+    DB_GROUP_COMMIT, DB_GROUP_COMMIT_MAX_ROWS, DB_GROUP_COMMIT_WINDOW, DB_POOL_ADAPTIVE, DB_POOL_ADJUST_INTERVAL,
+    DB_POOL_BUDGET, DB_POOL_MIN, DB_POOL_RESERVE, DB_POOL_TARGET_WAIT, FORTUNES_CACHE, FORTUNES_CACHE_HTML,
+    LAZY_INIT, WORLD_ROWS, WORLD_ROWS_SQL, check_world_rows,
+)
+from shared.fortunecache import FortuneCache
+from shared import profiler
+from poolcontrol import AdaptivePool, ConnectionBudget, GatedSessionmaker, connection_budget
+from timing import SERVER_TIMING, ServerTimingMiddleware, phase
+from shared.worldcache import CACHE_WARM, WorldCache
 
 logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
 import asyncio
+import asyncpg
 import uvloop
 asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
 
@@ -48,38 +63,120 @@ ADDITIONAL_FORTUNE = Fortune(
 )
 MAX_POOL_SIZE = 1000//multiprocessing.cpu_count()
 
+WRITE_ROWS_SQL = text(
+    "UPDATE world SET randomnumber = v.randomnumber "
+    "FROM unnest(CAST(:ids AS integer[]), CAST(:numbers AS integer[])) AS v(id, randomnumber) "
+    "WHERE world.id = v.id"
+)
+
 sort_fortunes_key = attrgetter("message")
 
 template_path = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), "templates"
 )
-templates = Jinja2Templates(directory=template_path)
 
 
-async def setup_database():
-    dsn = f"postgresql+asyncpg://{os.getenv('PGUSER', 'postgres')}:{os.getenv('PGPASS', 'root')}@{os.getenv('PGHOST', 'localhost')}:5432/{os.getenv('PGDB', 'benchmark_db')}"
+def get_templates():
+    global templates
+    if templates is None:
+        from fastapi.templating import Jinja2Templates
+        templates = Jinja2Templates(directory=template_path)
+    return templates
+
+
+# With LAZY_INIT jinja2 is imported and set up on the first /fortunes
+templates = None
+if not LAZY_INIT:
+    get_templates()
+
+
+def database_url(scheme="postgresql+asyncpg"):
+    return f"{scheme}://{os.getenv('PGUSER', 'postgres')}:{os.getenv('PGPASS', 'root')}@{os.getenv('PGHOST', 'localhost')}:5432/{os.getenv('PGDB', 'benchmark_db')}"
 
+
+async def setup_database():
+    dsn = database_url()
+
+    if not DB_POOL_ADAPTIVE:
+        engine = create_async_engine(
+            dsn,
+            future=True,
+            pool_size=MAX_POOL_SIZE,
+            connect_args={
+                # "ssl": False  # NEEDED FOR NGINX-UNIT OTHERWISE IT FAILS
+            },
+        )
+        return engine, None
+
+    total = DB_POOL_BUDGET
+    if not total:
+        connection = await asyncpg.connect(database_url("postgresql"))
+        try:
+            total = await connection_budget(connection, DB_POOL_RESERVE)
+        finally:
+            await connection.close()
+    controller = AdaptivePool(
+        ConnectionBudget(total), DB_POOL_MIN, total, DB_POOL_ADJUST_INTERVAL, DB_POOL_TARGET_WAIT
+    )
+    await controller.start()
+    # QueuePool keeps DB_POOL_MIN connections and closes overflow ones on
+    # return, so open connections follow the controller's limit.
     engine = create_async_engine(
         dsn,
         future=True,
-        pool_size=MAX_POOL_SIZE,
-        connect_args={
-            # "ssl": False  # NEEDED FOR NGINX-UNIT OTHERWISE IT FAILS
-        },
+        pool_size=DB_POOL_MIN,
+        max_overflow=max(total - DB_POOL_MIN, 0),
     )
-    return sessionmaker(engine, class_=AsyncSession)
+    return engine, controller
+
+
+def setup_world_writer(engine, controller=None):
+    def begin():
+        # Group commits count against the adaptive pool limit like any other checkout
+        return controller.gate(engine.begin()) if controller is not None else engine.begin()
+
+    async def write_worlds(ids, numbers):
+        async with begin() as conn:
+            await conn.execute(WRITE_ROWS_SQL, {"ids": ids, "numbers": numbers})
+
+    return WriteCoalescer(write_worlds, DB_GROUP_COMMIT_WINDOW, DB_GROUP_COMMIT_MAX_ROWS)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Setup the database connection pool
-    app.state.db_session = await setup_database()
+    engine, app.state.pool_controller = await setup_database()
+    app.state.db_session = sessionmaker(engine, class_=AsyncSession)
+    if app.state.pool_controller is not None:
+        app.state.db_session = GatedSessionmaker(app.state.db_session, app.state.pool_controller)
+    async with app.state.db_session() as sess:
+        check_world_rows((await sess.execute(text(WORLD_ROWS_SQL))).scalar())
+    app.state.world_writer = setup_world_writer(engine, app.state.pool_controller) if DB_GROUP_COMMIT else None
+    app.state.world_cache = WorldCache()
+    if CACHE_WARM:
+        async with app.state.db_session() as sess:
+            ret = await sess.execute(
+                select(World.id, World.randomnumber).order_by(World.id).limit(app.state.world_cache.capacity_rows())
+            )
+            app.state.world_cache.update(ret.all())
+    app.state.fortune_cache = FortuneCache()
+    if FORTUNES_CACHE or FORTUNES_CACHE_HTML:
+        # LISTEN needs a connection of its own, outside the SQLAlchemy pool
+        await app.state.fortune_cache.listen(lambda: asyncpg.connect(database_url("postgresql")))
     yield
+    await app.state.fortune_cache.close()
+    if app.state.pool_controller is not None:
+        await app.state.pool_controller.close()
     # Close the database connection pool
     # await app.state.db_session.close()
 
 
 app = FastAPI(lifespan=lifespan)
+profiler.install()
+if SERVER_TIMING:
+    # Sessions check out connections lazily, so "db" covers pool acquire,
+    # queries and ORM hydration together in this app
+    app.add_middleware(ServerTimingMiddleware)
 
 
 def get_num_queries(queries):
@@ -102,12 +199,14 @@ async def json_serialization():
 
 @app.get("/db")
 async def single_database_query():
-    id_ = randint(1, 10000)
+    id_ = randint(1, WORLD_ROWS)
 
-    async with app.state.db_session() as sess:
-        result = await sess.get(World, id_)
+    with phase("db"):
+        async with app.state.db_session() as sess:
+            result = await sess.get(World, id_)
 
-    return UJSONResponse(result.__json__())
+    with phase("serialize"):
+        return UJSONResponse(result.__json__())
 
 
 @app.get("/dbs")
@@ -115,46 +214,110 @@ async def multiple_database_queries(queries=None):
     num_queries = get_num_queries(queries)
     data = []
 
-    async with app.state.db_session() as sess:
-        for id_ in sample(range(1, 10001), num_queries):
-            result = await sess.get(World, id_)
-            data.append(result.__json__())
+    with phase("db"):
+        async with app.state.db_session() as sess:
+            for id_ in sample(range(1, WORLD_ROWS + 1), num_queries):
+                result = await sess.get(World, id_)
+                data.append(result.__json__())
 
-    return UJSONResponse(data)
+    with phase("serialize"):
+        return UJSONResponse(data)
 
 
-@app.get("/fortunes")
-async def fortunes(request: Request):
-    async with app.state.db_session() as sess:
-        ret = await sess.execute(select(Fortune.id, Fortune.message))
-        data = ret.all()
+@app.get("/cached-queries")
+async def cached_database_queries(queries=None):
+    num_queries = get_num_queries(queries)
+
+    async def fetch_worlds(missing):
+        with phase("db"):
+            async with app.state.db_session() as sess:
+                ret = await sess.execute(select(World.id, World.randomnumber).where(World.id.in_(missing)))
+                return ret.all()
+
+    with phase("cache"):
+        data = await app.state.world_cache.aget_many(sample(range(1, WORLD_ROWS + 1), num_queries), fetch_worlds)
+    with phase("serialize"):
+        return UJSONResponse(data)
+
+
+async def load_fortunes():
+    with phase("db"):
+        async with app.state.db_session() as sess:
+            ret = await sess.execute(select(Fortune.id, Fortune.message))
+            data = ret.all()
 
     data.append(ADDITIONAL_FORTUNE)
     data.sort(key=sort_fortunes_key)
+    return data
+
+
+async def render_fortunes():
+    data = await load_fortunes()
+    with phase("render"):
+        return get_templates().get_template("fortune.jinja").render(fortunes=data).encode()
 
-    return templates.TemplateResponse(
-        "fortune.jinja", {"request": request, "fortunes": data}
-    )
+
+@app.get("/fortunes")
+async def fortunes(request: Request):
+    # Without FORTUNES_CACHE the cache is never enabled and always rebuilds
+    if FORTUNES_CACHE_HTML:
+        return HTMLResponse(await app.state.fortune_cache.get(render_fortunes))
+
+    data = await app.state.fortune_cache.get(load_fortunes)
+    with phase("render"):
+        return get_templates().TemplateResponse(
+            "fortune.jinja", {"request": request, "fortunes": data}
+        )
 
 
 @app.get("/updates")
 async def database_updates(queries=None):
     num_queries = get_num_queries(queries)
 
-    ids = sorted(sample(range(1, 10000 + 1), num_queries))
+    ids = sorted(sample(range(1, WORLD_ROWS + 1), num_queries))
     data = []
-    async with app.state.db_session.begin() as sess:
-        for id_ in ids:
-            world = await sess.get(World, id_, populate_existing=True)
-            world.randomnumber = randint(1, 10000)
-            # force sqlalchemy to UPDATE entry even if the value has not changed
-            # doesn't make sense in a real application, added only for pass `tfb verify`
-            flag_modified(world, "randomnumber")
-            data.append(world.__json__())
 
-    return UJSONResponse(data)
+    if app.state.world_writer is not None:
+        # Read through the ORM, then leave the write to the shared group commit
+        with phase("db"):
+            async with app.state.db_session() as sess:
+                for id_ in ids:
+                    world = await sess.get(World, id_)
+                    data.append({"id": world.id, "randomnumber": randint(1, 10000)})
+        with phase("write"):
+            await app.state.world_writer.submit([(row["id"], row["randomnumber"]) for row in data])
+        with phase("serialize"):
+            return UJSONResponse(data)
+
+    # The flush and commit happen when the block exits, so they count as "db"
+    with phase("db"):
+        async with app.state.db_session.begin() as sess:
+            for id_ in ids:
+                world = await sess.get(World, id_, populate_existing=True)
+                world.randomnumber = randint(1, 10000)
+                # force sqlalchemy to UPDATE entry even if the value has not changed
+                # doesn't make sense in a real application, added only for pass `tfb verify`
+                flag_modified(world, "randomnumber")
+                data.append(world.__json__())
+
+    with phase("serialize"):
+        return UJSONResponse(data)
 
 
 @app.get("/plaintext")
 async def plaintext():
     return PlainTextResponse(b"Hello, world!")
+
+
+@app.get("/_stats")
+async def stats():
+    # Per-worker metrics; with several workers each request reaches one of them.
+    writer = app.state.world_writer
+    controller = app.state.pool_controller
+    return UJSONResponse({
+        "pid": os.getpid(),
+        "db_pool": controller.as_dict() if controller is not None else None,
+        "db_group_commit": writer.as_dict() if writer is not None else None,
+        "world_cache": app.state.world_cache.as_dict(),
+        "fortune_cache": app.state.fortune_cache.as_dict(),
+    })
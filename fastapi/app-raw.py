@@ -0,0 +1,191 @@
+"""
+Bare ASGI baseline for app.py: the same six endpoints and asyncpg pool
+setup, without FastAPI/Starlette routing, dependency resolution or
+response classes. Static responses are pre-encoded header and body bytes.
+
+Runs with the same config as the FastAPI apps:
+    gunicorn app-raw:app -c fastapi_conf.py -k uvicorn.workers.UvicornWorker
+
+benchmark.py reports the FastAPI app's overhead as the difference against
+this one (see framework_overhead()).
+"""
+import multiprocessing
+import os
+import sys
+from random import randint, sample
+from urllib.parse import parse_qs
+
+import asyncpg
+import jinja2
+
+try:
+    from orjson import dumps
+except ImportError:
+    from ujson import dumps as _ujson_dumps
+
+    def dumps(data):
+        return _ujson_dumps(data).encode()
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared import profiler
+from shared.config import WORLD_ROWS, WORLD_ROWS_SQL, check_world_rows
+
+READ_ROW_SQL = 'SELECT "id", "randomnumber" FROM "world" WHERE id = $1'
+WRITE_ROW_SQL = 'UPDATE "world" SET "randomnumber"=$1 WHERE id=$2'
+ADDITIONAL_ROW = [0, "Additional fortune added at request time."]
+MAX_POOL_SIZE = 1000//multiprocessing.cpu_count()
+MIN_POOL_SIZE = max(int(MAX_POOL_SIZE / 2), 1)
+
+JSON_HEADERS = [(b"content-type", b"application/json")]
+HTML_HEADERS = [(b"content-type", b"text/html; charset=utf-8")]
+PLAINTEXT_HEADERS = [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", b"13")]
+PLAINTEXT_BODY = b"Hello, world!"
+JSON_BODY = dumps({"message": "Hello, world!"})
+JSON_STATIC_HEADERS = [*JSON_HEADERS, (b"content-length", str(len(JSON_BODY)).encode())]
+NOT_FOUND_HEADERS = [(b"content-type", b"text/plain; charset=utf-8"), (b"content-length", b"9")]
+
+templates = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(os.path.dirname(os.path.realpath(__file__))), autoescape=True
+)
+fortune_template = templates.get_template("fortune.html")
+
+connection_pool = None
+
+
+def get_num_queries(query_string):
+    try:
+        query_count = int(parse_qs(query_string.decode())["queries"][0])
+    except (KeyError, ValueError, TypeError):
+        return 1
+
+    if query_count < 1:
+        return 1
+    if query_count > 500:
+        return 500
+    return query_count
+
+
+def connection_params():
+    return dict(
+        user=os.getenv("PGUSER", "postgres"),
+        password=os.getenv("PGPASS", "root"),
+        database=os.getenv("PGDB", "benchmark_db"),
+        host=os.getenv("PGHOST", "localhost"),
+        port=5432,
+    )
+
+
+async def send_response(send, headers, body, status=200):
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_json(send, data):
+    body = dumps(data)
+    await send_response(send, [*JSON_HEADERS, (b"content-length", str(len(body)).encode())], body)
+
+
+async def json_serialization(scope, send):
+    await send_response(send, JSON_STATIC_HEADERS, JSON_BODY)
+
+
+async def plaintext(scope, send):
+    await send_response(send, PLAINTEXT_HEADERS, PLAINTEXT_BODY)
+
+
+async def single_database_query(scope, send):
+    row_id = randint(1, WORLD_ROWS)
+    async with connection_pool.acquire() as connection:
+        number = await connection.fetchval(READ_ROW_SQL, row_id)
+
+    await send_json(send, {"id": row_id, "randomNumber": number})
+
+
+async def multiple_database_queries(scope, send):
+    row_ids = sample(range(1, WORLD_ROWS + 1), get_num_queries(scope["query_string"]))
+    worlds = []
+
+    async with connection_pool.acquire() as connection:
+        statement = await connection.prepare(READ_ROW_SQL)
+        for row_id in row_ids:
+            number = await statement.fetchval(row_id)
+            worlds.append({"id": row_id, "randomNumber": number})
+
+    await send_json(send, worlds)
+
+
+async def fortunes(scope, send):
+    async with connection_pool.acquire() as connection:
+        fortunes = await connection.fetch("SELECT * FROM Fortune")
+
+    fortunes.append(ADDITIONAL_ROW)
+    fortunes.sort(key=lambda row: row[1])
+    body = fortune_template.render(fortunes=fortunes).encode()
+    await send_response(send, [*HTML_HEADERS, (b"content-length", str(len(body)).encode())], body)
+
+
+async def database_updates(scope, send):
+    num_queries = get_num_queries(scope["query_string"])
+    # To avoid deadlock
+    ids = sorted(sample(range(1, WORLD_ROWS + 1), num_queries))
+    numbers = sorted(sample(range(1, 10000), num_queries))
+    updates = list(zip(ids, numbers))
+
+    async with connection_pool.acquire() as connection:
+        statement = await connection.prepare(READ_ROW_SQL)
+        for row_id, _ in updates:
+            await statement.fetchval(row_id)
+        await connection.executemany(WRITE_ROW_SQL, updates)
+
+    await send_json(send, [{"id": row_id, "randomNumber": number} for row_id, number in updates])
+
+
+routes = {
+    "/json": json_serialization,
+    "/plaintext": plaintext,
+    "/db": single_database_query,
+    "/dbs": multiple_database_queries,
+    "/queries": multiple_database_queries,
+    "/fortunes": fortunes,
+    "/updates": database_updates,
+}
+
+
+async def lifespan(receive, send):
+    global connection_pool
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            connection_pool = await asyncpg.create_pool(
+                **connection_params(),
+                min_size=MIN_POOL_SIZE,
+                max_size=MAX_POOL_SIZE,
+            )
+            try:
+                async with connection_pool.acquire() as connection:
+                    check_world_rows(await connection.fetchval(WORLD_ROWS_SQL))
+            except RuntimeError as exc:
+                # Raising here would make uvicorn treat lifespan as unsupported
+                # and serve anyway
+                await send({"type": "lifespan.startup.failed", "message": str(exc)})
+                return
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await connection_pool.close()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "http":
+        handler = routes.get(scope["path"])
+        if handler is None:
+            await send_response(send, NOT_FOUND_HEADERS, b"Not Found", 404)
+        else:
+            await handler(scope, send)
+    elif scope["type"] == "lifespan":
+        await lifespan(receive, send)
+
+
+profiler.install()
@@ -3,8 +3,9 @@ from contextlib import asynccontextmanager
 
 import asyncpg
 import os
+import sys
 from fastapi import FastAPI, Request
-from fastapi.responses import PlainTextResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 
 try:
     import orjson
@@ -12,11 +13,31 @@ try:
 except ImportError:
     from fastapi.responses import UJSONResponse as JSONResponse
 
-from fastapi.templating import Jinja2Templates
 from random import randint, sample
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from coalesce import ReadCoalescer, WriteCoalescer
+from shared.config import (
+    DB_COALESCE, DB_COALESCE_MAX_BATCH, DB_COALESCE_MAX_DELAY, DB_GROUP_COMMIT, DB_GROUP_COMMIT_MAX_ROWS,
+    DB_GROUP_COMMIT_WINDOW, DB_POOL_ADAPTIVE, DB_POOL_ADJUST_INTERVAL, DB_POOL_BUDGET, DB_POOL_IDLE_TIMEOUT,
+    DB_POOL_MIN, DB_POOL_RESERVE, DB_POOL_TARGET_WAIT, FORTUNES_CACHE, FORTUNES_CACHE_HTML, LAZY_INIT, WORLD_ROWS,
+    WORLD_ROWS_SQL, check_world_rows,
+)
+from shared.fortunecache import FortuneCache
+from shared import profiler
+from poolcontrol import AdaptivePool, ConnectionBudget, GatedPool, connection_budget
+from timing import SERVER_TIMING, ServerTimingMiddleware, TimedPool, phase
+from shared.worldcache import CACHE_WARM, WorldCache
+
 READ_ROW_SQL = 'SELECT "id", "randomnumber" FROM "world" WHERE id = $1'
 WRITE_ROW_SQL = 'UPDATE "world" SET "randomnumber"=$1 WHERE id=$2'
+READ_ROWS_SQL = 'SELECT "id", "randomnumber" FROM "world" WHERE id = ANY($1::int[])'
+READ_ALL_ROWS_SQL = 'SELECT "id", "randomnumber" FROM "world" ORDER BY id LIMIT $1'
+WRITE_ROWS_SQL = (
+    'UPDATE "world" SET "randomnumber" = v.randomnumber '
+    'FROM unnest($1::int[], $2::int[]) AS v(id, randomnumber) WHERE "world".id = v.id'
+)
 ADDITIONAL_ROW = [0, "Additional fortune added at request time."]
 MAX_POOL_SIZE = 1000//multiprocessing.cpu_count()
 MIN_POOL_SIZE = max(int(MAX_POOL_SIZE / 2), 1)
@@ -37,31 +58,106 @@ def get_num_queries(queries):
 
 connection_pool = None
 
-templates = Jinja2Templates(directory="fastapi/templates")
+def get_templates():
+    global templates
+    if templates is None:
+        from fastapi.templating import Jinja2Templates
+        templates = Jinja2Templates(directory=os.path.dirname(os.path.realpath(__file__)))
+    return templates
 
 
-async def setup_database():
-    return await asyncpg.create_pool(
+# With LAZY_INIT jinja2 is imported and set up on the first /fortunes
+templates = None
+if not LAZY_INIT:
+    get_templates()
+
+
+def connection_params():
+    return dict(
         user=os.getenv("PGUSER", "postgres"),
         password=os.getenv("PGPASS", "root"),
         database=os.getenv("PGDB", "benchmark_db"),
         host=os.getenv("PGHOST", "localhost"),
         port=5432,
-        min_size=MIN_POOL_SIZE,
-        max_size=MAX_POOL_SIZE,
     )
 
 
+async def setup_database():
+    if not DB_POOL_ADAPTIVE:
+        return await asyncpg.create_pool(
+            **connection_params(),
+            # With LAZY_INIT connections are opened as requests need them
+            min_size=0 if LAZY_INIT else MIN_POOL_SIZE,
+            max_size=MAX_POOL_SIZE,
+        )
+
+    total = DB_POOL_BUDGET
+    if not total:
+        connection = await asyncpg.connect(**connection_params())
+        try:
+            total = await connection_budget(connection, DB_POOL_RESERVE)
+        finally:
+            await connection.close()
+    controller = AdaptivePool(
+        ConnectionBudget(total), DB_POOL_MIN, total, DB_POOL_ADJUST_INTERVAL, DB_POOL_TARGET_WAIT
+    )
+    await controller.start()
+    # The controller decides how many connections are used; the pool only
+    # opens them on demand and closes those left idle after a shrink.
+    pool = await asyncpg.create_pool(
+        **connection_params(),
+        min_size=DB_POOL_MIN,
+        max_size=total,
+        max_inactive_connection_lifetime=DB_POOL_IDLE_TIMEOUT,
+    )
+    return GatedPool(pool, controller)
+
+
+def setup_world_loader(pool):
+    async def fetch_worlds(row_ids):
+        async with pool.acquire() as connection:
+            return dict(await connection.fetch(READ_ROWS_SQL, row_ids))
+
+    return ReadCoalescer(fetch_worlds, DB_COALESCE_MAX_BATCH, DB_COALESCE_MAX_DELAY)
+
+
+def setup_world_writer(pool):
+    async def write_worlds(row_ids, numbers):
+        async with pool.acquire() as connection:
+            await connection.execute(WRITE_ROWS_SQL, row_ids, numbers)
+
+    return WriteCoalescer(write_worlds, DB_GROUP_COMMIT_WINDOW, DB_GROUP_COMMIT_MAX_ROWS)
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Setup the database connection pool
-    app.state.connection_pool = await setup_database()
+    pool = await setup_database()
+    async with pool.acquire() as connection:
+        check_world_rows(await connection.fetchval(WORLD_ROWS_SQL))
+    app.state.pool_controller = pool.controller if isinstance(pool, GatedPool) else None
+    app.state.connection_pool = TimedPool(pool) if SERVER_TIMING else pool
+    app.state.world_loader = setup_world_loader(app.state.connection_pool) if DB_COALESCE else None
+    app.state.world_writer = setup_world_writer(app.state.connection_pool) if DB_GROUP_COMMIT else None
+    app.state.world_cache = WorldCache()
+    if CACHE_WARM:
+        async with app.state.connection_pool.acquire() as connection:
+            app.state.world_cache.update(
+                await connection.fetch(READ_ALL_ROWS_SQL, app.state.world_cache.capacity_rows())
+            )
+    app.state.fortune_cache = FortuneCache()
+    if FORTUNES_CACHE or FORTUNES_CACHE_HTML:
+        await app.state.fortune_cache.listen(lambda: asyncpg.connect(**connection_params()))
     yield
+    await app.state.fortune_cache.close()
     # Close the database connection pool
     await app.state.connection_pool.close()
 
 
 app = FastAPI(lifespan=lifespan)
+profiler.install()
+if SERVER_TIMING:
+    app.add_middleware(ServerTimingMiddleware)
 
 
 @app.get("/json")
@@ -71,43 +167,99 @@ async def json_serialization():
 
 @app.get("/db")
 async def single_database_query():
-    row_id = randint(1, 10000)
-    async with app.state.connection_pool.acquire() as connection:
-        number = await connection.fetchval(READ_ROW_SQL, row_id)
+    row_id = randint(1, WORLD_ROWS)
+    if app.state.world_loader is not None:
+        with phase("db"):
+            number = await app.state.world_loader.load(row_id)
+    else:
+        async with app.state.connection_pool.acquire() as connection:
+            with phase("db"):
+                number = await connection.fetchval(READ_ROW_SQL, row_id)
 
-    return JSONResponse({"id": row_id, "randomNumber": number})
+    with phase("serialize"):
+        return JSONResponse({"id": row_id, "randomNumber": number})
 
 
+@app.get("/dbs")
 @app.get("/queries")
 async def multiple_database_queries(queries = None):
     num_queries = get_num_queries(queries)
-    row_ids = sample(range(1, 10000), num_queries)
+    row_ids = sample(range(1, WORLD_ROWS + 1), num_queries)
     worlds = []
 
     async with app.state.connection_pool.acquire() as connection:
-        statement = await connection.prepare(READ_ROW_SQL)
-        for row_id in row_ids:
-            number = await statement.fetchval(row_id)
-            worlds.append({"id": row_id, "randomNumber": number})
+        with phase("db"):
+            statement = await connection.prepare(READ_ROW_SQL)
+            for row_id in row_ids:
+                number = await statement.fetchval(row_id)
+                worlds.append({"id": row_id, "randomNumber": number})
 
-    return JSONResponse(worlds)
+    with phase("serialize"):
+        return JSONResponse(worlds)
 
 
-@app.get("/fortunes")
-async def fortunes(request: Request):
+@app.get("/dbs-batch")
+@app.get("/queries-batch")
+async def multiple_database_queries_batched(queries = None):
+    num_queries = get_num_queries(queries)
+    row_ids = sample(range(1, WORLD_ROWS + 1), num_queries)
+
     async with app.state.connection_pool.acquire() as connection:
-        fortunes = await connection.fetch("SELECT * FROM Fortune")
+        with phase("db"):
+            numbers = dict(await connection.fetch(READ_ROWS_SQL, row_ids))
+
+    with phase("serialize"):
+        return JSONResponse([{"id": row_id, "randomNumber": numbers[row_id]} for row_id in row_ids])
+
+
+@app.get("/cached-queries")
+async def cached_database_queries(queries = None):
+    num_queries = get_num_queries(queries)
+    row_ids = sample(range(1, WORLD_ROWS + 1), num_queries)
+
+    async def fetch_worlds(missing):
+        async with app.state.connection_pool.acquire() as connection:
+            with phase("db"):
+                return await connection.fetch(READ_ROWS_SQL, missing)
+
+    with phase("cache"):
+        worlds = await app.state.world_cache.aget_many(row_ids, fetch_worlds)
+    with phase("serialize"):
+        return JSONResponse(worlds)
+
+
+async def load_fortunes():
+    async with app.state.connection_pool.acquire() as connection:
+        with phase("db"):
+            fortunes = await connection.fetch("SELECT * FROM Fortune")
 
     fortunes.append(ADDITIONAL_ROW)
     fortunes.sort(key=lambda row: row[1])
-    return templates.TemplateResponse("fortune.html", {"fortunes": fortunes, "request": request})
+    return fortunes
+
+
+async def render_fortunes():
+    fortunes = await load_fortunes()
+    with phase("render"):
+        return get_templates().get_template("fortune.html").render(fortunes=fortunes).encode()
+
+
+@app.get("/fortunes")
+async def fortunes(request: Request):
+    # Without FORTUNES_CACHE the cache is never enabled and always rebuilds
+    if FORTUNES_CACHE_HTML:
+        return HTMLResponse(await app.state.fortune_cache.get(render_fortunes))
+
+    fortunes = await app.state.fortune_cache.get(load_fortunes)
+    with phase("render"):
+        return get_templates().TemplateResponse("fortune.html", {"fortunes": fortunes, "request": request})
 
 
 @app.get("/updates")
 async def database_updates(queries = None):
     num_queries = get_num_queries(queries)
     # To avoid deadlock
-    ids = sorted(sample(range(1, 10000 + 1), num_queries))
+    ids = sorted(sample(range(1, WORLD_ROWS + 1), num_queries))
     numbers = sorted(sample(range(1, 10000), num_queries))
     updates = list(zip(ids, numbers))
 
@@ -116,14 +268,62 @@ async def database_updates(queries = None):
     ]
 
     async with app.state.connection_pool.acquire() as connection:
-        statement = await connection.prepare(READ_ROW_SQL)
-        for row_id, _ in updates:
-            await statement.fetchval(row_id)
-        await connection.executemany(WRITE_ROW_SQL, updates)
+        with phase("db"):
+            statement = await connection.prepare(READ_ROW_SQL)
+            for row_id, _ in updates:
+                await statement.fetchval(row_id)
+        if app.state.world_writer is None:
+            with phase("write"):
+                await connection.executemany(WRITE_ROW_SQL, updates)
 
-    return JSONResponse(worlds)
+    if app.state.world_writer is not None:
+        with phase("write"):
+            await app.state.world_writer.submit(updates)
+
+    with phase("serialize"):
+        return JSONResponse(worlds)
+
+
+@app.get("/updates-batch")
+async def database_updates_batched(queries = None):
+    num_queries = get_num_queries(queries)
+    # Sorted ids keep the row lock order consistent between concurrent updates
+    ids = sorted(sample(range(1, WORLD_ROWS + 1), num_queries))
+    numbers = sorted(sample(range(1, 10000), num_queries))
+
+    async with app.state.connection_pool.acquire() as connection:
+        with phase("db"):
+            await connection.fetch(READ_ROWS_SQL, ids)
+        if app.state.world_writer is None:
+            with phase("write"):
+                await connection.execute(WRITE_ROWS_SQL, ids, numbers)
+
+    if app.state.world_writer is not None:
+        with phase("write"):
+            await app.state.world_writer.submit(list(zip(ids, numbers)))
+
+    with phase("serialize"):
+        return JSONResponse([
+            {"id": row_id, "randomNumber": number} for row_id, number in zip(ids, numbers)
+        ])
 
 
 @app.get("/plaintext")
 async def plaintext():
     return PlainTextResponse(b"Hello, world!")
+
+
+@app.get("/_stats")
+async def stats():
+    # Per-worker metrics; with several workers each request reaches one of them.
+    loader = app.state.world_loader
+    writer = app.state.world_writer
+    controller = app.state.pool_controller
+    return JSONResponse({
+        "pid": os.getpid(),
+        "db_pool": controller.as_dict() if controller is not None else None,
+        "db_coalesce": loader.stats.as_dict() if loader is not None else None,
+        "db_group_commit": writer.as_dict() if writer is not None else None,
+        "world_cache": app.state.world_cache.as_dict(),
+        "fortune_cache": app.state.fortune_cache.as_dict(),
+    })
@@ -0,0 +1,175 @@
+"""
+Cross-request coalescing for the FastAPI apps.
+
+ReadCoalescer collects the keys requested by all in-flight requests during
+one event-loop tick and resolves them with a single batched lookup, so
+under high concurrency many `/db` requests share one pool acquisition and
+one round trip. WriteCoalescer does the same for `/updates`, merging the
+writes of concurrent requests into one commit.
+"""
+import asyncio
+
+
+class BatchStats:
+    """Batch size metrics, bucketed by powers of two."""
+
+    def __init__(self):
+        self.batches = 0
+        self.items = 0
+        self.max_size = 0
+        self.histogram = {}
+
+    def record(self, size):
+        self.batches += 1
+        self.items += size
+        self.max_size = max(self.max_size, size)
+        bucket = 1 << (size - 1).bit_length()
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+
+    def as_dict(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "max_size": self.max_size,
+            # Keys are the upper bound of each bucket, e.g. "8" counts sizes 5-8.
+            "size_histogram": {str(bucket): count for bucket, count in sorted(self.histogram.items())},
+        }
+
+
+class ReadCoalescer:
+    """
+    DataLoader-style batching of single-key reads.
+
+    Args:
+        fetch_many: Coroutine function taking a list of keys and returning a
+            dict of key to value; missing keys resolve to None.
+        max_batch: Flush as soon as this many requests are waiting.
+        max_delay: Seconds to wait for more requests before flushing. With
+            0 the batch is flushed on the next event-loop iteration.
+    """
+
+    def __init__(self, fetch_many, max_batch=256, max_delay=0.0):
+        self.fetch_many = fetch_many
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.stats = BatchStats()
+        self._pending = {}
+        self._waiting = 0
+        self._flush_handle = None
+        self._tasks = set()
+
+    async def load(self, key):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.setdefault(key, []).append(future)
+        self._waiting += 1
+        if self._waiting >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            if self.max_delay:
+                self._flush_handle = loop.call_later(self.max_delay, self._flush)
+            else:
+                self._flush_handle = loop.call_soon(self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, {}
+        waiting, self._waiting = self._waiting, 0
+        if not pending:
+            return
+        self.stats.record(waiting)
+        task = asyncio.ensure_future(self._resolve(pending))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resolve(self, pending):
+        try:
+            values = await self.fetch_many(list(pending))
+        except Exception as e:
+            for futures in pending.values():
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+            return
+        for key, futures in pending.items():
+            value = values.get(key)
+            for future in futures:
+                if not future.done():
+                    future.set_result(value)
+
+
+class WriteCoalescer:
+    """
+    Group commit for row updates from concurrent requests.
+
+    Updates submitted while a commit is in flight (or within `window`
+    seconds of the first one) are merged into a single write. Duplicate ids
+    are resolved last-writer-wins in arrival order, and the merged rows are
+    sorted by id so concurrent commits lock rows in the same order. Each
+    submit() returns only once the shared commit has completed.
+
+    Args:
+        write_many: Coroutine function taking parallel lists of ids and
+            values, sorted by id, and writing them in one transaction.
+        window: Seconds to collect further updates before committing.
+        max_rows: Upper bound on the rows merged into one commit.
+    """
+
+    def __init__(self, write_many, window=0.002, max_rows=5000):
+        self.write_many = write_many
+        self.window = window
+        self.max_rows = max_rows
+        self.stats = BatchStats()
+        self.rows = BatchStats()
+        self._pending = []
+        self._flusher = None
+
+    async def submit(self, updates):
+        """
+        Queue (id, value) pairs and wait for the commit that includes them.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((updates, future))
+        if self._flusher is None:
+            self._flusher = asyncio.ensure_future(self._run())
+        return await future
+
+    def _take_batch(self):
+        batch = []
+        rows = 0
+        while self._pending and (not batch or rows + len(self._pending[0][0]) <= self.max_rows):
+            updates, future = self._pending.pop(0)
+            batch.append((updates, future))
+            rows += len(updates)
+        return batch
+
+    async def _run(self):
+        try:
+            while self._pending:
+                await asyncio.sleep(self.window)
+                batch = self._take_batch()
+                merged = {}
+                for updates, _ in batch:
+                    merged.update(updates)
+                ids = sorted(merged)
+                self.stats.record(len(batch))
+                self.rows.record(len(ids))
+                try:
+                    await self.write_many(ids, [merged[row_id] for row_id in ids])
+                except Exception as e:
+                    for _, future in batch:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                for _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+        finally:
+            self._flusher = None
+
+    def as_dict(self):
+        return {"requests_per_commit": self.stats.as_dict(), "rows_per_commit": self.rows.as_dict()}
@@ -0,0 +1,282 @@
+"""
+Adaptive connection pool sizing for the FastAPI apps.
+
+Each worker gates its pool with an AdaptivePool whose limit grows while
+requests wait for connections and shrinks while most of them sit idle.
+Limits are claimed from a ConnectionBudget, a small JSON ledger shared by
+all workers of one gunicorn master through a locked file, so the sum over
+workers stays within what Postgres accepts instead of cpu_count() times
+the per-worker maximum.
+
+The ledger is read and written under a blocking file lock, so the workers
+do it in the default executor, never on the event loop.
+"""
+import asyncio
+import fcntl
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+
+async def connection_budget(connection, reserve=10):
+    """
+    Connections available to the app: max_connections minus the superuser
+    reserve and `reserve` more for psql, LISTEN connections and the like.
+    """
+    max_connections = int(await connection.fetchval("SHOW max_connections"))
+    superuser = int(await connection.fetchval("SHOW superuser_reserved_connections"))
+    return max(max_connections - superuser - reserve, 1)
+
+
+def pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class ConnectionBudget:
+    """
+    Total connection budget shared by the workers of one server.
+
+    Args:
+        total: Connections all workers together may hold.
+        path: Ledger file. Defaults to one per gunicorn master, so separate
+            servers on the same host do not share a budget.
+    """
+
+    def __init__(self, total, path=None):
+        self.total = total
+        self.path = path or f"/tmp/db-pool-budget-{os.getppid()}.json"
+        self.pid = os.getpid()
+        # Ledger as of this worker's last update, served by as_dict()
+        self.ledger = {}
+
+    def _update(self, change):
+        with open(self.path, "a+") as ledger_file:
+            fcntl.flock(ledger_file, fcntl.LOCK_EX)
+            try:
+                ledger_file.seek(0)
+                try:
+                    ledger = json.loads(ledger_file.read() or "{}")
+                except ValueError:
+                    ledger = {}
+                # Workers that died without releasing their claim
+                ledger = {pid: entry for pid, entry in ledger.items() if pid_alive(int(pid))}
+                result = change(ledger)
+                ledger_file.seek(0)
+                ledger_file.truncate()
+                ledger_file.write(json.dumps(ledger))
+                self.ledger = dict(ledger)
+                return result
+            finally:
+                fcntl.flock(ledger_file, fcntl.LOCK_UN)
+
+    async def _run_update(self, change):
+        return await asyncio.get_running_loop().run_in_executor(None, self._update, change)
+
+    async def claim(self, want, starved, floor=1):
+        """
+        Set this worker's limit to `want`, or as much of it as the budget allows.
+
+        Growth is capped by what other workers leave free. A worker above
+        its fair share gives the excess back while another one is starved.
+
+        Returns:
+            int: The granted limit.
+        """
+        def change(ledger):
+            key = str(self.pid)
+            current = ledger.get(key, {}).get("size", 0)
+            others = [entry for pid, entry in ledger.items() if pid != key]
+            fair = max(self.total // (len(others) + 1), floor)
+            granted = want
+            if want > current:
+                granted = min(want, max(self.total - sum(entry["size"] for entry in others), current))
+            if granted > fair and any(entry["starved"] for entry in others):
+                granted = fair
+            granted = max(granted, floor)
+            ledger[key] = {"size": granted, "starved": starved}
+            return granted
+
+        return await self._run_update(change)
+
+    async def release(self):
+        await self._run_update(lambda ledger: ledger.pop(str(self.pid), None))
+
+    def as_dict(self):
+        """The ledger as of this worker's last claim, without touching the file."""
+        ledger = self.ledger
+        return {
+            "total": self.total,
+            "claimed": sum(entry["size"] for entry in ledger.values()),
+            "workers": {pid: entry["size"] for pid, entry in sorted(ledger.items())},
+        }
+
+
+class AdaptivePool:
+    """
+    Concurrency limit in front of a connection pool, resized every `interval`.
+
+    The limit grows by half when the mean wait for a connection exceeded
+    `target_wait` and every slot was in use, and shrinks by a quarter when
+    fewer than half the slots were used. The underlying pool should be
+    created with max_size at the budget so it never caps the limit, and
+    with an idle timeout so connections above a shrunk limit get closed.
+
+    Args:
+        budget: ConnectionBudget the limit is claimed from.
+        min_size: Lowest limit, kept even when the budget is exhausted.
+        max_size: Highest limit for this worker.
+        interval: Seconds between adjustments.
+        target_wait: Mean acquire wait, in seconds, that triggers growth.
+    """
+
+    def __init__(self, budget, min_size=2, max_size=100, interval=0.5, target_wait=0.001):
+        self.budget = budget
+        self.min_size = min_size
+        self.max_size = max(max_size, min_size)
+        self.interval = interval
+        self.target_wait = target_wait
+        self.limit = min_size
+        self.in_use = 0
+        self.acquires = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.grows = 0
+        self.shrinks = 0
+        self._waiters = deque()
+        self._window_acquires = 0
+        self._window_wait = 0.0
+        self._window_peak = 0
+        self._task = None
+
+    async def start(self):
+        self.limit = await self.budget.claim(self.min_size, False, self.min_size)
+        self._task = asyncio.ensure_future(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.budget.release()
+
+    async def _enter(self):
+        if self.in_use < self.limit and not self._waiters:
+            self.in_use += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as the waiter was cancelled
+                self._release()
+            else:
+                self._waiters.remove(future)
+            raise
+
+    def _release(self):
+        self.in_use -= 1
+        self._wake()
+
+    def _wake(self):
+        while self._waiters and self.in_use < self.limit:
+            future = self._waiters.popleft()
+            if not future.done():
+                self.in_use += 1
+                future.set_result(None)
+
+    @asynccontextmanager
+    async def gate(self, context):
+        """Hold a slot while `context` (e.g. pool.acquire()) is entered."""
+        started = time.perf_counter()
+        await self._enter()
+        try:
+            self._window_peak = max(self._window_peak, self.in_use)
+            async with context as resource:
+                wait = time.perf_counter() - started
+                self._window_acquires += 1
+                self._window_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+                yield resource
+        finally:
+            self._release()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._adjust()
+
+    async def _adjust(self):
+        acquires, self._window_acquires = self._window_acquires, 0
+        wait, self._window_wait = self._window_wait, 0.0
+        peak, self._window_peak = max(self._window_peak, self.in_use), self.in_use
+        self.acquires += acquires
+        self.total_wait += wait
+
+        mean_wait = wait / acquires if acquires else 0.0
+        starved = bool(self._waiters) or (mean_wait > self.target_wait and peak >= self.limit)
+        want = self.limit
+        if starved:
+            want = min(self.limit + max(self.limit // 2, 1), self.max_size)
+        elif peak < self.limit // 2:
+            want = max(self.limit - max(self.limit // 4, 1), self.min_size)
+
+        limit = await self.budget.claim(want, starved, self.min_size)
+        if limit > self.limit:
+            self.grows += 1
+        elif limit < self.limit:
+            self.shrinks += 1
+        self.limit = limit
+        self._wake()
+
+    def as_dict(self):
+        return {
+            "limit": self.limit,
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "in_use": self.in_use,
+            "waiting": len(self._waiters),
+            "acquires": self.acquires,
+            "mean_wait_ms": round(self.total_wait / self.acquires * 1000, 3) if self.acquires else 0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+            "grows": self.grows,
+            "shrinks": self.shrinks,
+            "budget": self.budget.as_dict(),
+        }
+
+
+class GatedPool:
+    """asyncpg pool whose acquire() goes through an AdaptivePool."""
+
+    def __init__(self, pool, controller):
+        self.pool = pool
+        self.controller = controller
+
+    def acquire(self):
+        return self.controller.gate(self.pool.acquire())
+
+    async def close(self):
+        await self.controller.close()
+        await self.pool.close()
+
+
+class GatedSessionmaker:
+    """SQLAlchemy sessionmaker whose sessions go through an AdaptivePool."""
+
+    def __init__(self, factory, controller):
+        self.factory = factory
+        self.controller = controller
+
+    def __call__(self):
+        return self.controller.gate(self.factory())
+
+    def begin(self):
+        return self.controller.gate(self.factory.begin())
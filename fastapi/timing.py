@@ -0,0 +1,56 @@
+"""
+Server-Timing for the FastAPI apps; the phase logic is in shared/timing.py.
+
+ServerTimingMiddleware starts a RequestTiming per request and adds the
+header when the response starts. TimedPool reports pool checkouts as the
+"acquire" phase.
+"""
+from shared.timing import SERVER_TIMING, RequestTiming, phase  # noqa: F401
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware, so it adds no per-request task or body buffering."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timing = RequestTiming()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (b"server-timing", timing.header().encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            timing.close()
+
+
+class _TimedAcquire:
+    def __init__(self, context):
+        self.context = context
+
+    async def __aenter__(self):
+        with phase("acquire"):
+            return await self.context.__aenter__()
+
+    async def __aexit__(self, *exc_info):
+        return await self.context.__aexit__(*exc_info)
+
+
+class TimedPool:
+    """Pool wrapper timing acquire() as the "acquire" phase; only used when SERVER_TIMING is on."""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def acquire(self):
+        return _TimedAcquire(self.pool.acquire())
+
+    async def close(self):
+        await self.pool.close()
@@ -6,7 +6,7 @@ const h = require("./helper");
  */
 module.exports = databaseLayer => ({
   singleQuery: async (req, reply) => {
-    const world = await databaseLayer.getWorld(h.randomTfbNumber());
+    const world = await databaseLayer.getWorld(h.randomWorldId());
 
     reply.send(world);
   },
@@ -16,7 +16,7 @@ module.exports = databaseLayer => ({
     const promisesArray = [];
 
     for (let i = 0; i < queries; i++) {
-      promisesArray.push(databaseLayer.getWorld(h.randomTfbNumber()));
+      promisesArray.push(databaseLayer.getWorld(h.randomWorldId()));
     }
 
     const worlds = await Promise.all(promisesArray);
@@ -38,7 +38,7 @@ module.exports = databaseLayer => ({
     const worldPromises = [];
 
     for (let i = 0; i < queries; i++) {
-      worldPromises.push(databaseLayer.getWorld(h.randomTfbNumber()));
+      worldPromises.push(databaseLayer.getWorld(h.randomWorldId()));
     }
 
     const worlds = await Promise.all(worldPromises);
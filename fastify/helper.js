@@ -1,6 +1,11 @@
+// Rows in the World table, see dataset.py
+const worldRows = parseInt(process.env.WORLD_ROWS) || 10000;
+
 module.exports = {
   randomTfbNumber: () => Math.floor(Math.random() * 10000) + 1,
 
+  randomWorldId: () => Math.floor(Math.random() * worldRows) + 1,
+
   getQueries: queries => {
     return Math.min(Math.max(parseInt(queries) || 1, 1), 500);
   },
@@ -1,14 +1,28 @@
 import os
+import sys
 from collections import namedtuple
 from operator import attrgetter
 import random
 from email.utils import formatdate
 
 import flask
+import psycopg2
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Integer, String, text
 from sqlalchemy.orm import sessionmaker, scoped_session
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shared.config import (
+    FORTUNES_CACHE, FORTUNES_CACHE_HTML, FORTUNES_POLL_INTERVAL, WORLD_ROWS, WORLD_ROWS_SQL, check_world_rows,
+)
+from shared.fortunecache import PollingFortuneCache
+from rawdb import ConnectionPool, make_psycopg_green
+from shared import profiler
+import timing
+from timing import phase
+from shared.worldcache import CACHE_WARM, WorldCache
+
 # Database configuration
 DBDRV  = "postgresql"
 DBNAME = os.getenv('PGDB', 'benchmark_db')
@@ -16,6 +30,21 @@ DBHOST = os.getenv('PGHOST', 'localhost')
 DBUSER = os.getenv('PGUSER', 'postgres')
 DBPSWD = os.getenv('PGPASS', 'root')
 
+# Opt-in raw psycopg2 mode for /db, /dbs and /updates (see rawdb.py)
+DB_RAW = os.getenv("DB_RAW", "0") == "1"
+DB_RAW_POOL_SIZE = int(os.getenv("DB_RAW_POOL_SIZE", "20"))
+# Cooperative psycopg2 under gevent; on by default in raw mode, and it
+# applies to the ORM connections too since the callback is process-wide
+DB_GREEN = os.getenv("DB_GREEN", "1" if DB_RAW else "0") == "1"
+
+# Prepared once per raw connection, executed with EXECUTE
+PREPARE_SQL = (
+    "PREPARE world_read(int) AS SELECT randomnumber FROM world WHERE id = $1; "
+    "PREPARE worlds_read(int[]) AS SELECT id, randomnumber FROM world WHERE id = ANY($1); "
+    "PREPARE worlds_write(int[], int[]) AS UPDATE world SET randomnumber = v.randomnumber "
+    "FROM unnest($1, $2) AS v(id, randomnumber) WHERE world.id = v.id"
+)
+
 # Setup Flask and SQLAlchemy
 app = flask.Flask(__name__)
 
@@ -24,6 +53,8 @@ app.config["SQLALCHEMY_DATABASE_URI"] = f"{DBDRV}://{DBUSER}:{DBPSWD}@{DBHOST}:5
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 db = SQLAlchemy(app)
+timing.init_app(app)
+profiler.install()
 with app.app_context():
     # Perform any database operations or session initialization here
     Session = scoped_session(sessionmaker(bind=db.engine))
@@ -57,6 +88,60 @@ class Fortune(db.Model):
     id = Column(Integer, primary_key=True, autoincrement=True)
     message = Column(String, nullable=False)
 
+if DB_GREEN:
+    make_psycopg_green()
+
+def raw_connect():
+    conn = psycopg2.connect(dbname=DBNAME, user=DBUSER, password=DBPSWD, host=DBHOST, port=5432)
+    # Single statements only, so skip the BEGIN/COMMIT round trips
+    conn.autocommit = True
+    with conn.cursor() as cursor:
+        cursor.execute(PREPARE_SQL)
+    return conn
+
+raw_pool = ConnectionPool(raw_connect, DB_RAW_POOL_SIZE) if DB_RAW else None
+
+def raw_read_worlds(cursor, ids):
+    with phase("db"):
+        cursor.execute("EXECUTE worlds_read(%s)", (ids,))
+        return dict(cursor.fetchall())
+
+# -----------------------------------------------------------------------------
+# In-process World cache for /cached-queries
+
+def fetch_worlds(ids):
+    session = Session()
+    try:
+        with phase("db"):
+            return session.query(World.id, World.randomnumber).filter(World.id.in_(ids)).all()
+    finally:
+        session.close()
+
+session = Session()
+try:
+    check_world_rows(session.execute(text(WORLD_ROWS_SQL)).scalar())
+finally:
+    session.close()
+
+world_cache = WorldCache()
+if CACHE_WARM:
+    session = Session()
+    try:
+        world_cache.update(
+            session.query(World.id, World.randomnumber).order_by(World.id).limit(world_cache.capacity_rows())
+        )
+    finally:
+        session.close()
+
+def read_fortune_version():
+    session = Session()
+    try:
+        return session.execute(text("SELECT version FROM fortune_version")).scalar()
+    finally:
+        session.close()
+
+fortune_cache = PollingFortuneCache(read_fortune_version, FORTUNES_POLL_INTERVAL)
+
 # -----------------------------------------------------------------------------
 
 def get_num_queries():
@@ -71,7 +156,7 @@ def get_num_queries():
     return num_queries
 
 def generate_ids(num_queries):
-    return random.sample(range(1, 10001), num_queries)
+    return random.sample(range(1, WORLD_ROWS + 1), num_queries)
 
 @app.route("/json")
 def json_data():
@@ -83,49 +168,98 @@ def json_data_raw():
 
 @app.route("/db")
 def get_random_world_single():
-    wid = random.randint(1, 10000)
+    wid = random.randint(1, WORLD_ROWS)
+    if raw_pool is not None:
+        with raw_pool.connection() as conn, conn.cursor() as cursor:
+            with phase("db"):
+                cursor.execute("EXECUTE world_read(%s)", (wid,))
+                number = cursor.fetchone()[0]
+        with phase("serialize"):
+            return jsonify({"id": wid, "randomNumber": number})
     session = Session()
     try:
-        world = session.query(World).get(wid)
-        return jsonify(world.to_dict())
+        with phase("db"):
+            world = session.query(World).get(wid)
+        with phase("serialize"):
+            return jsonify(world.to_dict())
     finally:
         session.close()
 
 @app.route("/dbs")
 def get_random_world():
+    if raw_pool is not None:
+        ids = generate_ids(get_num_queries())
+        with raw_pool.connection() as conn, conn.cursor() as cursor:
+            numbers = raw_read_worlds(cursor, ids)
+        with phase("serialize"):
+            return jsonify([{"id": ident, "randomNumber": numbers[ident]} for ident in ids])
     session = Session()
     try:
-        worlds = [session.query(World).get(ident).to_dict() for ident in generate_ids(get_num_queries())]
-        return jsonify(worlds)
+        with phase("db"):
+            worlds = [session.query(World).get(ident).to_dict() for ident in generate_ids(get_num_queries())]
+        with phase("serialize"):
+            return jsonify(worlds)
     finally:
         session.close()
 
-@app.route("/fortunes")
-def get_fortunes():
+@app.route("/cached-queries")
+def get_cached_worlds():
+    with phase("cache"):
+        worlds = world_cache.get_many(generate_ids(get_num_queries()), fetch_worlds)
+    with phase("serialize"):
+        return jsonify(worlds)
+
+def load_fortunes():
     session = Session()
     try:
-        fortunes = session.query(Fortune).all()
+        with phase("db"):
+            fortunes = session.query(Fortune).all()
         tmp_fortune = namedtuple("Fortune", ["id", "message"])
         fortunes.append(tmp_fortune(id=0, message="Additional fortune added at request time."))
         fortunes.sort(key=attrgetter("message"))
-        return flask.render_template("fortunes.html", fortunes=fortunes)
+        return fortunes
     finally:
         session.close()
 
+def render_fortunes():
+    fortunes = load_fortunes()
+    with phase("render"):
+        return flask.render_template("fortunes.html", fortunes=fortunes)
+
+@app.route("/fortunes")
+def get_fortunes():
+    if FORTUNES_CACHE_HTML:
+        return fortune_cache.get(render_fortunes)
+    fortunes = fortune_cache.get(load_fortunes) if FORTUNES_CACHE else load_fortunes()
+    with phase("render"):
+        return flask.render_template("fortunes.html", fortunes=fortunes)
+
 @app.route("/updates")
 def updates():
     num_queries = get_num_queries()
     ids = generate_ids(num_queries)
     ids.sort()
+    if raw_pool is not None:
+        with raw_pool.connection() as conn, conn.cursor() as cursor:
+            raw_read_worlds(cursor, ids)
+            numbers = [random.randint(1, 10000) for _ in ids]
+            # Sorted ids keep the row lock order consistent between requests
+            with phase("write"):
+                cursor.execute("EXECUTE worlds_write(%s, %s)", (ids, numbers))
+        with phase("serialize"):
+            return jsonify([{"id": ident, "randomNumber": number} for ident, number in zip(ids, numbers)])
     session = Session()
     try:
         worlds = []
-        for ident in ids:
-            world = session.query(World).get(ident)
-            world.randomnumber = random.randint(1, 10000)
-            worlds.append({"id": world.id, "randomNumber": world.randomnumber})
-        session.commit()
-        return jsonify(worlds)
+        with phase("db"):
+            for ident in ids:
+                world = session.query(World).get(ident)
+                world.randomnumber = random.randint(1, 10000)
+                worlds.append({"id": world.id, "randomNumber": world.randomnumber})
+        with phase("write"):
+            session.commit()
+        with phase("serialize"):
+            return jsonify(worlds)
     finally:
         session.close()
 
@@ -0,0 +1,85 @@
+"""
+Plain psycopg2 access for the DB_RAW mode of flask/app.py.
+
+The ORM path builds a World object and goes through the session's
+identity map for every row. In raw mode the handlers use connections from
+a small per-worker pool with server-side prepared statements, and read or
+write many rows in one statement.
+
+psycopg2 waits on the socket in C, which blocks a whole gevent worker.
+make_psycopg_green() installs a wait callback that yields to the gevent
+hub instead, the same one psycogreen provides.
+"""
+import queue
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+
+
+def gevent_wait_callback(conn, timeout=None):
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+
+def make_psycopg_green():
+    """Make every psycopg2 connection in the process cooperative under gevent."""
+    extensions.set_wait_callback(gevent_wait_callback)
+
+
+class ConnectionPool:
+    """
+    Connections opened on demand up to `max_size`, reused most recent first.
+
+    Callers beyond `max_size` wait for a connection to be returned. Under
+    gevent monkey patching the queue wait only blocks the calling greenlet.
+
+    Args:
+        connect: Callable returning a new, ready to use connection.
+        max_size: Upper bound on open connections.
+    """
+
+    def __init__(self, connect, max_size=20):
+        self._connect = connect
+        self.max_size = max_size
+        self.opened = 0
+        self._idle = queue.LifoQueue()
+
+    def _get(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        if self.opened < self.max_size:
+            self.opened += 1
+            try:
+                return self._connect()
+            except Exception:
+                self.opened -= 1
+                raise
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        conn = self._get()
+        try:
+            yield conn
+        except Exception:
+            # The connection may be mid-query; do not hand it to someone else
+            conn.close()
+            raise
+        finally:
+            if conn.closed:
+                self.opened -= 1
+            else:
+                self._idle.put(conn)
@@ -0,0 +1,31 @@
+"""
+Server-Timing for the Flask app; the phase logic is in shared/timing.py.
+
+With SERVER_TIMING=1, init_app() registers request hooks that start a
+RequestTiming per request and add the header to the response.
+"""
+import flask
+
+from shared.timing import SERVER_TIMING, RequestTiming, phase  # noqa: F401
+
+
+def init_app(app):
+    if not SERVER_TIMING:
+        return
+
+    @app.before_request
+    def start_timing():
+        flask.g.server_timing = RequestTiming()
+
+    @app.after_request
+    def add_timing_header(response):
+        timing = flask.g.get("server_timing")
+        if timing is not None:
+            response.headers["Server-Timing"] = timing.header()
+        return response
+
+    @app.teardown_request
+    def stop_timing(exc):
+        timing = flask.g.pop("server_timing", None)
+        if timing is not None:
+            timing.close()
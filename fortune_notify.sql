@@ -0,0 +1,28 @@
+-- Change notification for the fortune caches in the Python apps.
+--
+-- Any write to Fortune bumps fortune_version and sends NOTIFY fortune_changed.
+-- The asyncpg apps LISTEN on the channel; the Flask and Django apps poll
+-- fortune_version instead. Safe to run more than once.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS fortune_version (
+  version bigint NOT NULL
+);
+INSERT INTO fortune_version (version)
+SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM fortune_version);
+
+CREATE OR REPLACE FUNCTION fortune_changed() RETURNS trigger AS $$
+BEGIN
+  UPDATE fortune_version SET version = version + 1;
+  PERFORM pg_notify('fortune_changed', '');
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS fortune_changed ON Fortune;
+CREATE TRIGGER fortune_changed
+  AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Fortune
+  FOR EACH STATEMENT EXECUTE FUNCTION fortune_changed();
+
+COMMIT;
@@ -5,6 +5,7 @@ import (
 	"math/rand"
 	"net/http"
 	"os"
+	"strconv"
 	"time"
 
 	"github.com/gin-gonic/gin"
@@ -19,6 +20,16 @@ type World struct {
 	RandomNumber int64 `json:"randomNumber" gorm:"column:randomnumber"`
 }
 
+// worldRows is the number of rows in the World table, see dataset.py
+var worldRows = envInt("WORLD_ROWS", 10000)
+
+func envInt(name string, fallback int) int {
+	if value, err := strconv.Atoi(os.Getenv(name)); err == nil && value > 0 {
+		return value
+	}
+	return fallback
+}
+
 // TableName overrides the table name used by World to `World`
 func (World) TableName() string {
 	return "World"
@@ -26,7 +37,7 @@ func (World) TableName() string {
 
 // getWorld implements the logic behind the query tests
 func getWorld(db *gorm.DB) World {
-	randomId := rand.Intn(10000) + 1
+	randomId := rand.Intn(worldRows) + 1
 
 	var world World
 	db.Take(&world, randomId)
@@ -36,7 +47,7 @@ func getWorld(db *gorm.DB) World {
 
 // processWorld implements the logic behind the updates tests
 func processWorld(tx *gorm.DB) (World, error) {
-	randomId := rand.Intn(10000) + 1
+	randomId := rand.Intn(worldRows) + 1
 	randomId2 := int64(rand.Intn(10000) + 1)
 
 	var world World
@@ -0,0 +1,674 @@
+"""
+Native HTTP load generator used by benchmark.py as an alternative to wrk.
+
+Connections are spread over worker processes. Each process runs its own
+asyncio event loop (uvloop when it is installed) with one keep-alive
+connection per simulated client, and records every request latency into a
+LatencyHistogram. The per-process histograms, status code counts and error
+counters are merged once the run is over.
+
+With `warmup`, the load starts before the measured window: the parent
+watches completions per second across all workers and, once throughput
+settles, tells the workers to start measuring on the same connections
+(see Warmup), so connection and keep-alive state carry over.
+
+With a scenario, each request picks its endpoint from a weighted mix and
+draws its `queries` parameter from a distribution, and latencies are also
+kept per endpoint of the mix (see RequestMix).
+
+All latencies are in microseconds.
+"""
+import asyncio
+import math
+import multiprocessing
+import os
+import random
+import time
+from array import array
+from urllib.parse import urlsplit
+
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+PERCENTILES = (50, 75, 90, 99, 99.9)
+
+
+class LatencyHistogram:
+    """
+    Log-linear histogram of latencies in microseconds.
+
+    Values below 2**sub_bucket_bits are counted exactly. Above that every
+    power of two is split into 2**(sub_bucket_bits - 1) equal buckets, so a
+    reported value is within 2**-sub_bucket_bits of the recorded one.
+    """
+
+    def __init__(self, sub_bucket_bits=8, max_exponent=40):
+        self.sub_bucket_bits = sub_bucket_bits
+        self.sub_bucket_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_bucket_count >> 1
+        self.max_trackable = (1 << max_exponent) - 1
+        size = self.sub_bucket_count + (max_exponent - sub_bucket_bits) * self.half_count
+        self.counts = array('Q', bytes(8 * size))
+        self.count = 0
+        self.total = 0
+        self.total_sq = 0
+        self.min = 0
+        self.max = 0
+
+    def _index(self, value):
+        if value < self.sub_bucket_count:
+            return value
+        exponent = value.bit_length() - self.sub_bucket_bits
+        return self.sub_bucket_count + (exponent - 1) * self.half_count + (value >> exponent) - self.half_count
+
+    def _value_at(self, index):
+        if index < self.sub_bucket_count:
+            return index
+        exponent, offset = divmod(index - self.sub_bucket_count, self.half_count)
+        exponent += 1
+        return ((offset + self.half_count) << exponent) + (1 << (exponent - 1))
+
+    def record(self, value):
+        value = min(max(int(value), 0), self.max_trackable)
+        self.counts[self._index(value)] += 1
+        if not self.count or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+        self.count += 1
+        self.total += value
+        self.total_sq += value * value
+
+    def merge(self, other):
+        if not other.count:
+            return
+        counts = self.counts
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+        self.min = other.min if not self.count else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self.count += other.count
+        self.total += other.total
+        self.total_sq += other.total_sq
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def stdev(self):
+        if self.count < 2:
+            return 0.0
+        mean = self.mean()
+        return math.sqrt(max(self.total_sq / self.count - mean * mean, 0.0))
+
+    def percentile(self, percentile):
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(percentile / 100 * self.count))
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(max(self._value_at(index), self.min), self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            'min': self.min,
+            'avg': round(self.mean(), 2),
+            'stdev': round(self.stdev(), 2),
+            'max': self.max,
+            'percentiles': {str(p): self.percentile(p) for p in PERCENTILES},
+        }
+
+
+class EndpointStats:
+    """Latency and status codes of one endpoint within a scenario mix."""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.status_codes = {}
+
+    def record(self, status, latency):
+        self.histogram.record(latency)
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        for status, count in other.status_codes.items():
+            self.status_codes[status] = self.status_codes.get(status, 0) + count
+
+
+class WorkerStats:
+    """Counters collected by a single worker process."""
+
+    def __init__(self):
+        self.histogram = LatencyHistogram()
+        self.endpoints = {}
+        self.status_codes = {}
+        self.errors = {'connect': 0, 'read': 0, 'write': 0, 'timeout': 0}
+        self.bytes_read = 0
+        self.elapsed = 0.0
+        self.started = time.perf_counter()
+        # Completed requests per second of the run, for throughput variance.
+        self.timeline = array('Q')
+        # WorkerWarmup while the run is still warming up, else None
+        self.warmup = None
+
+    def record(self, status, size, latency, completed_at, endpoint=None):
+        if self.warmup is not None:
+            if not self.warmup.measuring(completed_at):
+                self.warmup.record(completed_at)
+                return
+            self.warmup.start(self)
+        self.histogram.record(latency)
+        self.status_codes[status] = self.status_codes.get(status, 0) + 1
+        if endpoint is not None:
+            if endpoint not in self.endpoints:
+                self.endpoints[endpoint] = EndpointStats()
+            self.endpoints[endpoint].record(status, latency)
+        self.bytes_read += size
+        second = int(completed_at - self.started)
+        if second >= len(self.timeline):
+            self.timeline.frombytes(bytes(8 * (second + 1 - len(self.timeline))))
+        self.timeline[second] += 1
+
+    def merge(self, other):
+        self.histogram.merge(other.histogram)
+        for endpoint, endpoint_stats in other.endpoints.items():
+            self.endpoints.setdefault(endpoint, EndpointStats()).merge(endpoint_stats)
+        for status, count in other.status_codes.items():
+            self.status_codes[status] = self.status_codes.get(status, 0) + count
+        for kind, count in other.errors.items():
+            self.errors[kind] = self.errors.get(kind, 0) + count
+        self.bytes_read += other.bytes_read
+        self.elapsed = max(self.elapsed, other.elapsed)
+        if len(other.timeline) > len(self.timeline):
+            self.timeline.frombytes(bytes(8 * (len(other.timeline) - len(self.timeline))))
+        for second, count in enumerate(other.timeline):
+            self.timeline[second] += count
+
+
+class Warmup:
+    """
+    State shared between run_load() and its workers during a warmup.
+
+    Each worker counts its completions per second of the warmup in its own
+    slice of `counts`; the parent sums them and sets `measure_from` (a
+    perf_counter() timestamp, which is system-wide on Linux) once the
+    throughput is steady. Shared through the pool initializer, since
+    shared memory cannot be pickled into task arguments.
+    """
+
+    def __init__(self, context, processes, max_seconds):
+        self.processes = processes
+        self.slots = max_seconds + 1
+        self.counts = context.Array('Q', processes * self.slots, lock=False)
+        self.epoch = context.Value('d', 0.0, lock=False)
+        self.measure_from = context.Value('d', 0.0, lock=False)
+
+    def requests_in(self, second):
+        return sum(self.counts[worker * self.slots + second] for worker in range(self.processes))
+
+
+_warmup = None
+
+
+def _init_worker(warmup):
+    global _warmup
+    _warmup = warmup
+
+
+class WorkerWarmup:
+    """A worker's view of the shared Warmup."""
+
+    def __init__(self, warmup, index, deadline, duration):
+        self.warmup = warmup
+        self.offset = index * warmup.slots
+        self.deadline = deadline
+        self.duration = duration
+
+    def measuring(self, now):
+        measure_from = self.warmup.measure_from.value
+        return bool(measure_from) and now >= measure_from
+
+    def record(self, completed_at):
+        second = int(completed_at - self.warmup.epoch.value)
+        if 0 <= second < self.warmup.slots:
+            self.warmup.counts[self.offset + second] += 1
+
+    def start(self, stats):
+        """Restart the stats at the measured window and move the deadline to its end."""
+        if stats.warmup is None:
+            return
+        stats.started = self.warmup.measure_from.value
+        stats.errors = dict.fromkeys(stats.errors, 0)
+        stats.warmup = None
+        self.deadline.at = stats.started + self.duration
+
+    async def wait(self, stats):
+        """Switch over when the parent starts the measured window, even if no request completes."""
+        while not self.warmup.measure_from.value:
+            await asyncio.sleep(0.01)
+        self.start(stats)
+
+
+class Deadline:
+    """End of the run as a perf_counter() timestamp; moved when a warmup ends."""
+
+    def __init__(self, at):
+        self.at = at
+
+
+# Responses that never have a body, whatever their headers say (RFC 9112 6.3)
+BODILESS_STATUSES = (204, 304)
+
+
+async def read_response(reader, head_request=False):
+    """
+    Read one HTTP/1.x response.
+
+    Interim 1xx responses are skipped. Replies to HEAD, 204 and 304 have no
+    body, so only a response with neither Content-Length nor chunked
+    encoding that can have one is read until the server closes.
+
+    Returns:
+        tuple: (status code, bytes read, whether the connection stays open).
+    """
+    size = 0
+    while True:
+        head = await reader.readuntil(b'\r\n\r\n')
+        status = int(head[9:12])
+        # 101 Switching Protocols is final; other 1xx come before the real response
+        if not 100 <= status < 200 or status == 101:
+            break
+        size += len(head)
+    keep_alive = not head.startswith(b'HTTP/1.0')
+    length = None
+    chunked = False
+    for line in head.split(b'\r\n')[1:]:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = b'chunked' in value.lower()
+        elif name == b'connection':
+            value = value.strip().lower()
+            keep_alive = value != b'close' if keep_alive else value == b'keep-alive'
+
+    size += len(head)
+    if head_request or 100 <= status < 200 or status in BODILESS_STATUSES:
+        return status, size, keep_alive
+    if chunked:
+        while True:
+            line = await reader.readuntil(b'\r\n')
+            chunk = int(line.split(b';', 1)[0], 16)
+            await reader.readexactly(chunk + 2)
+            size += len(line) + chunk + 2
+            if not chunk:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+        size += length
+    else:
+        size += len(await reader.read())
+        keep_alive = False
+    return status, size, keep_alive
+
+
+def build_request(url):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path = f'{path}?{parts.query}'
+    request = f'GET {path} HTTP/1.1\r\nHost: {parts.netloc}\r\nAccept: */*\r\n\r\n'
+    return parts.hostname, parts.port or 80, request.encode('latin-1')
+
+
+def queries_sampler(spec, rng):
+    """
+    Return a function drawing `queries` values as described by `spec`.
+
+    Supported distributions: {"distribution": "fixed", "value": n},
+    "uniform" (min, max), "choice" (values, optional weights) and
+    "exponential" (mean, optional max), always at least 1.
+    """
+    distribution = spec.get('distribution', 'fixed')
+    if distribution == 'fixed':
+        return lambda: spec['value']
+    if distribution == 'uniform':
+        return lambda: rng.randint(spec['min'], spec['max'])
+    if distribution == 'choice':
+        values, weights = spec['values'], spec.get('weights')
+        return lambda: rng.choices(values, weights)[0]
+    if distribution == 'exponential':
+        mean, upper = spec['mean'], spec.get('max', 500)
+        return lambda: min(max(1, round(rng.expovariate(1 / mean))), upper)
+    raise ValueError(f'Unknown queries distribution: {distribution}')
+
+
+class RequestMix:
+    """
+    Weighted endpoint mix from a scenario, see scenarios/*.json.
+
+    Each scenario endpoint has a 'name', a 'path', a 'weight' and optionally
+    a 'queries' distribution (see queries_sampler). Encoded requests are
+    cached per (endpoint, queries) pair, so picking one costs a weighted
+    choice and a dict lookup.
+    """
+
+    def __init__(self, base_url, endpoints, seed=None):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.netloc = parts.netloc
+        self.rng = random.Random(seed)
+        self.names = [endpoint['name'] for endpoint in endpoints]
+        self.paths = [endpoint['path'] for endpoint in endpoints]
+        self.samplers = [
+            queries_sampler(endpoint['queries'], self.rng) if 'queries' in endpoint else None
+            for endpoint in endpoints
+        ]
+        weights = [endpoint.get('weight', 1) for endpoint in endpoints]
+        self.cum_weights = [sum(weights[:i + 1]) for i in range(len(weights))]
+        self.indices = range(len(endpoints))
+        self._requests = {}
+
+    def next(self):
+        """
+        Returns:
+            tuple: (endpoint name, encoded request).
+        """
+        index = self.rng.choices(self.indices, cum_weights=self.cum_weights)[0]
+        sampler = self.samplers[index]
+        queries = sampler() if sampler else None
+        key = (index, queries)
+        request = self._requests.get(key)
+        if request is None:
+            path = self.paths[index] if queries is None else f'{self.paths[index]}?queries={queries}'
+            request = f'GET {path} HTTP/1.1\r\nHost: {self.netloc}\r\nAccept: */*\r\n\r\n'.encode('latin-1')
+            self._requests[key] = request
+        return self.names[index], request
+
+
+class Connection:
+    """A keep-alive client connection that reconnects after errors."""
+
+    def __init__(self, host, port, timeout, stats):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.stats = stats
+        self.reader = None
+        self.writer = None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, request, intended=None, endpoint=None):
+        """
+        Send one request and record the outcome.
+
+        Latency is measured from `intended` (a perf_counter() timestamp) when
+        given, so time a request spent waiting behind a stalled one counts.
+        `endpoint` names the scenario endpoint the latency is also kept for.
+
+        Returns:
+            float: perf_counter() timestamp at which the response completed,
+            or None if the request failed.
+        """
+        if self.writer is None:
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port), self.timeout)
+            except (OSError, asyncio.TimeoutError):
+                self.stats.errors['connect'] += 1
+                self.close()
+                return None
+
+        start = time.perf_counter() if intended is None else intended
+        try:
+            self.writer.write(request)
+            await self.writer.drain()
+        except OSError:
+            self.stats.errors['write'] += 1
+            self.close()
+            return None
+        try:
+            status, size, keep_alive = await asyncio.wait_for(
+                read_response(self.reader, request.startswith(b'HEAD ')), self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.errors['timeout'] += 1
+            self.close()
+            return None
+        except (OSError, ValueError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            self.stats.errors['read'] += 1
+            self.close()
+            return None
+
+        end = time.perf_counter()
+        self.stats.record(status, size, (end - start) * 1e6, end, endpoint)
+        if not keep_alive:
+            self.close()
+        return end
+
+
+async def closed_loop_client(connection, next_request, deadline):
+    while time.perf_counter() < deadline.at:
+        endpoint, request = next_request()
+        if await connection.request(request, endpoint=endpoint) is None:
+            # Back off briefly so a refused connection does not spin the loop.
+            await asyncio.sleep(0.01)
+    connection.close()
+
+
+async def open_loop_client(connection, next_request, start, interval, deadline):
+    """
+    Send requests on a fixed timetable, like wrk2.
+
+    Request n is due at start + n * interval whether or not the previous one
+    has completed; when the server stalls, the backlog is sent back to back
+    and each request is charged from its due time, which corrects for
+    coordinated omission.
+    """
+    due = start
+    while due < deadline:
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        endpoint, request = next_request()
+        await connection.request(request, intended=due, endpoint=endpoint)
+        due += interval
+    connection.close()
+
+
+async def worker_main(url, connections, duration, timeout, rate=None, scenario=None, index=0):
+    if scenario:
+        # Seeded per process so the workers do not replay the same sequence
+        mix = RequestMix(url, scenario['endpoints'], seed=scenario.get('seed', 0) + os.getpid())
+        host, port, next_request = mix.host, mix.port, mix.next
+    else:
+        host, port, request = build_request(url)
+        single = (None, request)
+        next_request = lambda: single
+    stats = WorkerStats()
+    start = stats.started
+    deadline = Deadline(start + duration)
+    tasks = []
+    if _warmup is not None:
+        stats.warmup = WorkerWarmup(_warmup, index, deadline, duration)
+        deadline.at = float('inf')
+        tasks.append(stats.warmup.wait(stats))
+    if rate:
+        interval = connections / rate
+        clients = (
+            open_loop_client(Connection(host, port, timeout, stats), next_request,
+                             start + interval * i / connections, interval, deadline.at)
+            for i in range(connections)
+        )
+    else:
+        clients = (
+            closed_loop_client(Connection(host, port, timeout, stats), next_request, deadline)
+            for _ in range(connections)
+        )
+    await asyncio.gather(*tasks, *clients)
+    stats.elapsed = time.perf_counter() - stats.started
+    return stats
+
+
+def run_worker(args):
+    if uvloop is not None:
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(worker_main(*args))
+
+
+def split_connections(connections, processes):
+    processes = max(1, min(processes, connections))
+    return [connections // processes + (1 if i < connections % processes else 0) for i in range(processes)]
+
+
+def summarize(url, duration, processes, connections, stats):
+    """
+    Build a result dict from merged worker stats.
+
+    The keys follow the ones produced for wrk runs in benchmark.py.
+    """
+    total_requests = stats.histogram.count
+    elapsed = stats.elapsed or duration
+    status_codes = {str(status): count for status, count in sorted(stats.status_codes.items())}
+    return {
+        'url': url,
+        'duration': duration,
+        'threads': processes,
+        'connections': connections,
+        'latency': stats.histogram.summary(),
+        'total_requests': total_requests,
+        'total_duration': round(elapsed, 3),
+        'requests_per_sec': round(total_requests / elapsed, 2),
+        'bytes_read': stats.bytes_read,
+        'transfer_per_sec': round(stats.bytes_read / elapsed, 2),
+        'status_codes': status_codes,
+        'non_2xx': sum(count for status, count in stats.status_codes.items() if not 200 <= status < 300),
+        'errors': stats.errors,
+        # Only whole seconds inside the run; the last partial second is dropped.
+        'rps_timeline': list(stats.timeline[:int(elapsed)]),
+        **({'endpoints': summarize_endpoints(stats, elapsed)} if stats.endpoints else {}),
+    }
+
+
+def summarize_endpoints(stats, elapsed):
+    """Per-endpoint share, throughput, latency and status codes of a scenario run."""
+    total = stats.histogram.count or 1
+    return {
+        endpoint: {
+            'requests': endpoint_stats.histogram.count,
+            'share': round(endpoint_stats.histogram.count / total, 4),
+            'requests_per_sec': round(endpoint_stats.histogram.count / elapsed, 2),
+            'latency': endpoint_stats.histogram.summary(),
+            'status_codes': {str(status): count for status, count in sorted(endpoint_stats.status_codes.items())},
+            'non_2xx': sum(count for status, count in endpoint_stats.status_codes.items() if not 200 <= status < 300),
+        }
+        for endpoint, endpoint_stats in sorted(stats.endpoints.items())
+    }
+
+
+def coefficient_of_variation(samples):
+    """
+    Standard deviation of the samples divided by their mean.
+    """
+    mean = sum(samples) / len(samples)
+    if not mean:
+        return float('inf')
+    variance = sum((sample - mean) ** 2 for sample in samples) / len(samples)
+    return variance ** 0.5 / mean
+
+
+def watch_warmup(warmup, max_seconds=30, window=5, max_cv=0.05):
+    """
+    Follow the workers' per-second completions until throughput settles.
+
+    Returns once the coefficient of variation over the last `window`
+    seconds is at most `max_cv`, or after `max_seconds`.
+
+    Returns:
+        dict: The per-second warmup curve and whether steady state was reached.
+    """
+    curve = []
+    cv = None
+    while len(curve) < max_seconds:
+        second = len(curve)
+        time.sleep(max(warmup.epoch.value + second + 1 - time.perf_counter(), 0))
+        curve.append({'second': second + 1, 'requests_per_sec': warmup.requests_in(second)})
+        if len(curve) >= window:
+            cv = coefficient_of_variation([sample['requests_per_sec'] for sample in curve[-window:]])
+            if cv <= max_cv:
+                return {'steady': True, 'seconds': len(curve), 'cv': round(cv, 4), 'curve': curve}
+    return {'steady': False, 'seconds': len(curve), 'cv': cv if cv is None else round(cv, 4), 'curve': curve}
+
+
+def run_load(url, duration=30, processes=2, connections=10, timeout=2.0, rate=None, scenario=None,
+             warmup=None, on_measure=None):
+    """
+    Run a load test against a single URL, or a scenario's endpoint mix.
+
+    Without `rate` every connection sends its next request as soon as the
+    previous one completes (closed loop). With `rate` requests are sent on a
+    constant-rate schedule (open loop) and latency is measured from the time
+    each request was due.
+
+    Args:
+        url (str): The URL to benchmark.
+        duration (float): Duration of the test in seconds.
+        processes (int): Number of worker processes to fan out to.
+        connections (int): Total number of keep-alive connections.
+        timeout (float): Per-request timeout in seconds.
+        rate (float): Target requests per second across all connections.
+        scenario (dict): Endpoint mix to send instead of `url`, which is
+            then the base URL. Results gain an 'endpoints' breakdown.
+        warmup (dict): Keyword arguments for watch_warmup(). The same
+            connections first warm up until throughput settles and then
+            run the measured `duration`; the warmup curve is returned
+            under 'warmup'. Closed loop only.
+        on_measure (callable): Called in this process when the measured
+            window starts, e.g. to start resource samplers.
+
+    Returns:
+        dict: Merged results, with latencies in microseconds.
+    """
+    if warmup and rate:
+        raise ValueError('warmup is only supported for closed-loop runs')
+    shares = split_connections(connections, processes)
+    args = [
+        (url, share, duration, timeout, rate * share / connections if rate else None, scenario, index)
+        for index, share in enumerate(shares)
+    ]
+    ctx = multiprocessing.get_context('spawn')
+    shared = Warmup(ctx, len(shares), warmup.get('max_seconds', 30)) if warmup else None
+    warmup_result = None
+    with ctx.Pool(len(shares), initializer=_init_worker, initargs=(shared,)) as pool:
+        if shared:
+            shared.epoch.value = time.perf_counter()
+        pending = pool.map_async(run_worker, args)
+        if shared:
+            warmup_result = watch_warmup(shared, **warmup)
+            shared.measure_from.value = time.perf_counter()
+        if on_measure:
+            on_measure()
+        parts = pending.get()
+
+    stats = WorkerStats()
+    for part in parts:
+        stats.merge(part)
+    result = summarize(url, duration, len(shares), connections, stats)
+    if rate:
+        result['target_rate'] = rate
+    if scenario:
+        result['scenario'] = scenario.get('name')
+    if warmup_result:
+        result['warmup'] = warmup_result
+    return result
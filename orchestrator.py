@@ -0,0 +1,157 @@
+"""
+Start, probe and stop the benchmarked servers.
+
+Servers are described declaratively in servers.json: a working directory
+and a command line with {port}, {workers} and {pidfile} placeholders.
+benchmark.py's `suite` command runs each server with each worker count,
+one at a time, so only one server competes for CPU during a run.
+"""
+import json
+import os
+import signal
+import socket
+import subprocess
+import time
+import urllib.error
+import urllib.request
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_CONFIG = os.path.join(REPO_DIR, 'servers.json')
+
+
+def load_config(path=DEFAULT_CONFIG):
+    with open(path) as f:
+        return json.load(f)
+
+
+def worker_counts(values):
+    """
+    Resolve worker counts, where 'cpu_count' stands for os.cpu_count().
+    """
+    counts = []
+    for value in values:
+        count = os.cpu_count() if value == 'cpu_count' else int(value)
+        if count not in counts:
+            counts.append(count)
+    return counts
+
+
+def port_in_use(port, host='127.0.0.1'):
+    with socket.socket() as sock:
+        sock.settimeout(0.5)
+        return sock.connect_ex((host, port)) == 0
+
+
+class ServerError(RuntimeError):
+    pass
+
+
+class ManagedServer:
+    """
+    A server process started from a servers.json entry.
+
+    Used as a context manager: entering starts the server and waits until
+    `ready_path` answers 200, leaving stops it together with its workers.
+    """
+
+    def __init__(self, spec, workers, port=8080, ready_path='/plaintext', ready_timeout=60, log_dir=None, env=None):
+        self.name = spec['name']
+        self.workers = workers
+        self.port = port
+        self.ready_path = spec.get('ready_path', ready_path)
+        self.ready_timeout = spec.get('ready_timeout', ready_timeout)
+        self.pidfile = f'/tmp/benchmark-{self.name}.pid'
+        self.cwd = os.path.join(REPO_DIR, spec['cwd'])
+        self.command = [
+            arg.format(port=port, workers=workers, pidfile=self.pidfile) for arg in spec['command']
+        ]
+        self.env = {**os.environ, **spec.get('env', {}), **(env or {})}
+        self.log_path = os.path.join(log_dir, f'{self.name}-w{workers}.log') if log_dir else os.devnull
+        self.process = None
+        self.started_at = None
+        self._log = None
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def start(self):
+        if port_in_use(self.port):
+            raise ServerError(f'Port {self.port} is already in use; stop the running server first')
+        if os.path.dirname(self.log_path):
+            os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+        self._log = open(self.log_path, 'ab')
+        self.started_at = time.monotonic()
+        self.process = subprocess.Popen(
+            self.command, cwd=self.cwd, env=self.env, stdout=self._log, stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+
+    def _wait_for(self, check, what, interval):
+        deadline = self.started_at + self.ready_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise ServerError(f'{self.name} exited with status {self.process.returncode}, see {self.log_path}')
+            if check():
+                return time.monotonic() - self.started_at
+            time.sleep(interval)
+        raise ServerError(f'{self.name} did not {what} within {self.ready_timeout}s, see {self.log_path}')
+
+    def wait_bound(self, interval=0.005):
+        """
+        Poll the port until it accepts connections.
+
+        Returns:
+            float: Seconds from start until the port was bound.
+        """
+        return self._wait_for(lambda: port_in_use(self.port), f'bind port {self.port}', interval)
+
+    def wait_ready(self, path=None, interval=0.1):
+        """
+        Poll `path` (default ready_path) until it answers 200.
+
+        Returns:
+            float: Seconds from start until the server was ready.
+        """
+        url = self.base_url + (path or self.ready_path)
+
+        def answered():
+            try:
+                with urllib.request.urlopen(url, timeout=1) as response:
+                    return response.status == 200
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                return False
+
+        return self._wait_for(answered, f'answer {url}', interval)
+
+    def stop(self, timeout=30):
+        if self.process is None:
+            return
+        # gunicorn was started in its own session, so signalling the process
+        # group reaches its workers too, even if the master already exited.
+        try:
+            os.killpg(self.process.pid, signal.SIGTERM)
+            self.process.wait(timeout)
+        except ProcessLookupError:
+            self.process.wait()
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        self.process = None
+        if self._log:
+            self._log.close()
+            self._log = None
+        if os.path.exists(self.pidfile):
+            os.remove(self.pidfile)
+
+    def __enter__(self):
+        self.start()
+        try:
+            self.wait_ready()
+        except BaseException:
+            self.stop()
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,28 @@
+"""
+Connection to the benchmark database for the command-line tools.
+
+benchmark.py and dataset.py both connect with the same PG* variables the
+apps read; this keeps dataset.py from importing the whole benchmark
+runner for it.
+"""
+import os
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+
+def connect_db():
+    """
+    Connect to the benchmark database with the same PG* variables the apps use.
+    """
+    if psycopg2 is None:
+        raise RuntimeError('psycopg2 is required for database access, see requirements.txt')
+    return psycopg2.connect(
+        dbname=os.getenv('PGDB', 'benchmark_db'),
+        user=os.getenv('PGUSER', 'postgres'),
+        password=os.getenv('PGPASS', 'root'),
+        host=os.getenv('PGHOST', 'localhost'),
+        port=5432,
+    )
@@ -0,0 +1,168 @@
+"""
+Database-side accounting from Postgres' statistics views.
+
+benchmark.py takes a DatabaseSnapshot before and after each measured run
+and diffs them: pg_stat_statements for statement counts and execution
+time, pg_stat_database for commits, rollbacks and buffer hits/reads, and
+pg_stat_wal for WAL volume. Divided by the HTTP requests of the run, this
+gives statements, DB time and commits per request, which is where N+1
+query patterns and per-row transactions show up.
+
+pg_stat_statements needs `shared_preload_libraries = 'pg_stat_statements'`
+and `CREATE EXTENSION pg_stat_statements` (see base_db.sql); pg_stat_wal
+needs Postgres 14. Whatever is unavailable is left out of the summary.
+"""
+import time
+
+try:
+    import psycopg2
+except ImportError:
+    psycopg2 = None
+
+STATEMENTS_SQL = (
+    'SELECT * FROM pg_stat_statements '
+    'WHERE dbid = (SELECT oid FROM pg_database WHERE datname = current_database())'
+)
+DATABASE_SQL = (
+    'SELECT xact_commit, xact_rollback, blks_read, blks_hit, tup_returned, tup_fetched, '
+    'tup_inserted, tup_updated, tup_deleted FROM pg_stat_database WHERE datname = current_database()'
+)
+WAL_SQL = 'SELECT wal_records, wal_fpi, wal_bytes FROM pg_stat_wal'
+
+# Backends report pg_stat_database counters when they go idle, at most
+# once a second (Postgres 15+) or via the stats collector (up to 500ms).
+STATS_FLUSH_DELAY = 1.0
+
+
+def _fetch(connection, sql):
+    """
+    Run `sql` and return its rows as dicts, or None if the view is unavailable.
+    """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            columns = [column.name for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except psycopg2.Error:
+        return None
+
+
+def read_statements(connection):
+    """
+    Calls, execution time and rows per statement, keyed by queryid.
+
+    Statements touching the statistics views themselves (these snapshots)
+    are skipped.
+    """
+    rows = _fetch(connection, STATEMENTS_SQL)
+    if rows is None:
+        return None
+    statements = {}
+    for row in rows:
+        if row['queryid'] is None or 'pg_stat' in row['query']:
+            continue
+        entry = statements.setdefault(row['queryid'], {
+            'query': row['query'], 'calls': 0, 'total_ms': 0.0, 'rows': 0,
+        })
+        entry['calls'] += row['calls']
+        # total_time was renamed to total_exec_time in Postgres 13
+        entry['total_ms'] += row.get('total_exec_time', row.get('total_time')) or 0.0
+        entry['rows'] += row['rows']
+    return statements
+
+
+class DatabaseSnapshot:
+    """
+    Counters of the three statistics views at one point in time.
+
+    Usage:
+        before = DatabaseSnapshot(connection)
+        ...  # run the load
+        summary = DatabaseSnapshot(connection, settle=True).diff(before, total_requests)
+    """
+
+    def __init__(self, connection, settle=False):
+        if settle:
+            time.sleep(STATS_FLUSH_DELAY)
+        # Each statement sees fresh statistics only outside a transaction
+        connection.autocommit = True
+        self.statements = read_statements(connection)
+        database = _fetch(connection, DATABASE_SQL)
+        self.database = database[0] if database else None
+        wal = _fetch(connection, WAL_SQL)
+        self.wal = {key: int(value) for key, value in wal[0].items()} if wal else None
+
+    def diff(self, before, total_requests=None, top=10):
+        """
+        Summarise what happened in the database between `before` and this snapshot.
+
+        Args:
+            before (DatabaseSnapshot): Snapshot taken when the run started.
+            total_requests (int): HTTP requests served during the run, for
+                the per-request figures.
+            top (int): Number of statements listed, by calls.
+
+        Returns:
+            dict: Totals and per-request figures for each available view.
+        """
+        per_request = (lambda value: round(value / total_requests, 4)) if total_requests else (lambda value: None)
+        summary = {'total_requests': total_requests}
+
+        if self.statements is not None and before.statements is not None:
+            statements = []
+            for queryid, after in self.statements.items():
+                first = before.statements.get(queryid, {})
+                calls = after['calls'] - first.get('calls', 0)
+                if calls <= 0:
+                    continue
+                statements.append({
+                    'query': after['query'],
+                    'calls': calls,
+                    'total_ms': round(after['total_ms'] - first.get('total_ms', 0.0), 3),
+                    'rows': after['rows'] - first.get('rows', 0),
+                    'calls_per_request': per_request(calls),
+                })
+            calls = sum(statement['calls'] for statement in statements)
+            total_ms = sum(statement['total_ms'] for statement in statements)
+            statements.sort(key=lambda statement: -statement['calls'])
+            summary['statements'] = {
+                'calls': calls,
+                'total_ms': round(total_ms, 3),
+                'per_request': per_request(calls),
+                'db_ms_per_request': per_request(total_ms),
+                'top': statements[:top],
+            }
+
+        if self.database and before.database:
+            delta = {key: self.database[key] - before.database[key] for key in self.database}
+            blocks = delta['blks_hit'] + delta['blks_read']
+            summary['database'] = {
+                **delta,
+                'commits_per_request': per_request(delta['xact_commit']),
+                'rollbacks_per_request': per_request(delta['xact_rollback']),
+                'blks_read_per_request': per_request(delta['blks_read']),
+                'cache_hit_ratio': round(delta['blks_hit'] / blocks, 4) if blocks else None,
+            }
+
+        if self.wal and before.wal:
+            delta = {key: self.wal[key] - before.wal[key] for key in self.wal}
+            summary['wal'] = {
+                **delta,
+                'records_per_request': per_request(delta['wal_records']),
+                'bytes_per_request': per_request(delta['wal_bytes']),
+            }
+        return summary
+
+
+def format_summary(framework, endpoint, summary):
+    """One line of per-request database figures, with '-' for what was unavailable."""
+    def value(section, key):
+        figure = summary.get(section, {}).get(key)
+        return '-' if figure is None else f'{figure:g}'
+
+    return (
+        f"DB for {framework} {endpoint}: {value('statements', 'per_request')} statements/request, "
+        f"{value('statements', 'db_ms_per_request')} ms DB time/request, "
+        f"{value('database', 'commits_per_request')} commits/request, "
+        f"{value('wal', 'bytes_per_request')} WAL bytes/request"
+    )
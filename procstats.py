@@ -0,0 +1,235 @@
+"""
+Server-side resource sampling from /proc.
+
+benchmark.py runs a ProcessSampler around each measured run. The sampler
+tracks a gunicorn master (found through its pidfile) or explicit PIDs,
+together with every descendant process, so workers that are (re)spawned
+during the run are picked up as well.
+
+Peak memory comes from the kernel's high-water mark (VmHWM), which catches
+allocation spikes between samples; note that it covers the whole life of
+the process, including startup. The RSS read at each sample is kept as a
+separate series.
+"""
+import os
+import threading
+import time
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+
+
+def read_pidfile(path):
+    with open(path) as f:
+        return int(f.read().strip())
+
+
+def child_pids():
+    """
+    Map every running PID to its parent PID.
+    """
+    parents = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                stat = f.read()
+        except OSError:
+            continue
+        parents[int(entry)] = int(stat.rsplit(')', 1)[1].split()[1])
+    return parents
+
+
+def with_descendants(roots):
+    parents = child_pids()
+    pids = {pid for pid in roots if pid in parents}
+    added = True
+    while added:
+        children = {pid for pid, parent in parents.items() if parent in pids} - pids
+        pids |= children
+        added = bool(children)
+    return sorted(pids)
+
+
+def read_process(pid):
+    """
+    Read CPU time, memory, context switches, I/O and open sockets for a PID.
+
+    Returns:
+        dict: The counters, or None if the process has exited.
+    """
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        with open(f'/proc/{pid}/status') as f:
+            status = dict(line.split(':', 1) for line in f if ':' in line)
+    except OSError:
+        return None
+
+    # fields[0] is the state (field 3 in proc(5)); utime/stime are fields 14/15.
+    sample = {
+        'cpu_seconds': (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+        'rss_bytes': int(status.get('VmRSS', '0 kB').split()[0]) * 1024,
+        'peak_rss_bytes': int(status.get('VmHWM', '0 kB').split()[0]) * 1024,
+        'threads': int(status.get('Threads', '0')),
+        'voluntary_ctxt_switches': 0,
+        'nonvoluntary_ctxt_switches': 0,
+    }
+
+    # The context switch counts in /proc/<pid>/status only cover the main
+    # thread, so add up every thread of the process.
+    try:
+        tasks = os.listdir(f'/proc/{pid}/task')
+    except OSError:
+        tasks = []
+    for task in tasks:
+        try:
+            with open(f'/proc/{pid}/task/{task}/status') as f:
+                for line in f:
+                    name, _, value = line.partition(':')
+                    if name in ('voluntary_ctxt_switches', 'nonvoluntary_ctxt_switches'):
+                        sample[name] += int(value)
+        except OSError:
+            continue
+
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            io = dict(line.split(':', 1) for line in f if ':' in line)
+        sample['read_bytes'] = int(io['read_bytes'])
+        sample['write_bytes'] = int(io['write_bytes'])
+    except (OSError, KeyError):
+        # /proc/<pid>/io is only readable by the owner (or with ptrace access).
+        pass
+
+    try:
+        sample['sockets'] = sum(
+            os.readlink(f'/proc/{pid}/fd/{fd}').startswith('socket:')
+            for fd in os.listdir(f'/proc/{pid}/fd')
+        )
+    except OSError:
+        pass
+    return sample
+
+
+COUNTERS = (
+    'cpu_seconds',
+    'voluntary_ctxt_switches',
+    'nonvoluntary_ctxt_switches',
+    'read_bytes',
+    'write_bytes',
+)
+
+
+class ProcessSampler(threading.Thread):
+    """
+    Sample server processes at a fixed interval in a background thread.
+
+    Usage:
+        sampler = ProcessSampler(pidfile='/tmp/fastapi.pid')
+        sampler.start()
+        ...  # run the load
+        summary = sampler.stop(total_requests)
+    """
+
+    def __init__(self, pids=(), pidfile=None, interval=0.5):
+        super().__init__(daemon=True)
+        self.roots = list(pids)
+        self.pidfile = pidfile
+        self.interval = interval
+        self.first = {}
+        self.last = {}
+        self.rss_series = {}
+        self.peak_sockets = {}
+        self.samples = 0
+        self.started_at = None
+        self.stopped_at = None
+        self._stop_event = threading.Event()
+
+    def _roots(self):
+        roots = list(self.roots)
+        if self.pidfile:
+            try:
+                roots.append(read_pidfile(self.pidfile))
+            except (OSError, ValueError):
+                pass
+        return roots
+
+    def sample(self):
+        for pid in with_descendants(self._roots()):
+            sample = read_process(pid)
+            if sample is None:
+                continue
+            self.first.setdefault(pid, sample)
+            self.last[pid] = sample
+            self.rss_series.setdefault(pid, []).append(sample['rss_bytes'])
+            if 'sockets' in sample:
+                self.peak_sockets[pid] = max(self.peak_sockets.get(pid, 0), sample['sockets'])
+        self.samples += 1
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.sample()
+        super().start()
+
+    def stop(self, total_requests=None):
+        """
+        Stop sampling and summarise the run.
+
+        Args:
+            total_requests (int): Requests served during the run, used for
+                the per-request efficiency figures.
+
+        Returns:
+            dict: Totals across all processes plus a per-process breakdown.
+        """
+        self._stop_event.set()
+        self.join()
+        self.sample()
+        self.stopped_at = time.monotonic()
+        return self.summary(total_requests)
+
+    def summary(self, total_requests=None):
+        processes = {}
+        totals = dict.fromkeys(COUNTERS, 0)
+        for pid, last in self.last.items():
+            first = self.first[pid]
+            process = {
+                counter: last[counter] - first[counter]
+                for counter in COUNTERS if counter in last and counter in first
+            }
+            process['cpu_seconds'] = round(process['cpu_seconds'], 3)
+            process['sampled_rss_bytes'] = self.rss_series[pid]
+            process['max_sampled_rss_bytes'] = max(self.rss_series[pid])
+            # VmHWM is updated from batched per-thread counters and can trail
+            # the VmRSS read alongside it by a little
+            process['peak_rss_bytes'] = max(last['peak_rss_bytes'], process['max_sampled_rss_bytes'])
+            if pid in self.peak_sockets:
+                process['peak_sockets'] = self.peak_sockets[pid]
+            processes[str(pid)] = process
+            for counter in COUNTERS:
+                totals[counter] += process.get(counter, 0)
+
+        elapsed = (self.stopped_at or time.monotonic()) - self.started_at
+        summary = {
+            'processes': processes,
+            'samples': self.samples,
+            'elapsed': round(elapsed, 3),
+            'cpu_seconds': round(totals['cpu_seconds'], 3),
+            'cpu_cores_used': round(totals['cpu_seconds'] / elapsed, 3) if elapsed else None,
+            'peak_rss_bytes_per_process': max((process['peak_rss_bytes'] for process in processes.values()), default=0),
+            'max_sampled_rss_bytes_per_process': max(
+                (process['max_sampled_rss_bytes'] for process in processes.values()), default=0),
+            'voluntary_ctxt_switches': totals['voluntary_ctxt_switches'],
+            'nonvoluntary_ctxt_switches': totals['nonvoluntary_ctxt_switches'],
+            'read_bytes': totals['read_bytes'],
+            'write_bytes': totals['write_bytes'],
+        }
+        if total_requests:
+            summary['cpu_seconds_per_1k_requests'] = round(totals['cpu_seconds'] * 1000 / total_requests, 4)
+            summary['ctxt_switches_per_request'] = round(
+                (totals['voluntary_ctxt_switches'] + totals['nonvoluntary_ctxt_switches']) / total_requests, 3)
+        return summary
@@ -0,0 +1,150 @@
+"""
+Trigger the apps' stack sampler (shared/profiler.py, PROFILER=1) during a run.
+
+benchmark.py creates a ProfileTrigger per measured run. Once the load has
+been running for `delay` seconds it writes the request file the workers
+read and sends them SIGUSR2; after the run, collect() waits for one
+collapsed-stack file per worker, merges them and summarises the hottest
+frames.
+"""
+import json
+import os
+import signal
+import threading
+import time
+from collections import Counter
+
+import procstats
+
+PROFILER_DIR = os.getenv('PROFILER_DIR', '/tmp/profiles')
+REQUEST_FILE = 'request.json'
+
+
+def worker_pids(server):
+    """
+    Processes to signal for a server given as pidfile, PID or list of PIDs.
+
+    For a pidfile the master itself is left out, since gunicorn treats
+    SIGUSR2 as a request to re-exec itself.
+    """
+    if isinstance(server, str):
+        try:
+            master = procstats.read_pidfile(server)
+        except (OSError, ValueError):
+            return []
+        return [pid for pid in procstats.with_descendants([master]) if pid != master]
+    if isinstance(server, int):
+        return [server]
+    return list(server)
+
+
+def profiler_enabled(pid):
+    """
+    Whether a worker was started with PROFILER=1, from /proc/<pid>/environ.
+
+    Workers without it ignore SIGUSR2 at best, and processes that never
+    installed the handler are terminated by it, so only these are signalled.
+    """
+    try:
+        with open(f'/proc/{pid}/environ', 'rb') as f:
+            return b'PROFILER=1' in f.read().split(b'\0')
+    except OSError:
+        return False
+
+
+def read_collapsed(path):
+    stacks = Counter()
+    with open(path) as f:
+        for line in f:
+            stack, _, count = line.rstrip('\n').rpartition(' ')
+            if stack:
+                stacks[stack] += int(count)
+    return stacks
+
+
+class ProfileTrigger:
+    """
+    Usage:
+        trigger = ProfileTrigger('/tmp/fastapi.pid', 10, 'results/profiles/fastapi/db', delay=10)
+        trigger.start()
+        ...  # run the load
+        profile = trigger.collect()
+    """
+
+    def __init__(self, server, seconds, output, delay=0.0):
+        self.server = server
+        self.seconds = seconds
+        self.output = os.path.abspath(output)
+        self.delay = delay
+        self.pids = []
+        # Workers left alone because they were not started with PROFILER=1
+        self.skipped = []
+        self.triggered_at = None
+        self._timer = threading.Timer(delay, self.trigger)
+        self._timer.daemon = True
+
+    def start(self):
+        self._timer.start()
+
+    def trigger(self):
+        os.makedirs(PROFILER_DIR, exist_ok=True)
+        os.makedirs(self.output, exist_ok=True)
+        with open(os.path.join(PROFILER_DIR, REQUEST_FILE), 'w') as f:
+            json.dump({'seconds': self.seconds, 'output': self.output}, f)
+        self.triggered_at = time.time()
+        for pid in worker_pids(self.server):
+            if not profiler_enabled(pid):
+                self.skipped.append(pid)
+                continue
+            try:
+                os.kill(pid, signal.SIGUSR2)
+                self.pids.append(pid)
+            except ProcessLookupError:
+                pass
+
+    def collect(self, grace=10, top=20):
+        """
+        Wait for every signalled worker's profile and summarise them.
+
+        Returns:
+            dict: Per-worker files, the merged file, sample counts and the
+            frames with the most self samples, or None if nothing was triggered.
+        """
+        self._timer.join()
+        if not self.pids:
+            return None
+        paths = {pid: os.path.join(self.output, f'{pid}.collapsed') for pid in self.pids}
+        deadline = self.triggered_at + self.seconds + grace
+        while time.time() < deadline and not all(
+            os.path.exists(path) and os.path.getmtime(path) >= self.triggered_at for path in paths.values()
+        ):
+            time.sleep(0.2)
+
+        merged = Counter()
+        workers = {}
+        for pid, path in paths.items():
+            if os.path.exists(path) and os.path.getmtime(path) >= self.triggered_at:
+                stacks = read_collapsed(path)
+                merged.update(stacks)
+                workers[str(pid)] = {'file': path, 'samples': sum(stacks.values())}
+
+        merged_path = os.path.join(self.output, 'merged.collapsed')
+        with open(merged_path, 'w') as f:
+            for stack, count in merged.most_common():
+                f.write(f'{stack} {count}\n')
+
+        self_samples = Counter()
+        for stack, count in merged.items():
+            self_samples[stack.rsplit(';', 1)[-1]] += count
+        total = sum(merged.values())
+        return {
+            'seconds': self.seconds,
+            'workers': workers,
+            'missing_workers': [pid for pid in self.pids if str(pid) not in workers],
+            'merged_file': merged_path,
+            'samples': total,
+            'top_self': [
+                {'frame': frame, 'samples': count, 'ratio': round(count / total, 4)}
+                for frame, count in self_samples.most_common(top)
+            ],
+        }
@@ -0,0 +1,355 @@
+"""
+Historical benchmark results in a local SQLite database.
+
+Every run_benchmark() call appends a run keyed by git SHA and host
+fingerprint, with one row per framework, endpoint and concurrency level.
+compare_runs() diffs two runs (or two git SHAs) and flags throughput and
+p99 regressions, testing significance across repeated runs.
+"""
+import hashlib
+import json
+import os
+import platform
+import re
+import sqlite3
+import subprocess
+import time
+from importlib import metadata
+
+import stats
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Suffix benchmark.trial_label() appends to the labels of repeated runs
+TRIAL_SUFFIX = re.compile(r'(^| \()trial \d+/\d+\)?$')
+# Runs per side below which compare_runs() makes no significance test
+MIN_SAMPLES = 2
+# Smallest equal number of runs per side for which the two-sided exact
+# permutation test can give p < 0.05 (2 / C(8, 4) = 0.029)
+MIN_TRIALS_FOR_5_PERCENT = 4
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    git_sha TEXT NOT NULL,
+    git_dirty INTEGER NOT NULL,
+    host TEXT NOT NULL,
+    host_info TEXT NOT NULL,
+    packages TEXT NOT NULL,
+    label TEXT
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    framework TEXT NOT NULL,
+    endpoint TEXT NOT NULL,
+    connections INTEGER,
+    rate REAL,
+    requests_per_sec REAL,
+    p50 REAL,
+    p99 REAL,
+    error_ratio REAL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_key ON results (framework, endpoint, connections);
+"""
+
+
+def git_revision():
+    """
+    Return (SHA, dirty) for the benchmark checkout, or ('unknown', False) outside git.
+    """
+    try:
+        sha = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_DIR,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+    return sha, bool(status.strip())
+
+
+def host_info():
+    info = {
+        'hostname': platform.node(),
+        'machine': platform.machine(),
+        'kernel': platform.release(),
+        'python': platform.python_version(),
+        'cpu_count': os.cpu_count(),
+    }
+    try:
+        with open('/proc/cpuinfo') as f:
+            model = re.search(r'^model name\s*:\s*(.+)$', f.read(), re.MULTILINE)
+        if model:
+            info['cpu_model'] = model.group(1).strip()
+        with open('/proc/meminfo') as f:
+            info['mem_total_kb'] = int(f.readline().split()[1])
+    except (OSError, IndexError, ValueError):
+        pass
+    return info
+
+
+def host_fingerprint(info):
+    """
+    Short hash of the hardware-relevant host details.
+    """
+    key = {k: info.get(k) for k in ('hostname', 'machine', 'cpu_model', 'cpu_count', 'mem_total_kb')}
+    return hashlib.sha1(json.dumps(key, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def package_versions(requirements=os.path.join(REPO_DIR, 'requirements.txt')):
+    """
+    Installed versions of the packages listed in requirements.txt.
+    """
+    versions = {}
+    try:
+        with open(requirements) as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return versions
+    for line in lines:
+        name = re.split(r'[\[=<>~! ]', line.strip(), 1)[0]
+        if not name or name.startswith('#'):
+            continue
+        try:
+            versions[name] = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            versions[name] = None
+    return versions
+
+
+def connect(path):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(path)
+    db.row_factory = sqlite3.Row
+    db.executescript(SCHEMA)
+    return db
+
+
+def start_run(db, label=None):
+    """
+    Record a new run for the current checkout and host.
+
+    Returns:
+        int: The run id.
+    """
+    sha, dirty = git_revision()
+    info = host_info()
+    cursor = db.execute(
+        'INSERT INTO runs (started_at, git_sha, git_dirty, host, host_info, packages, label) '
+        'VALUES (?, ?, ?, ?, ?, ?, ?)',
+        (time.strftime('%Y-%m-%dT%H:%M:%S%z'), sha, int(dirty), host_fingerprint(info),
+         json.dumps(info), json.dumps(package_versions()), label),
+    )
+    db.commit()
+    return cursor.lastrowid
+
+
+def _percentile(result, percentile):
+    return result.get('latency', {}).get('percentiles', {}).get(str(percentile))
+
+
+def _rows(framework, endpoint, result):
+    """
+    Flatten an endpoint result into (connections, rate, result) rows.
+
+    Sweeps yield a row per concurrency step and rate curves a row per
+    offered rate; plain runs yield a single row.
+    """
+    if 'steps' in result:
+        for step in result['steps']:
+            yield step['connections'], None, step
+    elif 'rate_curve' in result:
+        for point in result['rate_curve']:
+            yield result.get('connections'), point['offered_rps'], point
+    else:
+        yield result.get('connections'), result.get('target_rate'), result
+
+
+def record_result(db, run_id, framework, endpoint, result, error_ratio):
+    """
+    Append one endpoint result of a run.
+
+    Args:
+        error_ratio (callable): Computes the failed-request ratio of a result.
+    """
+    for connections, rate, row in _rows(framework, endpoint, result):
+        if 'achieved_rps' in row:
+            rps, p50, p99, errors = row['achieved_rps'], row.get('p50'), row.get('p99'), None
+        elif 'p99' in row:
+            rps, p50, p99, errors = row['requests_per_sec'], None, row['p99'], row.get('error_ratio')
+        else:
+            rps, p50, p99 = row.get('requests_per_sec'), _percentile(row, 50), _percentile(row, 99)
+            errors = error_ratio(row)
+        db.execute(
+            'INSERT INTO results (run_id, framework, endpoint, connections, rate, requests_per_sec, '
+            'p50, p99, error_ratio, result) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (run_id, framework, endpoint, connections, rate, rps, p50, p99, errors, json.dumps(row)),
+        )
+    db.commit()
+
+
+def base_label(label):
+    """A run's label without the trial suffix added by benchmark.trial_label()."""
+    if not label:
+        return None
+    return TRIAL_SUFFIX.sub('', label) or None
+
+
+def _select_runs(db, selector, label=None):
+    """
+    Resolve a run selector to run ids: a run id, 'latest', 'previous', or a (prefix of a) git SHA.
+
+    A SHA selects that commit's clean runs, or with a '-dirty' suffix the
+    runs made with uncommitted changes. `label` keeps only runs with that
+    label (ignoring trial suffixes). The runs a SHA pools must share their
+    label and host, otherwise ValueError asks for a narrower selection.
+    """
+    if selector in ('latest', 'previous'):
+        rows = db.execute('SELECT id FROM runs ORDER BY id DESC LIMIT 2').fetchall()
+        index = 0 if selector == 'latest' else 1
+        return [rows[index]['id']] if len(rows) > index else []
+    if str(selector).isdigit():
+        rows = db.execute('SELECT id FROM runs WHERE id = ?', (int(selector),)).fetchall()
+        if rows:
+            return [row['id'] for row in rows]
+    sha, dirty = str(selector), 0
+    if sha.endswith('-dirty'):
+        sha, dirty = sha[:-len('-dirty')], 1
+    rows = db.execute(
+        'SELECT id, label, host FROM runs WHERE git_sha LIKE ? AND git_dirty = ?', (f'{sha}%', dirty)
+    ).fetchall()
+    if label is not None:
+        rows = [row for row in rows if base_label(row['label']) == label]
+    groups = {(base_label(row['label']), row['host']) for row in rows}
+    if len(groups) > 1:
+        described = ', '.join(sorted(f'label {group_label!r} on {host}' for group_label, host in groups))
+        raise ValueError(f'Runs matching {selector!r} differ in configuration ({described}); '
+                         f'select one with --label')
+    return [row['id'] for row in rows]
+
+
+def _load(db, run_ids):
+    grouped = {}
+    placeholders = ','.join('?' * len(run_ids))
+    for row in db.execute(
+            f'SELECT r.*, runs.host FROM results r JOIN runs ON runs.id = r.run_id '
+            f'WHERE run_id IN ({placeholders})', run_ids):
+        key = (row['framework'], row['endpoint'], row['connections'], row['rate'])
+        grouped.setdefault(key, []).append(row)
+    return grouped
+
+
+def _samples(rows, column):
+    """
+    One value per stored run: repeated runs are the only independent samples.
+
+    A run's per-second throughput timeline is not used, since consecutive
+    seconds are autocorrelated and include the ramp-up.
+    """
+    return [row[column] for row in rows if row[column] is not None]
+
+
+def _compare_metric(before, after, higher_is_better, threshold, alpha):
+    if not before or not after:
+        return None
+    mean_before = sum(before) / len(before)
+    mean_after = sum(after) / len(after)
+    change = stats.relative_change(mean_before, mean_after)
+    enough = len(before) >= MIN_SAMPLES and len(after) >= MIN_SAMPLES
+    p_value = stats.permutation_test(before, after) if enough else None
+    worse = change is not None and (change < -threshold if higher_is_better else change > threshold)
+    better = change is not None and (change > threshold if higher_is_better else change < -threshold)
+    significant = p_value is not None and p_value < alpha
+    if not enough:
+        # No test possible: fall back to the threshold alone, flagged as untested
+        verdict = 'REGRESSION' if worse else 'improved' if better else 'ok'
+    elif worse:
+        verdict = 'REGRESSION' if significant else 'worse (n.s.)'
+    elif better:
+        verdict = 'improved' if significant else 'better (n.s.)'
+    else:
+        verdict = 'ok'
+    return {
+        'before': round(mean_before, 2),
+        'after': round(mean_after, 2),
+        'change': round(change, 4) if change is not None else None,
+        'p_value': round(p_value, 4) if p_value is not None else None,
+        'samples': (len(before), len(after)),
+        'tested': enough,
+        'verdict': verdict,
+    }
+
+
+def compare_runs(db, before, after, threshold=0.05, alpha=0.05, label=None):
+    """
+    Compare two runs, or every run of two git SHAs.
+
+    A change counts as a regression when throughput drops (or p99 grows) by
+    more than `threshold` and a permutation test over the samples gives
+    p < `alpha`. Samples are the repeated runs of each side, e.g. the
+    trials of `suite --trials N` selected by git SHA. With fewer than
+    MIN_SAMPLES runs on either side no test is made: the verdict then
+    follows the threshold alone and the metric is marked 'tested': False.
+    The exact test cannot reach p < 0.05 with fewer than
+    MIN_TRIALS_FOR_5_PERCENT runs per side.
+
+    Args:
+        label (str): Only pool runs with this label, see _select_runs().
+
+    Returns:
+        list: One dict per (framework, endpoint, connections, rate) present on both sides.
+    """
+    before_ids = _select_runs(db, before, label)
+    after_ids = _select_runs(db, after, label)
+    if not before_ids:
+        raise ValueError(f'No run matches {before!r}')
+    if not after_ids:
+        raise ValueError(f'No run matches {after!r}')
+
+    before_rows = _load(db, before_ids)
+    after_rows = _load(db, after_ids)
+    comparison = []
+    for key in sorted(before_rows.keys() & after_rows.keys(), key=lambda k: tuple(str(v) for v in k)):
+        framework, endpoint, connections, rate = key
+        hosts = {row['host'] for row in before_rows[key] + after_rows[key]}
+        comparison.append({
+            'framework': framework,
+            'endpoint': endpoint,
+            'connections': connections,
+            'rate': rate,
+            'same_host': len(hosts) == 1,
+            'requests_per_sec': _compare_metric(
+                _samples(before_rows[key], 'requests_per_sec'), _samples(after_rows[key], 'requests_per_sec'),
+                True, threshold, alpha),
+            'p99': _compare_metric(
+                _samples(before_rows[key], 'p99'), _samples(after_rows[key], 'p99'),
+                False, threshold, alpha),
+        })
+    return comparison
+
+
+def format_comparison(comparison):
+    lines = [f"{'framework':<10} {'endpoint':<24} {'conns':>5} {'req/s before':>12} {'after':>10} "
+             f"{'change':>8} {'p99 before':>11} {'after':>10} {'change':>8}  verdict"]
+    for item in comparison:
+        rps = item['requests_per_sec'] or {}
+        p99 = item['p99'] or {}
+        verdicts = sorted({v for v in (rps.get('verdict'), p99.get('verdict')) if v and v != 'ok'})
+        if rps.get('tested') is False or p99.get('tested') is False:
+            verdicts.append('untested')
+        if not item['same_host']:
+            verdicts.append('different hosts')
+        lines.append(
+            f"{item['framework']:<10} {item['endpoint']:<24} {str(item['connections'] or ''):>5} "
+            f"{rps.get('before', ''):>12} {rps.get('after', ''):>10} {_pct(rps.get('change')):>8} "
+            f"{p99.get('before', ''):>11} {p99.get('after', ''):>10} {_pct(p99.get('change')):>8}  "
+            f"{', '.join(verdicts) or 'ok'}"
+        )
+    return '\n'.join(lines)
+
+
+def _pct(change):
+    return '' if change is None else f'{change * 100:+.1f}%'
@@ -0,0 +1,114 @@
+"""
+Per-phase latency breakdown from the apps' Server-Timing headers.
+
+With SERVER_TIMING=1 the Python apps report how long each request spent
+in phases such as pool acquire, queries, serialization and template
+rendering. The load generators do not look at response headers, so
+benchmark.py runs a ServerTimingSampler next to each measured run: it
+requests the same URL at a fixed interval over one keep-alive connection,
+under the same contention as the load, and aggregates the phases.
+"""
+import http.client
+import threading
+import urllib.parse
+
+from loadgen import LatencyHistogram
+
+
+def parse_server_timing(header):
+    """
+    Parse a Server-Timing header into {name: duration in milliseconds}.
+
+    Metrics without a dur parameter are skipped.
+    """
+    phases = {}
+    for metric in header.split(','):
+        name, *params = (part.strip() for part in metric.split(';'))
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'dur':
+                try:
+                    phases[name] = float(value.strip('"'))
+                except ValueError:
+                    pass
+    return phases
+
+
+class ServerTimingSampler(threading.Thread):
+    """
+    Sample Server-Timing headers of `url` at a fixed interval in a background thread.
+
+    Usage:
+        sampler = ServerTimingSampler('http://localhost:8080/updates?queries=20')
+        sampler.start()
+        ...  # run the load
+        summary = sampler.stop()
+    """
+
+    def __init__(self, url, interval=0.05, timeout=5):
+        super().__init__(daemon=True)
+        parsed = urllib.parse.urlsplit(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+        self.interval = interval
+        self.timeout = timeout
+        self.histograms = {}
+        self.samples = 0
+        self.failures = 0
+        self._stop_event = threading.Event()
+
+    def sample(self, connection):
+        connection.request('GET', self.path)
+        response = connection.getresponse()
+        response.read()
+        header = response.getheader('Server-Timing')
+        if not header:
+            return False
+        for name, duration in parse_server_timing(header).items():
+            self.histograms.setdefault(name, LatencyHistogram()).record(duration * 1000)
+        self.samples += 1
+        return True
+
+    def run(self):
+        connection = None
+        while not self._stop_event.wait(self.interval):
+            try:
+                if connection is None:
+                    connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+                if not self.sample(connection):
+                    self.failures += 1
+            except (OSError, http.client.HTTPException):
+                self.failures += 1
+                if connection is not None:
+                    connection.close()
+                connection = None
+        if connection is not None:
+            connection.close()
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.summary()
+
+    def summary(self):
+        """
+        Returns:
+            dict: Sample counts and, per phase, latency statistics in
+            microseconds, or None if no response carried Server-Timing.
+        """
+        if not self.samples:
+            return None
+        return {
+            'samples': self.samples,
+            'failures': self.failures,
+            'phases': {name: histogram.summary() for name, histogram in sorted(self.histograms.items())},
+        }
+
+
+def format_breakdown(framework, endpoint, breakdown):
+    """One line per phase: mean and p99 in milliseconds."""
+    lines = [f'Server-Timing for {framework} {endpoint} ({breakdown["samples"]} samples):']
+    for name, phase in breakdown['phases'].items():
+        lines.append(f'  {name:<12} avg {phase["avg"] / 1000:8.3f} ms   p99 {phase["percentiles"]["99"] / 1000:8.3f} ms')
+    return '\n'.join(lines)
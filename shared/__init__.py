@@ -0,0 +1,6 @@
+"""
+Helpers shared by the Python apps (fastapi, flask and django).
+
+Each app appends the repository root to sys.path at startup and imports
+from here; only framework-specific adapters live in the app directories.
+"""
@@ -0,0 +1,58 @@
+"""
+Environment settings shared by the Python apps.
+
+Every toggle is read once here so the apps agree on names and defaults;
+all opt-in features are off unless set to "1".
+"""
+import os
+
+# Rows in the World table, see dataset.py
+WORLD_ROWS = int(os.getenv("WORLD_ROWS", "10000"))
+# Index-only lookup, cheap enough for every worker start even at 100M rows
+WORLD_ROWS_SQL = "SELECT max(id) FROM world"
+
+# LAZY_INIT=1 (startup benchmark) defers optional setup to first use
+LAZY_INIT = os.getenv("LAZY_INIT", "0") == "1"
+
+# Opt-in fortunes cache, invalidated by LISTEN fortune_changed (fastapi) or
+# by polling fortune_version (flask, django), see fortune_notify.sql
+FORTUNES_CACHE = os.getenv("FORTUNES_CACHE", "0") == "1"
+FORTUNES_CACHE_HTML = os.getenv("FORTUNES_CACHE_HTML", "0") == "1"
+FORTUNES_POLL_INTERVAL = int(os.getenv("FORTUNES_POLL_MS", "1000")) / 1000
+
+# Opt-in coalescing of concurrent /db reads into one ANY($1) lookup
+DB_COALESCE = os.getenv("DB_COALESCE", "0") == "1"
+DB_COALESCE_MAX_BATCH = int(os.getenv("DB_COALESCE_MAX_BATCH", "256"))
+DB_COALESCE_MAX_DELAY = float(os.getenv("DB_COALESCE_MAX_DELAY_MS", "0")) / 1000
+
+# Opt-in group commit of concurrent /updates writes
+DB_GROUP_COMMIT = os.getenv("DB_GROUP_COMMIT", "0") == "1"
+DB_GROUP_COMMIT_WINDOW = float(os.getenv("DB_GROUP_COMMIT_WINDOW_MS", "2")) / 1000
+DB_GROUP_COMMIT_MAX_ROWS = int(os.getenv("DB_GROUP_COMMIT_MAX_ROWS", "5000"))
+
+# Opt-in adaptive pool sizing within a connection budget shared by all workers
+DB_POOL_ADAPTIVE = os.getenv("DB_POOL_ADAPTIVE", "0") == "1"
+# 0 derives the budget from the server's max_connections
+DB_POOL_BUDGET = int(os.getenv("DB_POOL_BUDGET", "0"))
+DB_POOL_RESERVE = int(os.getenv("DB_POOL_RESERVE", "10"))
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_ADJUST_INTERVAL = float(os.getenv("DB_POOL_ADJUST_MS", "500")) / 1000
+DB_POOL_TARGET_WAIT = float(os.getenv("DB_POOL_TARGET_WAIT_MS", "1")) / 1000
+DB_POOL_IDLE_TIMEOUT = float(os.getenv("DB_POOL_IDLE_S", "10"))
+
+
+def check_world_rows(max_id):
+    """
+    Fail a worker's startup if the World table does not cover 1..WORLD_ROWS.
+
+    Random ids beyond the loaded rows would otherwise surface as HTTP 500s
+    (or empty results) under load rather than as a configuration error.
+
+    Args:
+        max_id: Result of WORLD_ROWS_SQL, None for an empty table.
+    """
+    if (max_id or 0) < WORLD_ROWS:
+        raise RuntimeError(
+            f"WORLD_ROWS={WORLD_ROWS} but the world table only has ids up to {max_id or 0}; "
+            "load it with dataset.py or lower WORLD_ROWS"
+        )
@@ -0,0 +1,117 @@
+"""
+Per-worker cache of the sorted fortunes (or their rendered page).
+
+Both caches rebuild on a miss and keep the built value only if no change
+to Fortune was seen while it was being built, so a concurrent write never
+leaves a stale page cached.
+
+FortuneCache (async apps) is invalidated through Postgres LISTEN/NOTIFY:
+fortune_notify.sql installs a trigger that sends `fortune_changed` on every
+write to Fortune, and each worker listens on a dedicated asyncpg connection.
+
+Sync workers cannot wait on LISTEN, so PollingFortuneCache polls the
+fortune_version counter maintained by the same trigger, at most once every
+`poll_interval` seconds. A change to Fortune is therefore visible after at
+most one poll interval.
+"""
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+FORTUNE_CHANNEL = "fortune_changed"
+
+
+class FortuneCache:
+    def __init__(self):
+        self.enabled = False
+        self.value = None
+        self.generation = 0
+        self.builds = 0
+        self.invalidations = 0
+        self._connection = None
+
+    def invalidate(self, *args):
+        self.generation += 1
+        self.invalidations += 1
+        self.value = None
+
+    def _connection_lost(self, connection):
+        logger.warning("fortune listener connection lost, fortune cache disabled")
+        self.enabled = False
+        self.invalidate()
+
+    async def listen(self, connect):
+        """
+        Start listening for changes on a connection from `connect()`.
+
+        The cache only serves cached values while the listener is alive; if
+        the connection is lost every request falls back to the database.
+        """
+        self._connection = await connect()
+        await self._connection.add_listener(FORTUNE_CHANNEL, self.invalidate)
+        self._connection.add_termination_listener(self._connection_lost)
+        # Anything cached before LISTEN took effect may already be stale
+        self.invalidate()
+        self.enabled = True
+
+    async def close(self):
+        self.enabled = False
+        if self._connection is not None:
+            await self._connection.close()
+            self._connection = None
+
+    async def get(self, build):
+        """
+        Return the cached value, building it with `await build()` on a miss.
+
+        A value built while an invalidation arrived is returned but not kept.
+        """
+        value = self.value
+        if value is None or not self.enabled:
+            generation = self.generation
+            value = await build()
+            self.builds += 1
+            if self.enabled and generation == self.generation:
+                self.value = value
+        return value
+
+    def as_dict(self):
+        return {
+            "enabled": self.enabled,
+            "cached": self.value is not None,
+            "builds": self.builds,
+            "invalidations": self.invalidations,
+        }
+
+
+class PollingFortuneCache:
+    def __init__(self, read_version, poll_interval=1.0):
+        self.read_version = read_version
+        self.poll_interval = poll_interval
+        self.value = None
+        self.version = None
+        self.next_poll = 0.0
+        self.builds = 0
+        self.invalidations = 0
+
+    def get(self, build):
+        now = time.monotonic()
+        if now >= self.next_poll:
+            # Advance first, so concurrent greenlets do not all poll at once
+            self.next_poll = now + self.poll_interval
+            version = self.read_version()
+            if version != self.version:
+                if self.version is not None:
+                    self.invalidations += 1
+                self.version = version
+                self.value = None
+
+        value = self.value
+        if value is None:
+            version = self.version
+            value = build()
+            self.builds += 1
+            if version == self.version:
+                self.value = value
+        return value
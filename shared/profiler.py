@@ -0,0 +1,108 @@
+"""
+On-demand statistical profiler for the app workers.
+
+With PROFILER=1, install() makes SIGUSR2 start a sampler thread that reads
+sys._current_frames() every PROFILER_INTERVAL_MS for a number of seconds,
+then writes the sampled stacks in collapsed format ("a;b;c count" per
+line, as consumed by flamegraph.pl and speedscope) to <output>/<pid>.collapsed.
+Seconds and output directory come from PROFILER_DIR/request.json, written
+by benchmark.py before it signals the workers, with the PROFILER_* values
+as fallback.
+
+The apps call install() when a worker loads them. Gunicorn workers reset
+SIGUSR2 to its default action, which terminates the process, so install()
+always registers a handler: without PROFILER=1 it only logs that the
+signal was ignored.
+
+Only the workers should be signalled: SIGUSR2 to a gunicorn master
+starts a binary upgrade.
+"""
+import importlib
+import json
+import os
+import signal
+import sys
+import time
+from collections import Counter
+
+PROFILER = os.getenv("PROFILER", "0") == "1"
+PROFILER_DIR = os.getenv("PROFILER_DIR", "/tmp/profiles")
+PROFILER_SECONDS = float(os.getenv("PROFILER_SECONDS", "10"))
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL_MS", "5")) / 1000
+REQUEST_FILE = "request.json"
+
+_running = False
+
+
+def _original(module, name):
+    # Under gevent, patched threads are greenlets that would only sample
+    # when the hub schedules them, so use the real thread primitives.
+    try:
+        from gevent import monkey
+    except ImportError:
+        return getattr(importlib.import_module(module), name)
+    return monkey.get_original(module, name)
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)})"
+
+
+def collapsed_stack(frame):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample(seconds, interval, output):
+    global _running
+    sleep = _original("time", "sleep")
+    own_id = _original("_thread", "get_ident")()
+    stacks = Counter()
+    try:
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    stacks[collapsed_stack(frame)] += 1
+            sleep(interval)
+
+        os.makedirs(output, exist_ok=True)
+        path = os.path.join(output, f"{os.getpid()}.collapsed")
+        with open(path + ".tmp", "w") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        # Renamed only once complete, so readers never see a partial file
+        os.replace(path + ".tmp", path)
+    finally:
+        _running = False
+
+
+def start(seconds=PROFILER_SECONDS, output=PROFILER_DIR, interval=PROFILER_INTERVAL):
+    """Start sampling in a background OS thread unless a profile is already running."""
+    global _running
+    if _running:
+        return False
+    _running = True
+    _original("_thread", "start_new_thread")(sample, (seconds, interval, output))
+    return True
+
+
+def _on_signal(signum, frame):
+    try:
+        with open(os.path.join(PROFILER_DIR, REQUEST_FILE)) as f:
+            request = json.load(f)
+    except (OSError, ValueError):
+        request = {}
+    start(float(request.get("seconds", PROFILER_SECONDS)), request.get("output", PROFILER_DIR))
+
+
+def _ignore_signal(signum, frame):
+    sys.stderr.write(f"worker {os.getpid()}: SIGUSR2 ignored, profiler not enabled (PROFILER=1)\n")
+
+
+def install():
+    signal.signal(signal.SIGUSR2, _on_signal if PROFILER else _ignore_signal)
@@ -0,0 +1,74 @@
+"""
+Per-request phase timing, reported in a Server-Timing header.
+
+With SERVER_TIMING=1, each app's middleware starts a RequestTiming for
+every request and handlers wrap their work in `with phase("db"):`. The
+header lists each phase plus "total" in milliseconds. The phase dict
+lives in a context variable, so it follows the request across awaits,
+greenlets and Django's sync_to_async threads. When the variable is unset
+no middleware is installed and phase() returns a shared no-op context
+manager, so instrumented code pays one global lookup per phase.
+
+Only the middleware differs per framework: see timing.py in fastapi/
+(ASGI), flask/ (request hooks) and django/hello/world/.
+"""
+import os
+from contextlib import nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+SERVER_TIMING = os.getenv("SERVER_TIMING", "0") == "1"
+
+_timings = ContextVar("server_timing", default=None)
+_NO_TIMING = nullcontext()
+
+
+class _Phase:
+    __slots__ = ("name", "timings", "started")
+
+    def __init__(self, name, timings):
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.started = perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.timings[self.name] = self.timings.get(self.name, 0.0) + perf_counter() - self.started
+
+
+def phase(name):
+    """Time the enclosed block; repeated phases within a request add up."""
+    if not SERVER_TIMING:
+        return _NO_TIMING
+    timings = _timings.get()
+    if timings is None:
+        return _NO_TIMING
+    return _Phase(name, timings)
+
+
+def header_value(timings, total):
+    metrics = [f"{name};dur={seconds * 1000:.3f}" for name, seconds in timings.items()]
+    metrics.append(f"total;dur={total * 1000:.3f}")
+    return ", ".join(metrics)
+
+
+class RequestTiming:
+    """
+    Phases of one request, collected by phase() from creation until close().
+
+    Create it where the request starts and close it in the same context.
+    """
+    __slots__ = ("timings", "started", "token")
+
+    def __init__(self):
+        self.timings = {}
+        self.started = perf_counter()
+        self.token = _timings.set(self.timings)
+
+    def header(self):
+        """Server-Timing value with the phases so far and the total up to now."""
+        return header_value(self.timings, perf_counter() - self.started)
+
+    def close(self):
+        _timings.reset(self.token)
@@ -0,0 +1,131 @@
+"""
+Per-process cache of World.randomnumber for the `/cached-queries` endpoints.
+
+By default every row is kept in a preallocated array('i') indexed by id,
+which costs 5 bytes per row instead of a dict of row objects. With a
+capacity below the id range, a bounded LRU is used instead so datasets
+larger than memory can still be cached partially.
+
+get_many() and aget_many() only differ in how the misses are fetched, so
+the sync (flask, django) and async (fastapi, django ASGI) apps share the
+same storage and lookup code.
+"""
+import os
+from array import array
+from collections import OrderedDict
+
+from shared.config import WORLD_ROWS
+
+# 0 caches the whole id range densely; N > 0 keeps at most N rows (LRU)
+CACHE_SIZE = int(os.getenv("CACHE_SIZE", "0"))
+# CACHE_WARM=1 preloads up to capacity_rows() rows when a worker starts.
+# Off by default: it costs every worker a query and memory at startup, also
+# in runs that never hit /cached-queries.
+CACHE_WARM = os.getenv("CACHE_WARM", "0") == "1"
+
+
+class WorldCache:
+    def __init__(self, max_id=WORLD_ROWS, capacity=CACHE_SIZE):
+        self.max_id = max_id
+        self.hits = 0
+        self.misses = 0
+        if not capacity or capacity >= max_id:
+            # Allocated by the first put(), so an unused cache costs nothing
+            self.numbers = None
+            self.present = None
+            self.lru = None
+        else:
+            self.capacity = capacity
+            self.lru = OrderedDict()
+
+    def capacity_rows(self):
+        """Number of rows a warm load should fetch: the LRU capacity, else the id range."""
+        return self.capacity if self.lru is not None else self.max_id
+
+    def __len__(self):
+        if self.lru is not None:
+            return len(self.lru)
+        return sum(self.present) if self.present is not None else 0
+
+    def get(self, row_id):
+        if self.lru is not None:
+            number = self.lru.get(row_id)
+            if number is not None:
+                self.lru.move_to_end(row_id)
+            return number
+        if self.present is not None and 0 <= row_id <= self.max_id and self.present[row_id]:
+            return self.numbers[row_id]
+        return None
+
+    def put(self, row_id, number):
+        if self.lru is not None:
+            self.lru[row_id] = number
+            self.lru.move_to_end(row_id)
+            if len(self.lru) > self.capacity:
+                self.lru.popitem(last=False)
+        elif 0 <= row_id <= self.max_id:
+            if self.present is None:
+                self.numbers = array("i", bytes(4 * (self.max_id + 1)))
+                self.present = bytearray(self.max_id + 1)
+            self.numbers[row_id] = number
+            self.present[row_id] = 1
+
+    def update(self, rows):
+        for row_id, number in rows:
+            self.put(row_id, number)
+
+    def lookup(self, row_ids):
+        """
+        Split ids into cached numbers and the ids that need fetching.
+
+        Returns:
+            tuple: ({id: number} of the hits, [ids] of the misses).
+        """
+        numbers = {}
+        missing = []
+        for row_id in row_ids:
+            number = self.get(row_id)
+            if number is None:
+                missing.append(row_id)
+            else:
+                numbers[row_id] = number
+        self.hits += len(row_ids) - len(missing)
+        self.misses += len(missing)
+        return numbers, missing
+
+    def fill(self, numbers, rows):
+        """Cache fetched (id, number) rows and add them to `numbers`."""
+        for row_id, number in rows:
+            self.put(row_id, number)
+            numbers[row_id] = number
+
+    @staticmethod
+    def _worlds(row_ids, numbers):
+        return [{"id": row_id, "randomNumber": numbers.get(row_id)} for row_id in row_ids]
+
+    def get_many(self, row_ids, fetch_many):
+        """
+        Look up ids, loading misses with one `fetch_many(ids) -> [(id, number)]` call.
+
+        Returns:
+            list: {"id", "randomNumber"} dicts in the order of row_ids.
+        """
+        numbers, missing = self.lookup(row_ids)
+        if missing:
+            self.fill(numbers, fetch_many(missing))
+        return self._worlds(row_ids, numbers)
+
+    async def aget_many(self, row_ids, afetch_many):
+        """get_many() for async apps; `afetch_many` is a coroutine function."""
+        numbers, missing = self.lookup(row_ids)
+        if missing:
+            self.fill(numbers, await afetch_many(missing))
+        return self._worlds(row_ids, numbers)
+
+    def as_dict(self):
+        return {
+            "mode": "lru" if self.lru is not None else "array",
+            "rows": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
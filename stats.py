@@ -0,0 +1,75 @@
+"""
+Small statistics helpers for comparing benchmark samples.
+
+Only the standard library is used, so the load boxes need nothing beyond
+what benchmark.py already requires.
+"""
+import itertools
+import math
+import random
+import statistics
+
+
+def relative_change(before, after):
+    """
+    Relative change from `before` to `after`, e.g. 0.1 for +10%.
+    """
+    if not before:
+        return None
+    return (after - before) / before
+
+
+def permutation_test(a, b, iterations=10000, seed=0):
+    """
+    Two-sided permutation test for a difference in means.
+
+    Exact (all splits enumerated) when the samples are small enough,
+    otherwise approximated with `iterations` random shuffles.
+
+    Returns:
+        float: The p-value, or None if either sample is empty.
+    """
+    if not a or not b:
+        return None
+    observed = abs(statistics.fmean(a) - statistics.fmean(b))
+    pooled = list(a) + list(b)
+    total = sum(pooled)
+    n = len(a)
+
+    def is_extreme(group_sum):
+        mean_a = group_sum / n
+        mean_b = (total - group_sum) / (len(pooled) - n)
+        return abs(mean_a - mean_b) >= observed - 1e-12
+
+    splits = list(itertools.combinations(range(len(pooled)), n)) if len(pooled) <= 16 else None
+    if splits is not None:
+        extreme = sum(is_extreme(sum(pooled[i] for i in split)) for split in splits)
+        return extreme / len(splits)
+
+    rng = random.Random(seed)
+    extreme = 0
+    for _ in range(iterations):
+        rng.shuffle(pooled)
+        extreme += is_extreme(sum(pooled[:n]))
+    return (extreme + 1) / (iterations + 1)
+
+
+def bootstrap_ci(samples, statistic=statistics.median, confidence=0.95, iterations=5000, seed=0):
+    """
+    Percentile bootstrap confidence interval for `statistic` of `samples`.
+
+    Returns:
+        tuple: (low, high), or None if `samples` is empty. A single sample
+        gives a zero-width interval.
+    """
+    if not samples:
+        return None
+    if len(samples) == 1:
+        return samples[0], samples[0]
+    rng = random.Random(seed)
+    n = len(samples)
+    estimates = sorted(statistic(rng.choices(samples, k=n)) for _ in range(iterations))
+    tail = (1 - confidence) / 2
+    low = estimates[int(tail * (iterations - 1))]
+    high = estimates[int(math.ceil((1 - tail) * (iterations - 1)))]
+    return low, high
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The tests import the shared/ helpers the same way the apps do
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
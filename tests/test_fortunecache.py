@@ -0,0 +1,205 @@
+"""
+Generation and invalidation logic of the fortune caches, without a database.
+
+`benchmark.py verify-fortunes` remains the end-to-end check against the
+running apps.
+"""
+import asyncio
+
+from shared import fortunecache
+from shared.fortunecache import FORTUNE_CHANNEL, FortuneCache, PollingFortuneCache
+
+
+class FakeListenConnection:
+    """Stands in for the asyncpg connection FortuneCache.listen() uses."""
+
+    def __init__(self):
+        self.listeners = {}
+        self.termination_listeners = []
+        self.closed = False
+
+    async def add_listener(self, channel, callback):
+        self.listeners[channel] = callback
+
+    def add_termination_listener(self, callback):
+        self.termination_listeners.append(callback)
+
+    async def close(self):
+        self.closed = True
+
+    def notify(self):
+        self.listeners[FORTUNE_CHANNEL](self, 1, FORTUNE_CHANNEL, '')
+
+    def terminate(self):
+        for callback in self.termination_listeners:
+            callback(self)
+
+
+async def listening_cache():
+    connection = FakeListenConnection()
+
+    async def connect():
+        return connection
+
+    cache = FortuneCache()
+    await cache.listen(connect)
+    return cache, connection
+
+
+def counting_build(pages):
+    """An async build() returning the next of `pages` on each call."""
+    pages = iter(pages)
+
+    async def build():
+        return next(pages)
+    return build
+
+
+def test_cache_keeps_value_while_listening():
+    async def scenario():
+        cache, _ = await listening_cache()
+        build = counting_build(['v1', 'v2'])
+        assert await cache.get(build) == 'v1'
+        assert await cache.get(build) == 'v1'
+        assert cache.builds == 1
+
+    asyncio.run(scenario())
+
+
+def test_cache_does_not_keep_values_before_listening():
+    async def scenario():
+        cache = FortuneCache()
+        build = counting_build(['v1', 'v2'])
+        assert await cache.get(build) == 'v1'
+        assert await cache.get(build) == 'v2'
+        assert cache.value is None
+
+    asyncio.run(scenario())
+
+
+def test_notify_invalidates_cached_value():
+    async def scenario():
+        cache, connection = await listening_cache()
+        build = counting_build(['v1', 'v2'])
+        await cache.get(build)
+        connection.notify()
+        assert cache.value is None
+        assert await cache.get(build) == 'v2'
+        assert cache.invalidations == 2  # listen() itself invalidates once
+
+    asyncio.run(scenario())
+
+
+def test_notify_during_build_does_not_keep_stale_value():
+    async def scenario():
+        cache, connection = await listening_cache()
+
+        async def build():
+            # The write lands after the fortunes were read
+            connection.notify()
+            return 'stale'
+
+        assert await cache.get(build) == 'stale'
+        assert cache.value is None
+        assert await cache.get(counting_build(['fresh'])) == 'fresh'
+        assert cache.value == 'fresh'
+
+    asyncio.run(scenario())
+
+
+def test_notify_during_concurrent_builds():
+    async def scenario():
+        cache, connection = await listening_cache()
+        started = asyncio.Event()
+        release = asyncio.Event()
+
+        async def slow_build():
+            started.set()
+            await release.wait()
+            return 'stale'
+
+        pending = asyncio.ensure_future(cache.get(slow_build))
+        await started.wait()
+        connection.notify()
+        release.set()
+        assert await pending == 'stale'
+        assert cache.value is None
+
+    asyncio.run(scenario())
+
+
+def test_lost_listener_disables_cache():
+    async def scenario():
+        cache, connection = await listening_cache()
+        await cache.get(counting_build(['v1']))
+        connection.terminate()
+        assert not cache.enabled
+        assert cache.value is None
+        build = counting_build(['v2', 'v3'])
+        assert await cache.get(build) == 'v2'
+        assert await cache.get(build) == 'v3'
+        await cache.close()
+        assert connection.closed
+
+    asyncio.run(scenario())
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def monotonic(self):
+        return self.now
+
+
+def polling_cache(monkeypatch, versions, poll_interval=1.0):
+    clock = FakeClock()
+    monkeypatch.setattr(fortunecache.time, 'monotonic', clock.monotonic)
+    return PollingFortuneCache(lambda: versions[0], poll_interval), clock
+
+
+def test_polling_cache_rebuilds_after_version_change(monkeypatch):
+    versions = [1]
+    cache, clock = polling_cache(monkeypatch, versions)
+    build = iter(['v1', 'v2']).__next__
+    assert cache.get(build) == 'v1'
+    assert cache.get(build) == 'v1'
+
+    versions[0] = 2
+    # Not polled again until the interval has passed
+    assert cache.get(build) == 'v1'
+    clock.now += 1.0
+    assert cache.get(build) == 'v2'
+    assert cache.builds == 2
+    assert cache.invalidations == 1
+
+
+def test_polling_cache_version_bump_during_build_does_not_keep_stale_value(monkeypatch):
+    versions = [1]
+    cache, clock = polling_cache(monkeypatch, versions, poll_interval=0.0)
+
+    def stale_build():
+        # While this greenlet waits on the database, Fortune changes and
+        # another greenlet polls the new version and caches a fresh page
+        versions[0] = 2
+        clock.now += 0.1
+        assert cache.get(lambda: 'fresh') == 'fresh'
+        return 'stale'
+
+    assert cache.get(stale_build) == 'stale'
+    assert cache.value == 'fresh'
+    assert cache.get(lambda: 'unused') == 'fresh'
+
+
+def test_polling_cache_version_bump_without_poll_is_picked_up_later(monkeypatch):
+    versions = [1]
+    cache, clock = polling_cache(monkeypatch, versions)
+
+    def build():
+        versions[0] = 2
+        return 'stale'
+
+    # Nothing polled during the build, so the page is kept for at most one interval
+    assert cache.get(build) == 'stale'
+    clock.now += 1.0
+    assert cache.get(lambda: 'fresh') == 'fresh'
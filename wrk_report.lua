@@ -0,0 +1,29 @@
+-- wrk done() reporter used by benchmark.py.
+--
+-- Prints the run summary as a single JSON line after a marker, so the
+-- results can be read without parsing wrk's human-readable report.
+-- Latencies are in microseconds and byte counts are raw bytes.
+
+local percentiles = { 50, 75, 90, 99, 99.9, 99.99 }
+
+done = function(summary, latency, requests)
+  local latency_percentiles = {}
+  for _, p in ipairs(percentiles) do
+    latency_percentiles[#latency_percentiles + 1] =
+      string.format('"%s": %d', tostring(p), latency:percentile(p))
+  end
+
+  local errors = summary.errors
+  io.write("__WRK_JSON__\n")
+  io.write(string.format(
+    '{"duration_us": %d, "requests": %d, "bytes": %d, ' ..
+    '"errors": {"connect": %d, "read": %d, "write": %d, "status": %d, "timeout": %d}, ' ..
+    '"latency": {"min": %d, "max": %d, "mean": %.2f, "stdev": %.2f, "percentiles": {%s}}, ' ..
+    '"requests_per_thread": {"min": %.2f, "max": %.2f, "mean": %.2f, "stdev": %.2f}}\n',
+    summary.duration, summary.requests, summary.bytes,
+    errors.connect, errors.read, errors.write, errors.status, errors.timeout,
+    latency.min, latency.max, latency.mean, latency.stdev,
+    table.concat(latency_percentiles, ", "),
+    requests.min, requests.max, requests.mean, requests.stdev
+  ))
+end
@@ -0,0 +1,40 @@
+-- wrk script used by benchmark.py warm_up().
+--
+-- Counts completed responses per wall-clock second in each thread and,
+-- when the run is over, prints the merged per-second counts as a JSON
+-- array after a marker. The first and last seconds are partial and are
+-- left out.
+
+local threads = {}
+
+setup = function(thread)
+  table.insert(threads, thread)
+end
+
+counts = {}
+
+response = function(status, headers, body)
+  local second = os.time()
+  counts[second] = (counts[second] or 0) + 1
+end
+
+done = function(summary, latency, requests)
+  local merged = {}
+  local first, last
+  for _, thread in ipairs(threads) do
+    for second, count in pairs(thread:get("counts")) do
+      merged[second] = (merged[second] or 0) + count
+      if not first or second < first then first = second end
+      if not last or second > last then last = second end
+    end
+  end
+
+  local timeline = {}
+  if first then
+    for second = first + 1, last - 1 do
+      timeline[#timeline + 1] = tostring(merged[second] or 0)
+    end
+  end
+  io.write("__WRK_TIMELINE__\n")
+  io.write("[" .. table.concat(timeline, ", ") .. "]\n")
+end